@@ -33,7 +33,8 @@ Use
 ---
 
     Executing the module on the command line will build the database
-    tables defined within:
+    tables defined within, and add any columns or indexes that are
+    missing from tables that already exist:
 
     ::
 
@@ -63,12 +64,14 @@ import socket
 
 import pandas as pd
 from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy import Date
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import Float
+from sqlalchemy import Index
 from sqlalchemy import Integer
+from sqlalchemy import LargeBinary
 from sqlalchemy import MetaData
 from sqlalchemy import String
 from sqlalchemy import Time
@@ -77,6 +80,7 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.automap import automap_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.query import Query
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.types import ARRAY
 
 from jwql.utils.constants import ANOMALIES, FILE_SUFFIX_TYPES, JWST_INSTRUMENT_NAMES
@@ -84,6 +88,10 @@ from jwql.utils.utils import get_config
 
 ON_JENKINS = '/home/jenkins' in os.path.expanduser('~')
 
+# Indexes spanning more than one column of a monitor table. Single
+# column indexes are given in the table definition files.
+MONITOR_TABLE_INDEXES = {'nircam_bias_stats': [('aperture', 'uncal_filename')]}
+
 
 # Monkey patch Query with data_frame method
 @property
@@ -261,6 +269,10 @@ def get_monitor_columns(data_dict, table_name):
     """Read in the corresponding table definition text file to
     generate ``SQLAlchemy`` columns for the table.
 
+    Each line of the table definition file gives the column name and
+    data type, optionally followed by ``index`` for columns that should
+    be indexed (e.g. ``UNCAL_FILENAME, string, index``).
+
     Parameters
     ----------
     data_dict : dict
@@ -284,7 +296,8 @@ def get_monitor_columns(data_dict, table_name):
                       'date': Date(),
                       'time': Time(),
                       'datetime': DateTime,
-                      'bool': Boolean
+                      'bool': Boolean,
+                      'bytes': LargeBinary
                       }
 
     # Get the data from the table definition file
@@ -301,6 +314,7 @@ def get_monitor_columns(data_dict, table_name):
     for column_definition in column_definitions:
         column_name = column_definition[0]
         data_type = column_definition[1]
+        index = 'index' in column_definition[2:]
 
         if 'array' in data_type:
             dtype, _a, dimension = data_type.split('_')
@@ -314,9 +328,9 @@ def get_monitor_columns(data_dict, table_name):
         if dtype in list(data_type_dict.keys()):
             if array:
                 data_dict[column_name.lower()] = Column(ARRAY(data_type_dict[dtype],
-                                                              dimensions=dimension))
+                                                              dimensions=dimension), index=index)
             else:
-                data_dict[column_name.lower()] = Column(data_type_dict[dtype])
+                data_dict[column_name.lower()] = Column(data_type_dict[dtype], index=index)
         else:
             raise ValueError('Unrecognized column type: {}:{}'.format(column_name, data_type))
 
@@ -342,6 +356,11 @@ def get_monitor_table_constraints(data_dict, table_name):
         for the monitor added.
     """
 
+    # Add any indexes spanning more than one column
+    for columns in MONITOR_TABLE_INDEXES.get(table_name, []):
+        index_name = '{}_{}_idx'.format(table_name, '_'.join(columns))
+        data_dict['__table_args__'] += (Index(index_name, *columns),)
+
     return data_dict
 
 
@@ -380,6 +399,56 @@ def monitor_orm_factory(class_name):
     return type(class_name, (base,), data_dict)
 
 
+def update_existing_tables(engine, metadata):
+    """Add any columns and indexes defined in ``metadata`` that are
+    missing from tables that already exist in the database.
+
+    ``create_all`` only creates tables that do not yet exist, so
+    columns added to a table definition file after its table was
+    created (e.g. ``PIXEL_MASK`` in the dark monitor pixel stats
+    tables) must be added with ``ALTER TABLE``. The new columns are
+    ``NULL`` in existing rows.
+
+    Parameters
+    ----------
+    engine : engine object
+        Provides a source of database connectivity and behavior.
+    metadata : metadata object
+        Metadata containing the table definitions (e.g.
+        ``base.metadata``)
+
+    Returns
+    -------
+    changes : list
+        Descriptions of the columns and indexes that were added
+    """
+
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+
+    changes = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = [column['name'] for column in inspector.get_columns(table.name)]
+        existing_indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_definition = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.execute('ALTER TABLE {} ADD COLUMN {}'
+                                       .format(table.name, column_definition))
+                    changes.append('Added column {}.{}'.format(table.name, column.name))
+
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    changes.append('Added index {} to {}'.format(index.name, table.name))
+
+    return changes
+
+
 # Create tables from ORM factory
 Anomaly = anomaly_orm_factory('anomaly')
 NIRCamDarkQueryHistory = monitor_orm_factory('nircam_dark_query_history')
@@ -404,3 +473,5 @@ NIRCamBiasStats = monitor_orm_factory('nircam_bias_stats')
 if __name__ == '__main__':
 
     base.metadata.create_all(engine)
+    for change in update_existing_tables(engine, base.metadata):
+        print(change)
@@ -30,6 +30,8 @@ Use
         python bias_monitor.py
 """
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import logging
 import os
@@ -38,11 +40,6 @@ from astropy.io import fits
 from astropy.stats import sigma_clipped_stats
 from astropy.time import Time
 from astropy.visualization import ZScaleInterval
-from jwst.dq_init import DQInitStep
-from jwst.group_scale import GroupScaleStep
-from jwst.refpix import RefPixStep
-from jwst.saturation import SaturationStep
-from jwst.superbias import SuperBiasStep
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -52,16 +49,31 @@ from pysiaf import Siaf
 from sqlalchemy import func
 from sqlalchemy.sql.expression import and_
 
-from jwql.database.database_interface import session
+from jwql.database.database_interface import engine, session
 from jwql.database.database_interface import NIRCamBiasQueryHistory, NIRCamBiasStats
 from jwql.instrument_monitors import pipeline_tools
 from jwql.instrument_monitors.common_monitors.dark_monitor import mast_query_darks
-from jwql.utils import instrument_properties
+from jwql.utils import calculations, instrument_properties
 from jwql.utils.constants import JWST_INSTRUMENT_NAMES_MIXEDCASE
 from jwql.utils.logging_functions import log_info, log_fail
+from jwql.utils.monitor_utils import filter_processed_files
 from jwql.utils.permissions import set_permissions
 from jwql.utils.utils import ensure_dir_exists, filesystem_path, get_config, initialize_instrument_monitor, update_monitor_table
 
+# Number of threads used to extract the 0th groups of new files. The
+# extraction is dominated by file I/O, so threads are sufficient.
+EXTRACTION_THREADS = 8
+
+# Maximum size in bytes of the image stacks used to calculate statistics
+# for a batch of files in memory. Files are split into batches small
+# enough to stay below this size.
+MAX_BATCH_MEMORY = 2 * 1024**3
+
+# Number of bytes per pixel needed to stack the uncalibrated, calibrated
+# and good pixel images of a file
+BATCH_BYTES_PER_PIXEL = sum(np.dtype(dtype).itemsize for dtype in [float, np.float32, bool])
+
+
 class Bias():
     """Class for executing the bias monitor.
 
@@ -100,55 +112,112 @@ class Bias():
     def __init__(self):
         """Initialize an instance of the ``Bias`` class."""
 
+    def calibrated_image_stats(self, images, good_pixels):
+        """Calculate the sigma-clipped mean, median, and standard
+        deviation of the good pixels in each of a stack of calibrated
+        images.
+
+        Parameters
+        ----------
+        images : numpy.ndarray
+            3D stack of 2D calibrated images
+
+        good_pixels : numpy.ndarray
+            3D boolean array matching ``images``. ``True`` for pixels
+            to include in the statistics
+
+        Returns
+        -------
+        mean : numpy.ndarray
+            1D array of the sigma-clipped mean of each image
+
+        median : numpy.ndarray
+            1D array of the sigma-clipped median of each image
+
+        stddev : numpy.ndarray
+            1D array of the sigma-clipped standard deviation of each
+            image
+        """
+
+        mean, median, stddev = sigma_clipped_stats(images, mask=~good_pixels, sigma=3.0, maxiters=5,
+                                                   axis=(1, 2))
+
+        return mean, median, stddev
+
     def collapse_image(self, image):
-        """Median-collapse the rows and columns of an image.
+        """Median-collapse the rows and columns of an image, or of each
+        image in a stack.
 
         Parameters
         ----------
         image : numpy.ndarray
-            2D array on which to calculate statistics
+            2D array on which to calculate statistics, or 3D stack of
+            2D arrays
 
         Returns
         -------
         collapsed_rows : numpy.ndarray
-            1D array of the collapsed row values
+            1D array of the collapsed row values (2D for a stack of
+            images, with one row per image)
 
         collapsed_columns : numpy.ndarray
-            1D array of the collapsed column values
+            1D array of the collapsed column values (2D for a stack of
+            images, with one row per image)
         """
 
-        collapsed_rows = np.nanmedian(image, axis=1)
-        collapsed_columns = np.nanmedian(image, axis=0)
+        collapsed_rows = np.nanmedian(image, axis=-1)
+        collapsed_columns = np.nanmedian(image, axis=-2)
 
         return collapsed_rows, collapsed_columns
 
-    def extract_zeroth_group(self, filename):
+    def extract_zeroth_group(self, filename, output_dir=None):
         """Extracts the 0th group of a fits image and outputs it into
         a new fits file.
 
+        Only the 0th group of the first integration is read from the
+        input file, and the raw (unscaled) values are streamed directly
+        into the output file, so the full ramp is never loaded into
+        memory.
+
         Parameters
         ----------
         filename : str
             The fits file from which the 0th group will be extracted.
 
+        output_dir : str
+            Directory in which to save the output file. If ``None``,
+            ``self.data_dir`` is used.
+
         Returns
         -------
         output_filename : str
             The full path to the output file
         """
 
-        output_filename = os.path.join(self.data_dir, os.path.basename(filename).replace('.fits', '_0thgroup.fits'))
+        if output_dir is None:
+            output_dir = self.data_dir
+        output_filename = os.path.basename(filename).replace('.fits', '_0thgroup.fits')
+        output_filename = os.path.join(output_dir, output_filename)
 
         # Write a new fits file containing the primary and science
         # headers from the input file, as well as the 0th group
         # data of the first integration
         if not os.path.isfile(output_filename):
-            hdu = fits.open(filename)
-            new_hdu = fits.HDUList([hdu['PRIMARY'], hdu['SCI']])
-            new_hdu['SCI'].data = hdu['SCI'].data[0:1, 0:1, :, :]
-            new_hdu.writeto(output_filename)
-            hdu.close()
-            new_hdu.close()
+            with fits.open(filename, do_not_scale_image_data=True) as hdu:
+                primary_header = hdu['PRIMARY'].header.copy()
+                sci_header = hdu['SCI'].header.copy()
+                zeroth_group = hdu['SCI'].section[0:1, 0:1, :, :]
+            sci_header['NAXIS3'] = 1
+            sci_header['NAXIS4'] = 1
+
+            # Write to a temporary file first, so that an interrupted
+            # write never leaves behind a partial output file
+            temporary_filename = '{}.part'.format(output_filename)
+            fits.PrimaryHDU(header=primary_header).writeto(temporary_filename, overwrite=True)
+            sci_hdu = fits.StreamingHDU(temporary_filename, sci_header)
+            sci_hdu.write(zeroth_group)
+            sci_hdu.close()
+            os.replace(temporary_filename, output_filename)
             set_permissions(output_filename)
             logging.info('\t{} created'.format(output_filename))
         else:
@@ -156,30 +225,35 @@ class Bias():
 
         return output_filename
 
-    def file_exists_in_database(self, filename):
-        """Checks if an entry for filename exists in the bias stats
-        database.
+    def extract_zeroth_groups(self, files):
+        """Extract the 0th groups from several files concurrently. Files
+        that cannot be read are logged and left out of the output.
 
         Parameters
         ----------
-        filename : str
-            The full path to the uncal filename
+        files : list
+            List of ``(filename, output_dir)`` tuples giving the files
+            from which to extract the 0th group and the directories in
+            which to save the outputs
 
         Returns
         -------
-        file_exists : bool
-            ``True`` if filename exists in the bias stats database
+        output_filenames : dict
+            Full paths to the output files, keyed by input filename
         """
 
-        query = session.query(self.stats_table)
-        results = query.filter(self.stats_table.uncal_filename == filename).all()
+        output_filenames = {}
+        with ThreadPoolExecutor(max_workers=EXTRACTION_THREADS) as executor:
+            futures = [(filename, executor.submit(self.extract_zeroth_group, filename, output_dir))
+                       for filename, output_dir in files]
+            for filename, future in futures:
+                try:
+                    output_filenames[filename] = future.result()
+                except Exception:
+                    logging.exception('\tFailed to extract the 0th group from {}. Skipping.'
+                                      .format(filename))
 
-        if len(results) != 0:
-            file_exists = True
-        else:
-            file_exists = False
-
-        return file_exists
+        return output_filenames
 
     def get_amp_medians(self, image, amps):
         """Calculates the median in the input image for each amplifier
@@ -188,7 +262,8 @@ class Bias():
         Parameters
         ----------
         image : numpy.ndarray
-            2D array on which to calculate statistics
+            2D array on which to calculate statistics, or 3D stack of
+            2D arrays
 
         amps : dict
             Dictionary containing amp boundary coordinates (output from
@@ -199,19 +274,20 @@ class Bias():
         -------
         amp_medians : dict
             Median values for each amp. Keys are ramp numbers as
-            strings with even/odd designation (e.g. ``'1_even'``)
+            strings with even/odd designation (e.g. ``'1_even'``).
+            For a stack of images, values are 1D arrays with one
+            median per image.
         """
 
         amp_medians = {}
 
         for key in amps:
-            x_start, x_end, x_step = amps[key][0]
-            y_start, y_end, y_step = amps[key][1]
+            amp_image = calculations.amplifier_view(image, amps[key])
 
             # Find median value of both even and odd columns for this amp
-            amp_med_even = np.nanmedian(image[y_start: y_end, x_start: x_end][:, 1::2])
+            amp_med_even = np.nanmedian(amp_image[..., 1::2], axis=(-2, -1))
             amp_medians['amp{}_even_med'.format(key)] = amp_med_even
-            amp_med_odd = np.nanmedian(image[y_start: y_end, x_start: x_end][:, ::2])
+            amp_med_odd = np.nanmedian(amp_image[..., ::2], axis=(-2, -1))
             amp_medians['amp{}_odd_med'.format(key)] = amp_med_odd
 
         return amp_medians
@@ -308,7 +384,7 @@ class Bias():
 
         return query_result
 
-    def process(self, file_list):
+    def process(self, file_list, uncal_files=None):
         """The main method for processing darks.  See module docstrings
         for further details.
 
@@ -317,78 +393,193 @@ class Bias():
         file_list : list
             List of filenames (including full paths) to the dark current
             files
+
+        uncal_files : dict
+            Names of the uncal files from which the files in
+            ``file_list`` were extracted, keyed by the names in
+            ``file_list``. These are used to find calibrated ramps in the
+            pipeline cache.
         """
 
-        for filename in file_list:
-            logging.info('\tWorking on file: {}'.format(filename))
-
-            # Skip processing if an entry for this file already exists in
-            # the bias stats database.
-            file_exists = self.file_exists_in_database(filename)
-            if file_exists:
-                logging.info('\t{} already exists in the bias database table.'.format(filename))
-                continue
-
-            # Get the exposure start time of this file
-            expstart = '{}T{}'.format(fits.getheader(filename, 0)['DATE-OBS'], fits.getheader(filename, 0)['TIME-OBS'])
-
-            # Determine if the file needs group_scale in pipeline run
-            read_pattern = fits.getheader(filename, 0)['READPATT']
-            if read_pattern not in pipeline_tools.GROUPSCALE_READOUT_PATTERNS:
-                group_scale = False
-            else:
-                group_scale = True
-
-            # Run the file through the pipeline up through the refpix step
-            logging.info('\tRunning pipeline on {}'.format(filename))
-            processed_file = self.run_early_pipeline(filename, odd_even_rows=False, odd_even_columns=True, use_side_ref_pixels=True, group_scale=group_scale)
-            logging.info('\tPipeline complete. Output: {}'.format(processed_file))
-
-            # Find amplifier boundaries so per-amp statistics can be calculated
-            _, amp_bounds = instrument_properties.amplifier_info(processed_file, omit_reference_pixels=True)
-            logging.info('\tAmplifier boundaries: {}'.format(amp_bounds))
-
-            # Get the uncalibrated 0th group data for this file
-            uncal_data = fits.getdata(filename, 'SCI')[0, 0, :, :].astype(float)
-
-            # Calculate the uncal median values of each amplifier for odd/even columns
-            amp_medians = self.get_amp_medians(uncal_data, amp_bounds)
-            logging.info('\tCalculated uncalibrated image stats: {}'.format(amp_medians))
-
-            # Calculate image statistics and the collapsed row/column values
-            # in the calibrated image
-            cal_data = fits.getdata(processed_file, 'SCI')[0, 0, :, :]
-            dq = fits.getdata(processed_file, 'PIXELDQ')
-            mean, median, stddev = sigma_clipped_stats(cal_data[dq==0], sigma=3.0, maxiters=5)
-            logging.info('\tCalculated calibrated image stats: {:.3f} +/- {:.3f}'.format(mean, stddev))
-            collapsed_rows, collapsed_columns = self.collapse_image(cal_data)
-            logging.info('\tCalculated collapsed row/column values of calibrated image.')
-
-            # Save a png of the calibrated image for visual inspection
-            logging.info('\tCreating png of calibrated image')
-            output_png = self.image_to_png(cal_data, outname=os.path.basename(processed_file).replace('.fits',''))
-
-            # Construct new entry for this file for the bias database table.
-            # Can't insert values with numpy.float32 datatypes into database
-            # so need to change the datatypes of these values.
+        if uncal_files is None:
+            uncal_files = {}
+
+        # Skip processing of any files that already have an entry in
+        # the bias stats database.
+        file_list, processed_files = filter_processed_files(file_list, self.stats_table,
+                                                            column_name='uncal_filename',
+                                                            aperture=self.aperture)
+        for filename in processed_files:
+            logging.info('\t{} already exists in the bias database table.'.format(filename))
+
+        # Run each file through the pipeline up through the refpix step.
+        # Files are grouped by image shape and amplifier boundaries, so
+        # that the statistics for each group can be calculated over a
+        # stack of images at once. A batch is processed as soon as it
+        # holds as many files as fit within MAX_BATCH_MEMORY. The files in each batch
+        # are kept open until the batch is processed, so that they are
+        # only opened once.
+        batches = OrderedDict()
+        new_entries = []
+        try:
+            for filename in file_list:
+                logging.info('\tWorking on file: {}'.format(filename))
+
+                # Get the exposure start time and readout pattern of this file
+                uncal_metadata = instrument_properties.FileMetadata(filename)
+                header = uncal_metadata.header
+                expstart = '{}T{}'.format(header['DATE-OBS'], header['TIME-OBS'])
+                read_pattern = header['READPATT']
+
+                # Determine if the file needs group_scale in pipeline run
+                if read_pattern not in pipeline_tools.GROUPSCALE_READOUT_PATTERNS:
+                    group_scale = False
+                else:
+                    group_scale = True
+
+                # Run the file through the pipeline up through the refpix step
+                logging.info('\tRunning pipeline on {}'.format(filename))
+                try:
+                    processed_file = self.run_early_pipeline(
+                        filename, odd_even_rows=False, odd_even_columns=True,
+                        use_side_ref_pixels=True, group_scale=group_scale,
+                        uncal_filename=uncal_files.get(filename))
+                except Exception:
+                    uncal_metadata.close()
+                    raise
+                logging.info('\tPipeline complete. Output: {}'.format(processed_file))
+
+                # Find amplifier boundaries so per-amp statistics can be calculated
+                cal_metadata = instrument_properties.FileMetadata(processed_file)
+                batch_file = (uncal_metadata, cal_metadata, expstart)
+                try:
+                    _, amp_bounds = instrument_properties.amplifier_info(cal_metadata,
+                                                                         omit_reference_pixels=True)
+                    logging.info('\tAmplifier boundaries: {}'.format(amp_bounds))
+                    shape = cal_metadata.hdulist['SCI'].shape[-2:]
+                except Exception:
+                    close_batch_files([batch_file])
+                    raise
+
+                batch_key = (shape, repr(sorted(amp_bounds.items())))
+                if batch_key not in batches:
+                    bytes_per_file = shape[0] * shape[1] * BATCH_BYTES_PER_PIXEL
+                    max_files = max(1, MAX_BATCH_MEMORY // bytes_per_file)
+                    batches[batch_key] = (shape, amp_bounds, max_files, [])
+                batches[batch_key][3].append(batch_file)
+
+                if len(batches[batch_key][3]) >= batches[batch_key][2]:
+                    shape, amp_bounds, _, batch_files = batches.pop(batch_key)
+                    new_entries.extend(self.process_batch(batch_files, shape, amp_bounds))
+
+            while len(batches) > 0:
+                _, (shape, amp_bounds, _, batch_files) = batches.popitem(last=False)
+                new_entries.extend(self.process_batch(batch_files, shape, amp_bounds))
+        finally:
+            for _, _, _, batch_files in batches.values():
+                close_batch_files(batch_files)
+
+        # Add the new entries to the bias database table in a single
+        # transaction. Entry dates must be unique, so make sure that no
+        # two entries share the same timestamp.
+        if len(new_entries) > 0:
+            entry_date = datetime.datetime.now()
+            with engine.begin() as connection:
+                for bias_db_entry in new_entries:
+                    bias_db_entry['entry_date'] = entry_date
+                    connection.execute(self.stats_table.__table__.insert(), bias_db_entry)
+                    entry_date = max(datetime.datetime.now(),
+                                     entry_date + datetime.timedelta(microseconds=1))
+            logging.info('\t{} new entries added to bias database table'.format(len(new_entries)))
+
+    def process_batch(self, files, shape, amps):
+        """Calculate the bias statistics for a batch of files that share
+        the same image shape and amplifier boundaries. The 0th group and
+        calibrated images of all files are stacked, and each statistic
+        is calculated for the whole stack at once. The files are closed
+        once their images have been read.
+
+        Parameters
+        ----------
+        files : list
+            List of ``(uncal_metadata, cal_metadata, expstart)`` tuples
+            for each file in the batch, where ``uncal_metadata`` and
+            ``cal_metadata`` are the ``FileMetadata`` of the 0th group
+            and calibrated files
+
+        shape : tuple
+            ``(y, x)`` shape of the images
+
+        amps : dict
+            Dictionary containing amp boundary coordinates (output from
+            ``amplifier_info`` function)
+
+        Returns
+        -------
+        new_entries : list
+            List of new entries for the bias database table, one for
+            each file
+        """
+
+        num_files = len(files)
+        stack_shape = (num_files, ) + tuple(shape)
+        uncal_stack = np.empty(stack_shape, dtype=float)
+        cal_stack = np.empty(stack_shape, dtype=np.float32)
+        good_pixels = np.empty(stack_shape, dtype=bool)
+
+        output_pngs = []
+        try:
+            for index, (uncal_metadata, cal_metadata, expstart) in enumerate(files):
+                uncal_stack[index] = uncal_metadata.sci(0, 0)
+                cal_stack[index] = cal_metadata.sci(0, 0)
+                good_pixels[index] = cal_metadata.dq == 0
+                uncal_metadata.close()
+                cal_metadata.close()
+
+                # Save a png of the calibrated image for visual inspection
+                processed_file = cal_metadata.filename
+                logging.info('\tCreating png of calibrated image {}'.format(processed_file))
+                outname = os.path.basename(processed_file).replace('.fits', '')
+                output_png = self.image_to_png(cal_stack[index], outname=outname)
+                output_pngs.append(output_png)
+        finally:
+            close_batch_files(files)
+
+        # Calculate the uncal median values of each amplifier for odd/even columns
+        amp_medians = self.get_amp_medians(uncal_stack, amps)
+        logging.info('\tCalculated uncalibrated image stats for {} files'.format(num_files))
+
+        # Calculate image statistics and the collapsed row/column values
+        # in the calibrated images
+        mean, median, stddev = self.calibrated_image_stats(cal_stack, good_pixels)
+        collapsed_rows, collapsed_columns = self.collapse_image(cal_stack)
+        logging.info('\tCalculated calibrated image stats and collapsed row/column values for {} '
+                     'files'.format(num_files))
+
+        # Construct a new entry for each file for the bias database table.
+        # Can't insert values with numpy.float32 datatypes into database
+        # so need to change the datatypes of these values.
+        new_entries = []
+        for index, (uncal_metadata, cal_metadata, expstart) in enumerate(files):
+            filename = uncal_metadata.filename
             bias_db_entry = {'aperture': self.aperture,
                              'uncal_filename': filename,
-                             'cal_filename': processed_file,
-                             'cal_image': output_png,
+                             'cal_filename': cal_metadata.filename,
+                             'cal_image': output_pngs[index],
                              'expstart': expstart,
-                             'mean': float(mean),
-                             'median': float(median),
-                             'stddev': float(stddev),
-                             'collapsed_rows': collapsed_rows.astype(float),
-                             'collapsed_columns': collapsed_columns.astype(float),
-                             'entry_date': datetime.datetime.now()
+                             'mean': float(mean[index]),
+                             'median': float(median[index]),
+                             'stddev': float(stddev[index]),
+                             'collapsed_rows': collapsed_rows[index].astype(float),
+                             'collapsed_columns': collapsed_columns[index].astype(float)
                             }
             for key in amp_medians.keys():
-                bias_db_entry[key] = float(amp_medians[key])
+                bias_db_entry[key] = float(amp_medians[key][index])
+            logging.info('\tCalculated stats for {}: {:.3f} +/- {:.3f}'
+                         .format(filename, mean[index], stddev[index]))
+            new_entries.append(bias_db_entry)
 
-            # Add this new entry to the bias database table
-            self.stats_table.__table__.insert().execute(bias_db_entry)
-            logging.info('\tNew entry added to bias database table: {}'.format(bias_db_entry))
+        return new_entries
 
     @log_fail
     @log_info
@@ -415,6 +606,9 @@ class Bias():
             siaf = Siaf(self.instrument)
             possible_apertures = [aperture for aperture in siaf.apertures if siaf[aperture].AperType=='FULLSCA']
 
+            # Query MAST for all apertures first, so that the 0th groups of
+            # the new files for every aperture can be extracted together
+            aperture_searches = OrderedDict()
             for aperture in possible_apertures:
 
                 logging.info('Working on aperture {} in {}'.format(aperture, instrument))
@@ -432,13 +626,14 @@ class Bias():
                 logging.info('\tAperture: {}, new entries: {}'.format(self.aperture, len(new_entries)))
 
                 # Set up a directory to store the data for this aperture
-                self.data_dir = os.path.join(self.output_dir, 'data/{}_{}'.format(self.instrument.lower(), self.aperture.lower()))
+                data_dir = 'data/{}_{}'.format(self.instrument.lower(), self.aperture.lower())
+                data_dir = os.path.join(self.output_dir, data_dir)
                 if len(new_entries) > 0:
-                    ensure_dir_exists(self.data_dir)
+                    ensure_dir_exists(data_dir)
 
-                # Save the 0th group image from each new file in the output directory;
-                # some dont exist in JWQL filesystem.
-                new_files = []
+                # Find the uncal version of each new file; some dont exist in
+                # JWQL filesystem.
+                uncal_files = []
                 for file_entry in new_entries:
                     try:
                         filename = filesystem_path(file_entry['filename'])
@@ -446,14 +641,35 @@ class Bias():
                         if not os.path.isfile(uncal_filename):
                             logging.info('\t{} does not exist in JWQL filesystem, even though {} does'.format(uncal_filename, filename))
                         else:
-                            new_file = self.extract_zeroth_group(uncal_filename)
-                            new_files.append(new_file)
+                            uncal_files.append(uncal_filename)
                     except FileNotFoundError:
                         logging.info('\t{} does not exist in JWQL filesystem'.format(file_entry['filename']))
 
+                aperture_searches[aperture] = {'query_start': self.query_start,
+                                               'entries_found': len(new_entries),
+                                               'data_dir': data_dir,
+                                               'uncal_files': uncal_files}
+
+            # Save the 0th group image from each new file in the output directory
+            extractions = [(uncal_filename, search['data_dir'])
+                           for search in aperture_searches.values()
+                           for uncal_filename in search['uncal_files']]
+            zeroth_groups = self.extract_zeroth_groups(extractions)
+
+            for aperture, search in aperture_searches.items():
+                self.aperture = aperture
+                self.query_start = search['query_start']
+                self.data_dir = search['data_dir']
+                new_files = [zeroth_groups[uncal_filename]
+                             for uncal_filename in search['uncal_files']
+                             if uncal_filename in zeroth_groups]
+                uncal_files = {zeroth_groups[uncal_filename]: uncal_filename
+                               for uncal_filename in search['uncal_files']
+                               if uncal_filename in zeroth_groups}
+
                 # Run the bias monitor on any new files
                 if len(new_files) > 0:
-                    self.process(new_files)
+                    self.process(new_files, uncal_files=uncal_files)
                     monitor_run = True
                 else:
                     logging.info('\tBias monitor skipped. {} new dark files for {}, {}.'.format(len(new_files), instrument, aperture))
@@ -464,7 +680,7 @@ class Bias():
                              'aperture': aperture,
                              'start_time_mjd': self.query_start,
                              'end_time_mjd': self.query_end,
-                             'entries_found': len(new_entries),
+                             'entries_found': search['entries_found'],
                              'files_found': len(new_files),
                              'run_monitor': monitor_run,
                              'entry_date': datetime.datetime.now()}
@@ -474,9 +690,12 @@ class Bias():
         logging.info('Bias Monitor completed successfully.')
 
     def run_early_pipeline(self, filename, odd_even_rows=False, odd_even_columns=True,
-                           use_side_ref_pixels=True, group_scale=False):
+                           use_side_ref_pixels=True, group_scale=False, uncal_filename=None):
         """Runs the early steps of the jwst pipeline (dq_init, saturation,
         superbias, refpix) on uncalibrated files and outputs the result.
+        If the dark monitor has already run the same steps on the full
+        ramp in ``uncal_filename``, the calibrated 0th group that it
+        added to the pipeline cache is used instead.
 
         Parameters
         ----------
@@ -496,6 +715,9 @@ class Bias():
             Option to rescale pixel values to correct for instances where
             on-board frame averaging did not result in the proper values
 
+        uncal_filename : str
+            Name of the uncal file from which ``filename`` was extracted
+
         Returns
         -------
         output_filename : str
@@ -504,28 +726,55 @@ class Bias():
 
         output_filename = filename.replace('_uncal', '').replace('.fits', '_superbias_refpix.fits')
 
-        if not os.path.isfile(output_filename):
-            # Run the group_scale and dq_init steps on the input file
-            if group_scale:
-                model = GroupScaleStep.call(filename)
-                model = DQInitStep.call(model)
-            else:
-                model = DQInitStep.call(filename)
-
-            # Run the saturation and superbias steps
-            model = SaturationStep.call(model)
-            model = SuperBiasStep.call(model)
-
-            # Run the refpix step and save the output
-            model = RefPixStep.call(model, odd_even_rows=odd_even_rows, odd_even_columns=odd_even_columns, use_side_ref_pixels=use_side_ref_pixels)
-            model.save(output_filename)
-            set_permissions(output_filename)
-        else:
+        if os.path.isfile(output_filename):
             logging.info('\t{} already exists'.format(output_filename))
+            return output_filename
+
+        # These are the steps shared with the dark monitor (see
+        # pipeline_tools.SHARED_STEPS), unless group_scale is needed
+        steps = OrderedDict([('group_scale', group_scale)])
+        steps.update(pipeline_tools.SHARED_STEPS)
+        step_parameters = {'refpix': {'odd_even_rows': odd_even_rows,
+                                      'odd_even_columns': odd_even_columns,
+                                      'use_side_ref_pixels': use_side_ref_pixels}}
+
+        # Use the 0th group from the pipeline cache if the dark monitor
+        # has already run the same steps on this data. The steps act on
+        # each group independently, so the 0th group of the calibrated
+        # ramp is the same as the calibrated 0th group. The cache key
+        # is built from the file's primary header, so the ramp itself
+        # is never read.
+        if uncal_filename is not None:
+            cache_key = pipeline_tools.pipeline_cache_key(uncal_filename, steps, step_parameters)
+            if cache_key is not None and pipeline_tools.get_cached_pipeline_product(
+                    cache_key, output_filename):
+                set_permissions(output_filename)
+                logging.info('\tCopied {} from the pipeline cache'.format(output_filename))
+                return output_filename
+
+        # Run the steps, keeping the data in memory between steps, and
+        # save the output
+        pipeline_tools.run_calwebb_detector1_steps(filename, steps, step_parameters=step_parameters,
+                                                   output_filename=output_filename)
+        set_permissions(output_filename)
 
         return output_filename
 
 
+def close_batch_files(files):
+    """Close the files of a batch of files for the bias monitor
+
+    Parameters
+    ----------
+    files : list
+        List of ``(uncal_metadata, cal_metadata, expstart)`` tuples
+    """
+
+    for uncal_metadata, cal_metadata, _ in files:
+        uncal_metadata.close()
+        cal_metadata.close()
+
+
 if __name__ == '__main__':
 
     module = os.path.basename(__file__).strip('.py')
@@ -9,7 +9,12 @@ If enough new files for a given instrument/aperture combination
 (currently the files must be identified as dark current files in the
 ``exp_type`` header keyword) are present in the filesystem at the time
 the ``dark_monitor`` is called, the files are first run through the the
-appropriate pipeline steps to produce slope images.
+appropriate pipeline steps to produce slope images. Apertures with
+enough new files are processed in parallel, with the full frame
+apertures started first. The number of ``cores`` given in the
+configuration file is divided between the apertures being processed at
+the same time, and each aperture runs its files through the pipeline
+in parallel on its share of the cores.
 
 A mean slope image as well as a standard deviation slope image is
 created by sigma-clipping on a pixel by pixel basis. The mean and
@@ -38,6 +43,11 @@ also fit to the histogram from the entire detector.
 The histogram itself as well as the best-fit Gaussian and double
 Gaussian parameters are saved to the DarkDarkCurrent database table.
 
+The progress made on each instrument/aperture combination is recorded in
+a run journal. If a run is interrupted, the next run resumes each
+unfinished combination from its last completed stage rather than
+starting over.
+
 
 Author
 ------
@@ -52,12 +62,28 @@ Use
     ::
 
         python dark_monitor.py
+
+    To compare full frame data against a running baseline built up from
+    all previous slope images, rather than against a single baseline
+    mean slope image, use:
+
+    ::
+
+        python dark_monitor.py --running_baseline
 """
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from copy import copy, deepcopy
 import datetime
+from functools import partial
+import json
 import logging
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
 
 from astropy.io import ascii, fits
 from astropy.modeling import models
@@ -67,7 +93,7 @@ from pysiaf import Siaf
 from sqlalchemy import func
 from sqlalchemy.sql.expression import and_
 
-from jwql.database.database_interface import session
+from jwql.database.database_interface import engine, session
 from jwql.database.database_interface import NIRCamDarkQueryHistory, NIRCamDarkPixelStats, NIRCamDarkDarkCurrent
 from jwql.database.database_interface import NIRISSDarkQueryHistory, NIRISSDarkPixelStats, NIRISSDarkDarkCurrent
 from jwql.database.database_interface import MIRIDarkQueryHistory, MIRIDarkPixelStats, MIRIDarkDarkCurrent
@@ -75,15 +101,72 @@ from jwql.database.database_interface import NIRSpecDarkQueryHistory, NIRSpecDar
 from jwql.database.database_interface import FGSDarkQueryHistory, FGSDarkPixelStats, FGSDarkDarkCurrent
 from jwql.instrument_monitors import pipeline_tools
 from jwql.jwql_monitors import monitor_mast
-from jwql.utils import calculations, instrument_properties
-from jwql.utils.constants import JWST_INSTRUMENT_NAMES, JWST_INSTRUMENT_NAMES_MIXEDCASE, JWST_DATAPRODUCTS
+from jwql.utils import calculations, instrument_properties, pixel_masks
+from jwql.utils.constants import AMPLIFIER_BOUNDARIES, JWST_INSTRUMENT_NAMES, \
+    JWST_INSTRUMENT_NAMES_MIXEDCASE, JWST_DATAPRODUCTS
 from jwql.utils.logging_functions import log_info, log_fail
 from jwql.utils.monitor_utils import initialize_instrument_monitor, update_monitor_table
 from jwql.utils.permissions import set_permissions
-from jwql.utils.utils import copy_files, ensure_dir_exists, get_config, filesystem_path
+from jwql.utils.utils import ensure_dir_exists, get_config, filesystem_path, stage_files
 
 THRESHOLDS_FILE = os.path.join(os.path.split(__file__)[0], 'dark_monitor_file_thresholds.txt')
 
+# Exposure types of the dark current files for each instrument
+DARK_EXP_TYPES = {'nircam': ['NRC_DARK'],
+                  'niriss': ['NIS_DARK'],
+                  'nirspec': ['NRS_DARK'],
+                  'fgs': ['FGS_DARK'],
+                  'miri': ['MIR_DARKALL', 'MIR_DARKIMG', 'MIR_DARKMRS']}
+
+# Number of rows of the slope image stack to sigma-clip at one time when
+# creating the mean slope image. This keeps the memory needed to combine
+# large numbers of full frame slope images bounded.
+MEAN_IMAGE_ROWS_PER_TILE = 64
+
+# Number of runs in which the dark monitor tries to finish a work unit
+# before giving up on it
+MAX_RESUME_ATTEMPTS = 3
+
+# Stages of work on an instrument/aperture combination recorded in the
+# run journal, in order
+JOURNAL_STAGES = ['discovered', 'pipelined', 'combined', 'committed', 'baseline_updated']
+
+# Longest time span, in days, covered by the combined MAST query for each
+# instrument. Apertures whose searches start earlier than this (e.g.
+# those that have never been searched) are queried separately, so that
+# they do not widen the combined query for all other apertures.
+MAX_COMBINED_QUERY_DAYS = 30.
+
+# Maximum number of MAST queries for single apertures run at once
+MAX_QUERY_THREADS = 8
+
+
+def load_run_journals(directory):
+    """Load the journals of all unfinished work units
+
+    Parameters
+    ----------
+    directory : str
+        Directory containing the run journals
+
+    Returns
+    -------
+    journals : list
+        List of ``RunJournal`` objects
+    """
+
+    journals = []
+    if not os.path.isdir(directory):
+        return journals
+
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename)) as journal_file:
+                state = json.load(journal_file)
+            journals.append(RunJournal(directory, state['instrument'], state['aperture']))
+
+    return journals
+
 
 def mast_query_darks(instrument, aperture, start_date, end_date):
     """Use ``astroquery`` to search MAST for dark current data
@@ -109,21 +192,8 @@ def mast_query_darks(instrument, aperture, start_date, end_date):
     """
 
     # Make sure instrument is correct case
-    if instrument.lower() == 'nircam':
-        instrument = 'NIRCam'
-        dark_template = ['NRC_DARK']
-    elif instrument.lower() == 'niriss':
-        instrument = 'NIRISS'
-        dark_template = ['NIS_DARK']
-    elif instrument.lower() == 'nirspec':
-        instrument = 'NIRSpec'
-        dark_template = ['NRS_DARK']
-    elif instrument.lower() == 'fgs':
-        instrument = 'FGS'
-        dark_template = ['FGS_DARK']
-    elif instrument.lower() == 'miri':
-        instrument = 'MIRI'
-        dark_template = ['MIR_DARKALL', 'MIR_DARKIMG', 'MIR_DARKMRS']
+    dark_template = DARK_EXP_TYPES[instrument.lower()]
+    instrument = JWST_INSTRUMENT_NAMES_MIXEDCASE[instrument.lower()]
 
     # monitor_mast.instrument_inventory does not allow list inputs to
     # the added_filters input (or at least if you do provide a list, then
@@ -146,13 +216,354 @@ def mast_query_darks(instrument, aperture, start_date, end_date):
     return query_results
 
 
+def mast_query_darks_concurrently(searches, end_date):
+    """Search MAST for dark current data for several
+    instrument/aperture combinations, using ``mast_query_darks``. The
+    queries are run concurrently.
+
+    Parameters
+    ----------
+    searches : dict
+        Starting date for the search in MJD for each combination. Keys
+        are ``(instrument, aperture)`` tuples.
+
+    end_date : float
+        Ending date for the searches in MJD
+
+    Returns
+    -------
+    query_results : dict
+        List of dictionaries containing the query results for each key
+        of ``searches``
+    """
+
+    if len(searches) == 0:
+        return {}
+
+    def query_mast(search):
+        instrument, aperture = search
+        return mast_query_darks(instrument, aperture, searches[search], end_date)
+
+    with ThreadPoolExecutor(max_workers=min(len(searches), MAX_QUERY_THREADS)) as executor:
+        query_results = dict(zip(searches, executor.map(query_mast, searches)))
+
+    return query_results
+
+
+def mast_query_darks_by_aperture(start_dates, end_date,
+                                 query_service=monitor_mast.instrument_inventory):
+    """Search MAST for dark current data from several instruments at
+    once, and sort the results by aperture. Rather than searching for
+    each aperture separately, a single query is made for each
+    instrument and dark exposure type, filtered only by date. These
+    queries are run concurrently.
+
+    Parameters
+    ----------
+    start_dates : dict
+        Starting date for the search in MJD for each instrument. Keys
+        are instrument names (e.g. ``nircam``)
+
+    end_date : float
+        Ending date for the search in MJD
+
+    query_service : func
+        Function used to query MAST. Must have the same call signature
+        as ``monitor_mast.instrument_inventory``. This can be replaced
+        with a local stub for testing.
+
+    Returns
+    -------
+    query_results : dict
+        Query results for each instrument. Keys are instrument names,
+        and values are dictionaries whose keys are aperture names and
+        whose values are lists of dictionaries containing the query
+        results for that aperture. Instruments for which MAST returns
+        fewer results than match any of the queries are left out, and
+        should be searched for separately.
+    """
+
+    # As in mast_query_darks, query once for each dark template
+    requests = [(instrument, template_name) for instrument in start_dates
+                for template_name in DARK_EXP_TYPES[instrument.lower()]]
+
+    def query_mast(request):
+        instrument, template_name = request
+        parameters = {"date_obs_mjd": {"min": start_dates[instrument], "max": end_date},
+                      "exp_type": template_name}
+        return query_service(JWST_INSTRUMENT_NAMES_MIXEDCASE[instrument.lower()],
+                             dataproduct=JWST_DATAPRODUCTS, add_filters=parameters,
+                             return_data=True, caom=False)
+
+    query_results = {instrument: {} for instrument in start_dates}
+    if len(requests) == 0:
+        return query_results
+
+    incomplete = set()
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        queries = executor.map(query_mast, requests)
+
+        for (instrument, template_name), query in zip(requests, queries):
+
+            # Make sure that no results are missing before they are
+            # split up by aperture
+            total = query.get('paging', {}).get('rowsFiltered', len(query['data']))
+            if len(query['data']) < total:
+                logging.warning('MAST returned {} of {} {} {} files. Not using the combined '
+                                'search for {}.'.format(len(query['data']), total, instrument,
+                                                        template_name, instrument))
+                incomplete.add(instrument)
+                continue
+
+            for entry in query['data']:
+                query_results[instrument].setdefault(entry['apername'], []).append(entry)
+
+    for instrument in incomplete:
+        del query_results[instrument]
+
+    return query_results
+
+
+def split_mast_searches(search_starts, end_date, max_days=MAX_COMBINED_QUERY_DAYS):
+    """Divide the MAST searches for new dark current files into those
+    made with a single query for each instrument, and those made
+    separately for a single aperture. Combining the searches for an
+    instrument means that all of them start at the earliest search
+    start time, so only searches starting within ``max_days`` of
+    ``end_date`` are combined.
+
+    Parameters
+    ----------
+    search_starts : dict
+        Nested dictionary of search start times in MJD, keyed by
+        instrument and then by aperture
+
+    end_date : float
+        Ending date for the searches in MJD
+
+    max_days : float
+        Longest time span, in days, of a combined search
+
+    Returns
+    -------
+    combined_starts : dict
+        Start time of the combined search for each instrument, as
+        used by ``mast_query_darks_by_aperture``. Instruments without
+        any searches to combine are not included.
+
+    separate_starts : dict
+        Start time of each separate search, keyed by ``(instrument,
+        aperture)``, as used by
+        ``mast_query_darks_concurrently``
+    """
+
+    combined_starts = {}
+    separate_starts = {}
+    for instrument in search_starts:
+        for aperture, search_start in search_starts[instrument].items():
+            if search_start < end_date - max_days:
+                separate_starts[(instrument, aperture)] = search_start
+            else:
+                earliest_start = combined_starts.get(instrument, search_start)
+                combined_starts[instrument] = min(earliest_start, search_start)
+
+    return combined_starts, separate_starts
+
+
+def process_aperture(work_unit, output_dir, use_running_baseline=False, pipeline_processes=None):
+    """Run the dark monitor on the new files for a single
+    instrument/aperture combination. A new instance of ``Dark`` is used
+    for each aperture, so that several apertures can be processed in
+    parallel. Any exception raised while processing is caught and
+    logged, so that a failure on one aperture does not affect the
+    others.
+
+    Parameters
+    ----------
+    work_unit : ApertureWorkUnit
+        Description of the work to be done for the aperture
+
+    output_dir : str
+        Path into which outputs will be placed
+
+    use_running_baseline : bool
+        Passed on to ``Dark``
+
+    pipeline_processes : int
+        Number of processes used to run the files for the aperture
+        through the pipeline. If ``None``, the number of ``cores`` in
+        the configuration file is used.
+
+    Returns
+    -------
+    work_unit : ApertureWorkUnit
+        The input ``work_unit``
+
+    monitor_run : bool
+        ``True`` if the monitor completed successfully for the aperture
+    """
+
+    monitor = Dark(use_running_baseline=use_running_baseline)
+    monitor.output_dir = output_dir
+    monitor.pipeline_processes = pipeline_processes
+    start_time = time.time()
+
+    try:
+        monitor.process_work_unit(work_unit)
+        monitor_run = True
+        logging.info('Dark monitor completed for {}, {} in {:.1f} seconds'
+                     .format(work_unit.instrument, work_unit.aperture, time.time() - start_time))
+    except Exception as error:
+        logging.exception('Dark monitor failed for {}, {}: {}'
+                          .format(work_unit.instrument, work_unit.aperture, error))
+        monitor_run = False
+
+    return work_unit, monitor_run
+
+
+def run_pipeline_on_file(filename, required_steps):
+    """Run the required ``calwebb_detector1`` steps that have not yet
+    been completed on a single dark current ramp, producing a slope
+    file. Any exception raised by the pipeline is caught and logged, so
+    that a failure on one file does not affect the processing of other
+    files.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the dark current file
+
+    required_steps : collections.OrderedDict
+        Dictionary of pipeline steps that must be completed, as
+        returned by ``pipeline_tools.get_pipeline_steps``
+
+    Returns
+    -------
+    processed_file : str
+        Name of the slope file. This is ``filename`` if no pipeline
+        steps need to be run, or ``None`` if the pipeline failed.
+    """
+
+    try:
+        completed_steps = pipeline_tools.completed_pipeline_steps(filename)
+        steps_to_run = pipeline_tools.steps_to_run(required_steps, completed_steps)
+
+        logging.info('\tWorking on file: {}'.format(filename))
+        logging.info('\tPipeline steps that remain to be run:')
+        for item in steps_to_run:
+            logging.info('\t\t{}: {}'.format(item, steps_to_run[item]))
+
+        # Run any remaining required pipeline steps
+        if any(steps_to_run.values()) is False:
+            return filename
+
+        processed_file = filename.replace('.fits', '_{}.fits'.format('rate'))
+
+        # If the slope file already exists, skip the pipeline call
+        if not os.path.isfile(processed_file):
+            filename = os.path.abspath(filename)
+
+            # If the pipeline begins with the steps that the bias monitor
+            # runs, run them with the same parameters, and add the 0th
+            # group of the product after them to the pipeline cache for
+            # the bias monitor to use
+            step_parameters = None
+            save_zeroth_group = None
+            if pipeline_tools.starts_with_shared_steps(steps_to_run):
+                step_parameters = pipeline_tools.SHARED_STEP_PARAMETERS
+                shared_key = pipeline_tools.pipeline_cache_key(
+                    filename, pipeline_tools.SHARED_STEPS, step_parameters)
+                if (shared_key is not None
+                        and pipeline_tools.find_cached_pipeline_product(shared_key) is None):
+                    save_zeroth_group = [list(pipeline_tools.SHARED_STEPS)[-1]]
+
+            logging.info('\tRunning pipeline on {}'.format(filename))
+            processed_file = pipeline_tools.run_calwebb_detector1_steps(
+                filename, steps_to_run, step_parameters=step_parameters,
+                save_zeroth_group=save_zeroth_group)
+            logging.info('\tPipeline complete. Output: {}'.format(processed_file))
+
+            if save_zeroth_group is not None:
+                zeroth_group_file = filename.replace(
+                    '.fits', '_{}_0thgroup.fits'.format(save_zeroth_group[0]))
+                try:
+                    pipeline_tools.cache_pipeline_product(shared_key, zeroth_group_file)
+                    logging.info('\tAdded {} to the pipeline cache'.format(zeroth_group_file))
+                except OSError as error:
+                    logging.warning('\tUnable to add {} to the pipeline cache: {}'
+                                    .format(zeroth_group_file, error))
+                finally:
+                    if os.path.isfile(zeroth_group_file):
+                        os.remove(zeroth_group_file)
+        else:
+            logging.info('\tSlope file {} already exists. Skipping call to pipeline.'
+                         .format(processed_file))
+
+    except Exception as error:
+        logging.error('\tError running pipeline on {}: {}'.format(filename, error))
+        processed_file = None
+
+    return processed_file
+
+
+class ApertureWorkUnit():
+    """Description of the work needed to run the dark monitor for a
+    single instrument/aperture combination.
+
+    Parameters
+    ----------
+    instrument : str
+        Name of instrument used to collect the dark current data
+
+    aperture : str
+        Name of the aperture used for the dark current (e.g.
+        ``NRCA1_FULL``)
+
+    query_start : float
+        MJD start date of the MAST query that found the files
+
+    query_end : float
+        MJD end date of the MAST query that found the files
+
+    filenames : list
+        Full paths of the new dark current files in the filesystem
+
+    files_found : int
+        Number of new files returned by the MAST query
+
+    full_frame : bool
+        ``True`` if the aperture is a full frame aperture
+    """
+
+    def __init__(self, instrument, aperture, query_start, query_end, filenames, files_found,
+                 full_frame):
+        """Initialize an instance of the ``ApertureWorkUnit`` class."""
+
+        self.instrument = instrument
+        self.aperture = aperture
+        self.query_start = query_start
+        self.query_end = query_end
+        self.filenames = filenames
+        self.files_found = files_found
+        self.full_frame = full_frame
+
+    @property
+    def priority(self):
+        """Scheduling priority of the work unit. Full frame apertures
+        take by far the longest to process, so they come first,
+        followed by the apertures with the most files.
+        """
+
+        return (self.full_frame, len(self.filenames))
+
+
 class Dark():
     """Class for executing the dark current monitor.
 
     This class will search for new (since the previous instance of the
     class) dark current files in the file system. It will loop over
     instrument/aperture combinations and find the number of new dark
-    current files available. If there are enough, it will copy the files
+    current files available. If there are enough, it will stage the files
     over to a working directory and run the monitor. This will create a
     mean dark current rate image, create a histogram of the dark current
     values, and fit several functions to the histogram. It will also
@@ -162,9 +573,12 @@ class Dark():
 
     Parameters
     ----------
-    testing : bool
-        For pytest. If ``True``, an instance of ``Dark`` is created, but
-        no other code is executed.
+    use_running_baseline : bool
+        If ``True``, full frame data are compared against a
+        ``RunningBaseline`` for each aperture, built up from all
+        previous slope images, rather than against a single baseline
+        mean slope image. The new slope images are then folded into
+        the running baseline.
 
     Attributes
     ----------
@@ -195,31 +609,59 @@ class Dark():
         Table containing lists of hot/dead/noisy pixels found for each
         instrument/detector
 
+    badpix_maps : dict
+        Boolean maps of the bad pixels already present in
+        ``pixel_table``. Keys are ``(detector, pixel_type)`` tuples,
+        and values are dictionaries containing the ``map``, the
+        ``last_id`` of the ``pixel_table`` entries included in it, and
+        the number of entries read, ``num_read``.
+
     stats_table : sqlalchemy table
         Table containing dark current analysis results. Mean/stdev
         values, histogram information, Gaussian fitting results, etc.
 
+    journal : RunJournal
+        Record of the progress made on the current instrument/aperture
+        combination, used to resume interrupted runs
+
+    pipeline_processes : int
+        Number of processes used to run files through the pipeline. If
+        ``None``, the number of ``cores`` in the configuration file is
+        used.
+
     Raises
     ------
     ValueError
         If encountering an unrecognized bad pixel type
-
-    ValueError
-        If the most recent query search returns more than one entry
     """
 
-    def __init__(self):
+    def __init__(self, use_running_baseline=False):
         """Initialize an instance of the ``Dark`` class."""
 
+        self.use_running_baseline = use_running_baseline
+
+        # Record of progress on the current work unit, if any
+        self.journal = None
+
+        # Share of the cores available to the pipeline, if limited
+        self.pipeline_processes = None
+
+        # Maps of previously found bad pixels, keyed by (detector, type)
+        self.badpix_maps = {}
+
     def add_bad_pix(self, coordinates, pixel_type, files, mean_filename, baseline_filename,
-                    observation_start_time, observation_mid_time, observation_end_time):
-        """Add a set of bad pixels to the bad pixel database table
+                    observation_start_time, observation_mid_time, observation_end_time,
+                    connection=None):
+        """Add a set of bad pixels to the bad pixel database table. The
+        map of existing bad pixels is not updated here; call
+        ``update_badpix_map`` once the entry has been committed.
 
         Parameters
         ----------
         coordinates : tuple
-            Tuple of two lists, containing x,y coordinates of bad
-            pixels (Output of ``np.where`` call)
+            Tuple of two lists, containing the row and column
+            coordinates of bad pixels in the full frame coordinate
+            system
 
         pixel_type : str
             Type of bad pixel. Options are ``dead``, ``hot``, and
@@ -245,14 +687,22 @@ class Dark():
 
         observation_end_time : datetime.datetime
             Observation time of the latest file in ``files``
+
+        connection : sqlalchemy.engine.Connection
+            Connection of the transaction in which to add the entry. If
+            ``None``, the entry is added in a transaction of its own.
         """
 
         logging.info('Adding {} {} pixels to database.'.format(len(coordinates[0]), pixel_type))
 
+        # Store the pixels as a compact encoded mask rather than as
+        # lists of coordinates. The x_coord and y_coord columns are
+        # only filled in entries made before the masks were added.
+        pixel_mask = pixel_masks.coordinates_to_mask(coordinates, self.get_full_frame_shape())
+
         source_files = [os.path.basename(item) for item in files]
         entry = {'detector': self.detector,
-                 'x_coord': coordinates[0],
-                 'y_coord': coordinates[1],
+                 'pixel_mask': pixel_masks.encode_mask(pixel_mask),
                  'type': pixel_type,
                  'source_files': source_files,
                  'obs_start_time': observation_start_time,
@@ -261,18 +711,107 @@ class Dark():
                  'mean_dark_image_file': os.path.basename(mean_filename),
                  'baseline_file': os.path.basename(baseline_filename),
                  'entry_date': datetime.datetime.now()}
-        self.pixel_table.__table__.insert().execute(entry)
+        if connection is None:
+            with engine.begin() as connection:
+                connection.execute(self.pixel_table.__table__.insert(), entry)
+        else:
+            connection.execute(self.pixel_table.__table__.insert(), entry)
+
+    def classify_bad_pixels(self, mean_image=None, comparison_image=None, noise_image=None,
+                            baseline_noise_image=None, hot_threshold=2., dead_threshold=0.1,
+                            noise_threshold=1.5):
+        """Compare new slope and noise images to baseline images and
+        flag the hot, dead, and noisy pixels in a single bitmask image.
+        Pixels with ratios of the mean slope image to the baseline slope
+        image above ``hot_threshold`` are hot, and those with ratios
+        below ``dead_threshold`` are dead. Pixels with ratios of the
+        noise image to the baseline noise image above
+        ``noise_threshold`` are noisy. Where the baseline is zero, one
+        is added to both images to avoid dividing by zero. The input
+        images are not modified.
+
+        Parameters
+        ----------
+        mean_image : numpy.ndarray
+            2D array containing the slope image from the new data. If
+            ``None``, hot and dead pixels are not searched for.
+
+        comparison_image : numpy.ndarray
+            2D array containing the baseline slope image to compare
+            against the new slope image.
+
+        noise_image : numpy.ndarray
+            2D array containing the noise image from the new data. If
+            ``None``, noisy pixels are not searched for.
+
+        baseline_noise_image : numpy.ndarray
+            2D array containing the baseline noise image to compare
+            against the new noise image.
+
+        hot_threshold : float
+            ``(mean_image / comparison_image)`` ratio value above which
+            a pixel is considered hot.
+
+        dead_threshold : float
+            ``(mean_image / comparison_image)`` ratio value below which
+            a pixel is considered dead.
+
+        noise_threshold : float
+            ``(noise_image / baseline_noise_image)`` ratio value above
+            which a pixel is considered noisy.
+
+        Returns
+        -------
+        bitmask : numpy.ndarray
+            2D ``uint8`` array with the bits in
+            ``pixel_masks.BADPIX_BITS`` set for each type of bad pixel
+
+        flat_indices : dict
+            Indexes into the flattened image of the pixels of each bad
+            pixel type. Keys are ``hot``, ``dead``, and ``noisy``.
+        """
+
+        comparisons = []
+        if mean_image is not None:
+            comparisons.append((mean_image, comparison_image,
+                                [(pixel_masks.HOT_PIXEL, np.greater, hot_threshold),
+                                 (pixel_masks.DEAD_PIXEL, np.less, dead_threshold)]))
+        if noise_image is not None:
+            comparisons.append((noise_image, baseline_noise_image,
+                                [(pixel_masks.NOISY_PIXEL, np.greater, noise_threshold)]))
+
+        bitmask = None
+        for image, baseline, checks in comparisons:
+            if bitmask is None:
+                bitmask = np.zeros(image.shape, dtype=np.uint8)
+
+            # Avoid divide by zeros, without changing the inputs
+            zeros = baseline == 0.
+            ratio = np.divide(image + zeros, baseline + zeros)
+
+            for bit, compare, threshold in checks:
+                bitmask[compare(ratio, threshold)] |= bit
+
+        flat_bitmask = bitmask.ravel()
+        flat_indices = {}
+        for pixel_type, bit in pixel_masks.BADPIX_BITS.items():
+            flat_indices[pixel_type] = np.flatnonzero(flat_bitmask & bit)
+
+        return bitmask, flat_indices
 
     def get_metadata(self, filename):
         """Collect basic metadata from a fits file
 
         Parameters
         ----------
-        filename : str
-            Name of fits file to examine
+        filename : str or FileMetadata
+            Name of fits file to examine, or its ``FileMetadata``
         """
 
-        header = fits.getheader(filename)
+        if not isinstance(filename, instrument_properties.FileMetadata):
+            with instrument_properties.FileMetadata(filename) as metadata:
+                return self.get_metadata(metadata)
+        header = filename.header
 
         try:
             self.detector = header['DETECTOR']
@@ -295,8 +834,9 @@ class Dark():
         Parameters
         ----------
         badpix : tuple
-            Tuple of lists containing x and y pixel coordinates. (Output
-            of ``numpy.where`` call)
+            Tuple of lists containing the row and column coordinates of
+            the bad pixels in the full frame coordinate system. (Output
+            of ``numpy.where`` call, shifted by ``shift_to_full_frame``)
 
         pixel_type : str
             Type of bad pixel being examined. Options are ``hot``,
@@ -304,40 +844,24 @@ class Dark():
 
         Returns
         -------
-        new_pixels_x : list
-            List of x coordinates of new bad pixels
+        new_pixels_rows : list
+            List of row (y) coordinates of new bad pixels
 
-        new_pixels_y : list
-            List of y coordinates of new bad pixels
+        new_pixels_columns : list
+            List of column (x) coordinates of new bad pixels
         """
 
         if pixel_type not in ['hot', 'dead', 'noisy']:
             raise ValueError('Unrecognized bad pixel type: {}'.format(pixel_type))
 
-        db_entries = session.query(self.pixel_table) \
-            .filter(self.pixel_table.type == pixel_type) \
-            .filter(self.pixel_table.detector == self.detector) \
-            .all()
-
-        already_found = []
-        if len(db_entries) != 0:
-            for _row in db_entries:
-                x_coords = _row.x_coord
-                y_coords = _row.y_coord
-                for x, y in zip(x_coords, y_coords):
-                    already_found.append((x, y))
-
         # Check to see if each pixel already appears in the database for
         # the given bad pixel type
-        new_pixels_x = []
-        new_pixels_y = []
-        for x, y in zip(badpix[0], badpix[1]):
-            pixel = (x, y)
-            if pixel not in already_found:
-                new_pixels_x.append(x)
-                new_pixels_y.append(y)
+        already_found = self.get_badpix_map(pixel_type)
+        rows = np.asarray(badpix[0], dtype=int)
+        columns = np.asarray(badpix[1], dtype=int)
+        new_pixels = ~already_found[rows, columns]
 
-        return (new_pixels_x, new_pixels_y)
+        return (rows[new_pixels].tolist(), columns[new_pixels].tolist())
 
     def find_hot_dead_pixels(self, mean_image, comparison_image, hot_threshold=2., dead_threshold=0.1):
         """Create the ratio of the slope image to a baseline slope
@@ -365,25 +889,138 @@ class Dark():
         Returns
         -------
         hotpix : tuple
-            Tuple (of lists) containing x,y coordinates of newly hot
-            pixels
+            Tuple (of arrays) containing the row and column coordinates
+            of newly hot pixels
 
         deadpix : tuple
-            Tuple (of lists) containing x,y coordinates of newly dead
-            pixels
+            Tuple (of arrays) containing the row and column coordinates
+            of newly dead pixels
         """
 
-        # Avoid divide by zeros
-        zeros = comparison_image == 0.
-        comparison_image[zeros] = 1.
-        mean_image[zeros] += 1.
-
-        ratio = mean_image / comparison_image
-        hotpix = np.where(ratio > hot_threshold)
-        deadpix = np.where(ratio < dead_threshold)
+        bitmask, flat_indices = self.classify_bad_pixels(mean_image, comparison_image,
+                                                         hot_threshold=hot_threshold,
+                                                         dead_threshold=dead_threshold)
+        hotpix = np.unravel_index(flat_indices['hot'], bitmask.shape)
+        deadpix = np.unravel_index(flat_indices['dead'], bitmask.shape)
 
         return hotpix, deadpix
 
+    def full_frame(self):
+        """Return ``True`` if the current aperture is a full frame
+        aperture. Hot, dead, and noisy pixels are only searched for in
+        full frame data.
+        """
+
+        return Siaf(self.instrument)[self.aperture].AperType == 'FULLSCA'
+
+    def get_badpix_map(self, pixel_type):
+        """Return a boolean map of the pixels on the current detector
+        that are already listed as ``pixel_type`` bad pixels in the
+        bad pixel database table. The map is cached in a file in the
+        output directory, so that only entries added to the table since
+        the previous call need to be read from the database. If an
+        entry with a lower id than those already read has since been
+        committed (e.g. by another aperture on the same detector), the
+        map is rebuilt from the whole table.
+
+        Parameters
+        ----------
+        pixel_type : str
+            Type of bad pixel. Options are ``hot``, ``dead``, and
+            ``noisy``
+
+        Returns
+        -------
+        badpix_map : numpy.ndarray
+            2D boolean array in the full frame coordinate system.
+            ``True`` for pixels that have been previously identified
+        """
+
+        key = (self.detector, pixel_type)
+        if key not in self.badpix_maps:
+            map_file = self.get_badpix_map_filename(pixel_type)
+            if os.path.isfile(map_file):
+                with np.load(map_file) as cached:
+                    shape = tuple(cached['shape'])
+                    badpix_map = np.unpackbits(cached['map'], count=shape[0] * shape[1])
+                    badpix_map = badpix_map.reshape(shape).astype(bool)
+                    last_id = int(cached['last_id'])
+                    num_read = int(cached['num_read']) if 'num_read' in cached else None
+            else:
+                badpix_map = np.zeros(self.get_full_frame_shape(), dtype=bool)
+                last_id = 0
+                num_read = 0
+            self.badpix_maps[key] = {'map': badpix_map, 'last_id': last_id, 'num_read': num_read}
+
+        cached = self.badpix_maps[key]
+        entries = session.query(self.pixel_table.id, self.pixel_table.pixel_mask) \
+            .filter(self.pixel_table.type == pixel_type) \
+            .filter(self.pixel_table.detector == self.detector)
+
+        # Entries are not always committed in the order of their ids, so
+        # an entry with an id below last_id may have been committed after
+        # the map was updated. In that case, the number of entries up to
+        # last_id no longer matches the number read, and the map is
+        # rebuilt from the whole table.
+        num_entries = entries.filter(self.pixel_table.id <= cached['last_id']).count()
+        if num_entries != cached['num_read']:
+            logging.info('\tRebuilding the map of existing {} pixels for {}'
+                         .format(pixel_type, self.detector))
+            cached['map'][:] = False
+            cached['last_id'] = 0
+            cached['num_read'] = 0
+
+        # Add any bad pixels entered into the database since the map
+        # was last updated
+        db_entries = entries.filter(self.pixel_table.id > cached['last_id']).all()
+        cached['num_read'] += len(db_entries)
+
+        if len(db_entries) != 0:
+            unencoded_ids = []
+            for entry_id, pixel_mask in db_entries:
+                if pixel_mask is None:
+                    unencoded_ids.append(entry_id)
+                else:
+                    cached['map'] |= pixel_masks.decode_mask(pixel_mask)
+                cached['last_id'] = max(cached['last_id'], entry_id)
+
+            # Entries made before the encoded masks were added only
+            # have the coordinates of the bad pixels. These were written
+            # with the row in x_coord and the column in y_coord, each
+            # offset by the 1-indexed full frame SUBSTRT1/SUBSTRT2 value
+            # of 1 (bad pixels are only searched for in full frame data).
+            if len(unencoded_ids) != 0:
+                coord_entries = session.query(self.pixel_table.x_coord, self.pixel_table.y_coord) \
+                    .filter(self.pixel_table.id.in_(unencoded_ids)) \
+                    .all()
+                for rows, columns in coord_entries:
+                    rows = np.asarray(rows, dtype=int) - 1
+                    columns = np.asarray(columns, dtype=int) - 1
+                    cached['map'][rows, columns] = True
+
+            self.save_badpix_map(pixel_type)
+
+        return cached['map']
+
+    def get_badpix_map_filename(self, pixel_type):
+        """Return the name of the file used to cache the map of
+        existing bad pixels of the given type for the current detector
+
+        Parameters
+        ----------
+        pixel_type : str
+            Type of bad pixel. Options are ``hot``, ``dead``, and
+            ``noisy``
+
+        Returns
+        -------
+        filename : str
+            Name of the ``.npz`` file containing the map
+        """
+
+        return os.path.join(self.output_dir, 'badpix_maps',
+                            '{}_{}_badpix_map.npz'.format(self.detector.lower(), pixel_type))
+
     def get_baseline_filename(self):
         """Query the database and return the filename of the baseline
         (comparison) mean dark slope image to use when searching for
@@ -393,7 +1030,8 @@ class Dark():
         Returns
         -------
         filename : str
-            Name of fits file containing the baseline image
+            Name of fits file containing the baseline image, or of the
+            ``.npy`` file containing the mean image of a running baseline
         """
 
         subq = session.query(self.pixel_table.detector,
@@ -414,11 +1052,30 @@ class Dark():
         else:
             filename = query.all()[0].baseline_file
             # Specify the full path
-            filename = os.path.join(self.output_dir, 'mean_slope_images', filename)
+            if filename.endswith('.npy'):
+                filename = os.path.join(self.output_dir, 'running_baselines', filename)
+            else:
+                filename = os.path.join(self.output_dir, 'mean_slope_images', filename)
             logging.info('Baseline filename: {}'.format(filename))
 
         return filename
 
+    def get_full_frame_shape(self):
+        """Return the shape of a full frame image for the current
+        instrument, using the full frame amplifier boundaries
+
+        Returns
+        -------
+        shape : tuple
+            ``(y, x)`` dimensions of a full frame image
+        """
+
+        amps = AMPLIFIER_BOUNDARIES[self.instrument.lower()]
+        xsize = max([amps[amp][0][1] for amp in amps])
+        ysize = max([amps[amp][1][1] for amp in amps])
+
+        return (ysize, xsize)
+
     def identify_tables(self):
         """Determine which database tables to use for a run of the dark
         monitor
@@ -429,6 +1086,25 @@ class Dark():
         self.pixel_table = eval('{}DarkPixelStats'.format(mixed_case_name))
         self.stats_table = eval('{}DarkDarkCurrent'.format(mixed_case_name))
 
+    def latest_search(self):
+        """Query the query history database and return the most recent
+        query for the given ``aperture_name``, whether or not the dark
+        monitor was executed.
+
+        Returns
+        -------
+        query_result : sqlalchemy row
+            Query history table entry, or ``None`` if the aperture has
+            no query history
+        """
+
+        query_result = session.query(self.query_table) \
+            .filter(self.query_table.aperture == self.aperture) \
+            .order_by(self.query_table.end_time_mjd.desc()) \
+            .first()
+
+        return query_result
+
     def most_recent_search(self):
         """Query the query history database and return the information
         on the most recent query for the given ``aperture_name`` where
@@ -441,30 +1117,20 @@ class Dark():
             where the dark monitor was run.
         """
 
-        sub_query = session.query(self.query_table.aperture,
-                                  func.max(self.query_table.end_time_mjd).label('maxdate')
-                                  ).group_by(self.query_table.aperture).subquery('t2')
-
-        # Note that "self.query_table.run_monitor == True" below is
-        # intentional. Switching = to "is" results in an error in the query.
-        query = session.query(self.query_table).join(
-            sub_query,
-            and_(
-                self.query_table.aperture == self.aperture,
-                self.query_table.end_time_mjd == sub_query.c.maxdate,
-                self.query_table.run_monitor == True
-            )
-        ).all()
-
-        query_count = len(query)
-        if query_count == 0:
+        # Only searches in which the monitor was run are considered, so
+        # that searches in which too few files were found do not move
+        # the start date. Note that "self.query_table.run_monitor == True"
+        # below is intentional. Switching = to "is" results in an error
+        # in the query.
+        query_result = session.query(func.max(self.query_table.end_time_mjd)) \
+            .filter(self.query_table.aperture == self.aperture) \
+            .filter(self.query_table.run_monitor == True) \
+            .scalar()
+
+        if query_result is None:
             query_result = 57357.0  # a.k.a. Dec 1, 2015 == CV3
             logging.info(('\tNo query history for {}. Beginning search date will be set to {}.'
                          .format(self.aperture, query_result)))
-        elif query_count > 1:
-            raise ValueError('More than one "most recent" query?')
-        else:
-            query_result = query[0].end_time_mjd
 
         return query_result
 
@@ -489,16 +1155,14 @@ class Dark():
         Returns
         -------
         noisy : tuple
-            Tuple (of lists) of x,y coordinates of newly noisy pixels
+            Tuple (of arrays) of the row and column coordinates of newly
+            noisy pixels
         """
 
-        # Avoid divide by zeros
-        zeros = baseline_noise_image == 0.
-        baseline_noise_image[zeros] = 1.
-        new_noise_image[zeros] += 1.
-
-        ratio = new_noise_image / baseline_noise_image
-        noisy = np.where(ratio > threshold)
+        bitmask, flat_indices = self.classify_bad_pixels(noise_image=new_noise_image,
+                                                         baseline_noise_image=baseline_noise_image,
+                                                         noise_threshold=threshold)
+        noisy = np.unravel_index(flat_indices['noisy'], bitmask.shape)
 
         return noisy
 
@@ -513,106 +1177,124 @@ class Dark():
             files
         """
 
-        # Basic metadata that will be needed later
-        self.get_metadata(file_list[0])
-
-        # Determine which pipeline steps need to be executed
-        required_steps = pipeline_tools.get_pipeline_steps(self.instrument)
-        logging.info('\tRequired calwebb1_detector pipeline steps to have the data in the '
-                     'correct format:')
-        for item in required_steps:
-            logging.info('\t\t{}: {}'.format(item, required_steps[item]))
+        # Use the slope files from a previous, interrupted, run on these
+        # files if they are still present
+        if self.journal is not None and self.journal.resumable('pipelined', 'slope_files'):
+            slope_files = self.journal.state['slope_files']
+            logging.info('\tUsing slope files from a previous run for {}, {}'
+                         .format(self.instrument, self.aperture))
+            self.get_metadata(slope_files[0])
+        else:
+            # Basic metadata that will be needed later
+            self.get_metadata(file_list[0])
+            slope_files = self.run_pipeline(file_list)
+            if self.journal is not None:
+                self.journal.record('pipelined', files=file_list, slope_files=slope_files)
+
+        # Each slope file is opened only once, to read its observation
+        # time, its data for the stack, and the amplifier boundaries
+        slope_metadata = [instrument_properties.FileMetadata(item) for item in slope_files]
+        try:
+            obs_times = []
+            logging.info('\tSlope images to use in the dark monitor for {}, {}:'
+                         .format(self.instrument, self.aperture))
+            for item, metadata in zip(slope_files, slope_metadata):
+                logging.info('\t\t{}'.format(item))
+                # Get the observation time for each file
+                obstime = instrument_properties.get_obstime(metadata)
+                obs_times.append(obstime)
+
+            # Find the earliest and latest observation time, and calculate
+            # the mid-time.
+            min_time = np.min(obs_times)
+            max_time = np.max(obs_times)
+            mid_time = instrument_properties.mean_time(obs_times)
+
+            if self.journal is not None and self.journal.resumable('combined', 'mean_slope_file'):
+                # Use the mean slope image from a previous, interrupted, run
+                mean_slope_file = self.journal.state['mean_slope_file']
+                slope_image_stack = None
+                logging.info('\tUsing mean slope image from a previous run: {}'
+                             .format(mean_slope_file))
+
+                # The previous run may have been interrupted after its
+                # results were committed, but before this was recorded.
+                # The running baseline is only updated after that, so it
+                # does not yet contain these slope images.
+                if self.results_committed(mean_slope_file):
+                    logging.info('\tResults for {} were already committed'.format(mean_slope_file))
+                    self.journal.record('committed',
+                                        baseline_pending=self.uses_running_baseline())
+                    self.resume_baseline_update()
+                    return
+                slope_image, stdev_image = self.read_baseline_slope_image(mean_slope_file)
+            else:
+                # Read in all slope images and place into a stack. The stack
+                # is backed by a scratch file in the working directory so that
+                # it is read in one tile at a time when creating the mean image
+                slope_image_stack, slope_exptimes = pipeline_tools.image_stack(
+                    slope_metadata, memmap_dir=self.data_dir)
+
+                # Calculate a mean slope image from the inputs
+                slope_image, stdev_image = calculations.mean_image(
+                    slope_image_stack, sigma_threshold=3, rows_per_tile=MEAN_IMAGE_ROWS_PER_TILE)
+                mean_slope_file = self.save_mean_slope_image(slope_image, stdev_image, slope_files)
+                logging.info('\tSigma-clipped mean of the slope images saved to: {}'
+                             .format(mean_slope_file))
+                if self.journal is not None:
+                    self.journal.record('combined', mean_slope_file=mean_slope_file)
+
+            # Find amplifier boundaries so per-amp statistics can be calculated
+            number_of_amps, amp_bounds = instrument_properties.amplifier_info(slope_metadata[0])
+            logging.info('\tAmplifier boundaries: {}'.format(amp_bounds))
+        finally:
+            for metadata in slope_metadata:
+                metadata.close()
 
-        # Modify the list of pipeline steps to skip those not needed for the
-        # preparation of dark current data
-        required_steps['dark_current'] = False
-        required_steps['persistence'] = False
-
-        # NIRSpec IR^2 readout pattern NRSIRS2 is the only one with
-        # nframes not a power of 2
-        if self.read_pattern not in pipeline_tools.GROUPSCALE_READOUT_PATTERNS:
-            required_steps['group_scale'] = False
-
-        # Run pipeline steps on files, generating slope files
-        slope_files = []
-        for filename in file_list:
-
-            completed_steps = pipeline_tools.completed_pipeline_steps(filename)
-            steps_to_run = pipeline_tools.steps_to_run(required_steps, completed_steps)
-
-            logging.info('\tWorking on file: {}'.format(filename))
-            logging.info('\tPipeline steps that remain to be run:')
-            for item in steps_to_run:
-                logging.info('\t\t{}: {}'.format(item, steps_to_run[item]))
-
-            # Run any remaining required pipeline steps
-            if any(steps_to_run.values()) is False:
-                slope_files.append(filename)
-            else:
-                processed_file = filename.replace('.fits', '_{}.fits'.format('rate'))
-
-                # If the slope file already exists, skip the pipeline call
-                if not os.path.isfile(processed_file):
-                    logging.info('\tRunning pipeline on {}'.format(filename))
-                    processed_file = pipeline_tools.run_calwebb_detector1_steps(os.path.abspath(filename), steps_to_run)
-                    logging.info('\tPipeline complete. Output: {}'.format(processed_file))
-
-                else:
-                    logging.info('\tSlope file {} already exists. Skipping call to pipeline.'
-                                 .format(processed_file))
-                    pass
-
-                slope_files.append(processed_file)
-
-                # Delete the original dark ramp file to save disk space
-                os.remove(filename)
-
-        obs_times = []
-        logging.info('\tSlope images to use in the dark monitor for {}, {}:'.format(self.instrument, self.aperture))
-        for item in slope_files:
-            logging.info('\t\t{}'.format(item))
-            # Get the observation time for each file
-            obstime = instrument_properties.get_obstime(item)
-            obs_times.append(obstime)
-
-        # Find the earliest and latest observation time, and calculate
-        # the mid-time.
-        min_time = np.min(obs_times)
-        max_time = np.max(obs_times)
-        mid_time = instrument_properties.mean_time(obs_times)
-
-        # Read in all slope images and place into a list
-        slope_image_stack, slope_exptimes = pipeline_tools.image_stack(slope_files)
-
-        # Calculate a mean slope image from the inputs
-        slope_image, stdev_image = calculations.mean_image(slope_image_stack, sigma_threshold=3)
-        mean_slope_file = self.save_mean_slope_image(slope_image, stdev_image, slope_files)
-        logging.info('\tSigma-clipped mean of the slope images saved to: {}'.format(mean_slope_file))
-
-        # ----- Search for new hot/dead/noisy pixels -----
-        # Read in baseline mean slope image and stdev image
-        # The baseline image is used to look for hot/dead/noisy pixels,
-        # but not for comparing mean dark rates. Therefore, updates to
-        # the baseline can be minimal.
+        # ----- Search for new hot/dead/noisy pixels -----
+        # Read in baseline mean slope image and stdev image
+        # The baseline image is used to look for hot/dead/noisy pixels,
+        # but not for comparing mean dark rates. Therefore, updates to
+        # the baseline can be minimal.
 
         # Limit checks for hot/dead/noisy pixels to full frame data since
         # subarray data have much shorter exposure times and therefore lower
         # signal-to-noise
-        aperture_type = Siaf(self.instrument)[self.aperture].AperType
-        if aperture_type == 'FULLSCA':
-            baseline_file = self.get_baseline_filename()
-            if baseline_file is None:
+        new_bad_pixels = []
+        if self.full_frame():
+            if self.use_running_baseline:
+                baseline_dir = os.path.join(self.output_dir, 'running_baselines')
+                running_baseline = RunningBaseline(baseline_dir, self.instrument, self.aperture)
+                baseline_file = None
+                if running_baseline.exists():
+                    baseline_file = running_baseline.filenames['mean']
+            else:
+                baseline_file = self.get_baseline_filename()
+
+            baseline_images = None
+            if baseline_file is not None:
+                logging.info('\tBaseline file is {}'.format(baseline_file))
+                baseline_images = self.read_baseline_slope_image(baseline_file)
+
+            if baseline_images is None:
                 logging.warning(('\tNo baseline dark current countrate image for {} {}. Setting the '
                                  'current mean slope image to be the new baseline.'.format(self.instrument, self.aperture)))
                 baseline_file = mean_slope_file
                 baseline_mean = deepcopy(slope_image)
                 baseline_stdev = deepcopy(stdev_image)
             else:
-                logging.info('\tBaseline file is {}'.format(baseline_file))
-                baseline_mean, baseline_stdev = self.read_baseline_slope_image(baseline_file)
+                baseline_mean, baseline_stdev = baseline_images
 
-            # Check the hot/dead pixel population for changes
-            new_hot_pix, new_dead_pix = self.find_hot_dead_pixels(slope_image, baseline_mean)
+            # Check the hot/dead/noisy pixel populations for changes,
+            # and save the resulting bitmask alongside the mean slope image
+            badpix_bitmask, badpix_indices = self.classify_bad_pixels(slope_image, baseline_mean,
+                                                                      stdev_image, baseline_stdev)
+            bitmask_file = self.save_badpix_bitmask(badpix_bitmask, mean_slope_file)
+            logging.info('\tBad pixel bitmask saved to: {}'.format(bitmask_file))
+
+            new_hot_pix = np.unravel_index(badpix_indices['hot'], badpix_bitmask.shape)
+            new_dead_pix = np.unravel_index(badpix_indices['dead'], badpix_bitmask.shape)
+            new_noisy_pixels = np.unravel_index(badpix_indices['noisy'], badpix_bitmask.shape)
 
             # Shift the coordinates to be in full frame coordinate system
             new_hot_pix = self.shift_to_full_frame(new_hot_pix)
@@ -622,15 +1304,8 @@ class Dark():
             new_hot_pix = self.exclude_existing_badpix(new_hot_pix, 'hot')
             new_dead_pix = self.exclude_existing_badpix(new_dead_pix, 'dead')
 
-            # Add new hot and dead pixels to the database
             logging.info('\tFound {} new hot pixels'.format(len(new_hot_pix[0])))
             logging.info('\tFound {} new dead pixels'.format(len(new_dead_pix[0])))
-            self.add_bad_pix(new_hot_pix, 'hot', file_list, mean_slope_file, baseline_file, min_time, mid_time, max_time)
-            self.add_bad_pix(new_dead_pix, 'dead', file_list, mean_slope_file, baseline_file, min_time, mid_time, max_time)
-
-            # Check for any pixels that are significantly more noisy than
-            # in the baseline stdev image
-            new_noisy_pixels = self.noise_check(stdev_image, baseline_stdev)
 
             # Shift coordinates to be in full_frame coordinate system
             new_noisy_pixels = self.shift_to_full_frame(new_noisy_pixels)
@@ -638,16 +1313,12 @@ class Dark():
             # Exclude previously found noisy pixels
             new_noisy_pixels = self.exclude_existing_badpix(new_noisy_pixels, 'noisy')
 
-            # Add new noisy pixels to the database
             logging.info('\tFound {} new noisy pixels'.format(len(new_noisy_pixels[0])))
-            self.add_bad_pix(new_noisy_pixels, 'noisy', file_list, mean_slope_file, baseline_file, min_time, mid_time, max_time)
+            new_bad_pixels = [(new_hot_pix, 'hot'), (new_dead_pix, 'dead'),
+                              (new_noisy_pixels, 'noisy')]
 
         # ----- Calculate image statistics -----
 
-        # Find amplifier boundaries so per-amp statistics can be calculated
-        number_of_amps, amp_bounds = instrument_properties.amplifier_info(slope_files[0])
-        logging.info('\tAmplifier boundaries: {}'.format(amp_bounds))
-
         # Calculate mean and stdev values, and fit a Gaussian to the
         # histogram of the pixels in each amp
         (amp_mean, amp_stdev, gauss_param, gauss_chisquared, double_gauss_params, double_gauss_chisquared,
@@ -655,6 +1326,7 @@ class Dark():
 
         # Construct new entry for dark database table
         source_files = [os.path.basename(item) for item in file_list]
+        dark_db_entries = []
         for key in amp_mean.keys():
             dark_db_entry = {'aperture': self.aperture, 'amplifier': key, 'mean': amp_mean[key],
                              'stdev': amp_stdev[key],
@@ -678,34 +1350,189 @@ class Dark():
                              'hist_amplitudes': histogram,
                              'entry_date': datetime.datetime.now()
                              }
-            self.stats_table.__table__.insert().execute(dark_db_entry)
+            dark_db_entries.append(dark_db_entry)
+
+        # Add the new bad pixels and the image statistics to the database
+        # in a single transaction, so that an interrupted run never leaves
+        # behind a partial set of results
+        with engine.begin() as connection:
+            for coordinates, pixel_type in new_bad_pixels:
+                self.add_bad_pix(coordinates, pixel_type, file_list, mean_slope_file, baseline_file,
+                                 min_time, mid_time, max_time, connection=connection)
+            for dark_db_entry in dark_db_entries:
+                connection.execute(self.stats_table.__table__.insert(), dark_db_entry)
+
+        baseline_pending = self.uses_running_baseline()
+        if self.journal is not None:
+            self.journal.record('committed', baseline_pending=baseline_pending)
+
+        # Keep the maps of existing bad pixels up to date, now that the
+        # new bad pixels are in the database
+        for coordinates, pixel_type in new_bad_pixels:
+            self.update_badpix_map(coordinates, pixel_type)
+
+        # Fold the new slope images into the running baseline only once
+        # the results of comparing them against it are committed, so
+        # that a resumed run never compares them against (or folds them
+        # into) a baseline that already contains them
+        if baseline_pending:
+            self.update_running_baseline(slope_files, slope_image, stdev_image,
+                                         slope_image_stack=slope_image_stack)
+
+    def process_work_unit(self, work_unit):
+        """Copy the new files for an instrument/aperture combination to
+        a working directory and run the dark monitor on them.
+
+        Parameters
+        ----------
+        work_unit : ApertureWorkUnit
+            Description of the work to be done for the aperture
+        """
+
+        self.instrument = work_unit.instrument
+        self.aperture = work_unit.aperture
+        self.query_start = work_unit.query_start
+        self.query_end = work_unit.query_end
+
+        # Identify which database tables to use
+        self.identify_tables()
+
+        # Set up directories for the copied data
+        ensure_dir_exists(os.path.join(self.output_dir, 'data'))
+        self.data_dir = os.path.join(self.output_dir,
+                                     'data/{}_{}'.format(self.instrument.lower(),
+                                                         self.aperture.lower()))
+        ensure_dir_exists(self.data_dir)
+
+        # Pick up from where any previous, interrupted, run on this work
+        # unit left off
+        self.journal = RunJournal(os.path.join(self.output_dir, 'run_journal'), self.instrument,
+                                  self.aperture)
+        if self.journal.reached('committed'):
+            logging.info('\tResults for {}, {} were already committed by a previous run'
+                         .format(self.instrument, self.aperture))
+            self.resume_baseline_update()
+            return
+        if self.journal.resumable('pipelined', 'slope_files'):
+            dark_files = self.journal.state['files']
+        else:
+            # Stage files from filesystem. The raw ramps are linked rather
+            # than copied where possible, and pipeline outputs are written
+            # next to them in the working directory.
+            dark_files, not_copied = stage_files(work_unit.filenames, self.data_dir)
+
+            logging.info('\tNew_filenames: {}'.format(work_unit.filenames))
+            logging.info('\tData dir: {}'.format(self.data_dir))
+            logging.info('\tStaged in working dir: {}'.format(dark_files))
+            logging.info('\tNot staged: {}'.format(not_copied))
+
+        # Run the dark monitor
+        self.process(dark_files)
+
+    def query_history_entry(self, files_found, monitor_run):
+        """Construct a new entry for the query history table for the
+        current instrument/aperture combination
+
+        Parameters
+        ----------
+        files_found : int
+            Number of new files returned by the MAST query
+
+        monitor_run : bool
+            Whether or not the monitor was run on the new files
+
+        Returns
+        -------
+        new_entry : dict
+            Query history table entry
+        """
+
+        new_entry = {'instrument': self.instrument,
+                     'aperture': self.aperture,
+                     'start_time_mjd': self.query_start,
+                     'end_time_mjd': self.query_end,
+                     'files_found': files_found,
+                     'run_monitor': monitor_run}
+
+        return new_entry
 
     def read_baseline_slope_image(self, filename):
         """Read in a baseline mean slope image and associated standard
-        deviation image from the given fits file
+        deviation image from the given fits file, or from the running
+        baseline whose mean image is in the given ``.npy`` file
 
         Parameters
         ----------
         filename : str
-            Name of fits file to be read in
+            Name of fits file to be read in, or of the ``.npy`` file
+            containing the mean image of a ``RunningBaseline``
 
         Returns
         -------
-        mean_image : numpy.ndarray
-            2D mean slope image
-
-        stdev_image : numpy.ndarray
-            2D stdev image
+        images : tuple
+            ``(mean_image, stdev_image)`` 2D mean slope and stdev images,
+            or ``None`` if the file cannot be read
         """
 
         try:
+            if filename.endswith('.npy'):
+                running_baseline = RunningBaseline.from_mean_file(filename)
+                if not running_baseline.exists():
+                    raise FileNotFoundError('Running baseline files not found')
+                return running_baseline.get_images()
+
             with fits.open(filename) as hdu:
                 mean_image = hdu['MEAN'].data
                 stdev_image = hdu['STDEV'].data
             return mean_image, stdev_image
-        except (FileNotFoundError, KeyError) as e:
+        except (FileNotFoundError, KeyError, ValueError) as e:
             logging.warning('Trying to read {}: {}'.format(filename, e))
 
+    def results_committed(self, mean_slope_file):
+        """Return ``True`` if the image statistics calculated from the
+        given mean slope image have already been added to the dark
+        database table for the current aperture. The statistics are
+        committed in the same transaction as the bad pixels, so this
+        also covers the bad pixel table.
+
+        Parameters
+        ----------
+        mean_slope_file : str
+            Name of the mean slope image file
+
+        Returns
+        -------
+        committed : bool
+            Whether the results have been committed
+        """
+
+        count = session.query(self.stats_table) \
+            .filter(self.stats_table.aperture == self.aperture) \
+            .filter(self.stats_table.mean_dark_image_file == os.path.basename(mean_slope_file)) \
+            .count()
+
+        return count > 0
+
+    def resume_baseline_update(self):
+        """Fold the slope images of a work unit whose results were
+        committed by a previous, interrupted, run into the running
+        baseline, if this was still to be done
+        """
+
+        state = self.journal.state
+        if not state.get('baseline_pending') or self.journal.reached('baseline_updated'):
+            return
+
+        if not (self.journal.resumable('pipelined', 'slope_files')
+                and self.journal.resumable('combined', 'mean_slope_file')):
+            logging.warning('\tSlope images for {}, {} are no longer present. Unable to add them '
+                            'to the running baseline.'.format(self.instrument, self.aperture))
+            return
+
+        logging.info('\tAdding the slope images from a previous run to the running baseline')
+        slope_image, stdev_image = self.read_baseline_slope_image(state['mean_slope_file'])
+        self.update_running_baseline(state['slope_files'], slope_image, stdev_image)
+
     @log_fail
     @log_info
     def run(self):
@@ -727,89 +1554,403 @@ class Dark():
         # Use the current time as the end time for MAST query
         self.query_end = Time.now().mjd
 
-        # Loop over all instruments
+        # Locate the record of the most recent MAST search for each
+        # monitored instrument/aperture combination. The monitor uses
+        # all files since the last time it was run on an aperture, but
+        # the number of files found up to the latest search in which it
+        # was not run is recorded, so those files need not be searched
+        # for again.
+        query_starts = {}
+        search_starts = {}
+        previous_counts = {}
         for instrument in JWST_INSTRUMENT_NAMES:
             self.instrument = instrument
 
             # Identify which database tables to use
             self.identify_tables()
 
-            # Get a list of all possible apertures from pysiaf
+            # Get a list of all possible apertures from pysiaf, keeping
+            # those with a file count threshold
             possible_apertures = list(Siaf(instrument).apernames)
-            possible_apertures = [ap for ap in possible_apertures if ap not in apertures_to_skip]
+            monitored_apertures = set(limits['Aperture'][limits['Instrument'] == instrument])
+            possible_apertures = [ap for ap in possible_apertures
+                                  if ap not in apertures_to_skip and ap in monitored_apertures]
 
+            query_starts[instrument] = {}
+            search_starts[instrument] = {}
+            previous_counts[instrument] = {}
             for aperture in possible_apertures:
+                self.aperture = aperture
+                query_start = self.most_recent_search()
+                latest_search = self.latest_search()
+                query_starts[instrument][aperture] = query_start
+                if latest_search is not None and not latest_search.run_monitor \
+                        and latest_search.start_time_mjd == query_start:
+                    search_starts[instrument][aperture] = latest_search.end_time_mjd
+                    previous_counts[instrument][aperture] = latest_search.files_found
+                else:
+                    search_starts[instrument][aperture] = query_start
+                    previous_counts[instrument][aperture] = 0
+
+        # Query MAST once for each instrument (and dark exposure type),
+        # beginning at the earliest of the recent search start times,
+        # and sort the results by aperture. Apertures not searched
+        # recently are queried separately.
+        combined_starts, separate_starts = split_mast_searches(search_starts, self.query_end)
+        logging.info('Querying MAST for new dark files. Query start times: {}'
+                     .format(combined_starts))
+        all_entries = mast_query_darks_by_aperture(combined_starts, self.query_end)
+
+        # Search separately for the apertures of instruments whose
+        # combined search returned incomplete results
+        for instrument in combined_starts:
+            if instrument not in all_entries:
+                for aperture, search_start in search_starts[instrument].items():
+                    separate_starts.setdefault((instrument, aperture), search_start)
+
+        logging.info('Querying MAST separately for new dark files for {} apertures'
+                     .format(len(separate_starts)))
+        separate_entries = mast_query_darks_concurrently(separate_starts, self.query_end)
+
+        # Work units left unfinished by previous runs are resumed rather
+        # than searching for new files for those apertures
+        journal_dir = os.path.join(self.output_dir, 'run_journal')
+        unfinished = {}
+        for journal in load_run_journals(journal_dir):
+            unfinished[(journal.instrument, journal.aperture)] = journal
+            logging.info('Resuming unfinished work for {}, {} from stage: {}'
+                         .format(journal.instrument, journal.aperture, journal.state['stage']))
+
+        # Loop over all instruments
+        candidates = []
+        refetch_starts = {}
+        for instrument in JWST_INSTRUMENT_NAMES:
+            self.instrument = instrument
+            siaf = Siaf(instrument)
+
+            for aperture in query_starts[instrument]:
                 logging.info('')
                 logging.info('Working on aperture {} in {}'.format(aperture, instrument))
 
+                if (instrument, aperture) in unfinished:
+                    logging.info('\tResuming the work from a previous run. Skipping search for new '
+                                 'files.')
+                    continue
+
                 # Find the appropriate threshold for the number of new files needed
                 match = aperture == limits['Aperture']
                 file_count_threshold = limits['Threshold'][match]
 
-                # Locate the record of the most recent MAST search
+                # Use the time of the most recent previous search as the
+                # starting time
                 self.aperture = aperture
-                self.query_start = self.most_recent_search()
+                self.query_start = query_starts[instrument][aperture]
+                search_start = search_starts[instrument][aperture]
                 logging.info('\tQuery times: {} {}'.format(self.query_start, self.query_end))
 
-                # Query MAST using the aperture and the time of the
-                # most recent previous search as the starting time
-                new_entries = mast_query_darks(instrument, aperture, self.query_start, self.query_end)
-
-                logging.info('\tAperture: {}, new entries: {}'.format(self.aperture, len(new_entries)))
-
-                # Check to see if there are enough new files to meet the
-                # monitor's signal-to-noise requirements
-                if len(new_entries) >= file_count_threshold:
-                    logging.info('\tSufficient new dark files found for {}, {} to run the dark monitor.'
-                                 .format(self.instrument, self.aperture))
-
-                    # Get full paths to the files
-                    new_filenames = []
-                    for file_entry in new_entries:
-                        try:
-                            new_filenames.append(filesystem_path(file_entry['filename']))
-                        except FileNotFoundError:
-                            logging.warning('\t\tUnable to locate {} in filesystem. Not including in processing.'
-                                            .format(file_entry['filename']))
-
-                    # Set up directories for the copied data
-                    ensure_dir_exists(os.path.join(self.output_dir, 'data'))
-                    self.data_dir = os.path.join(self.output_dir,
-                                                 'data/{}_{}'.format(self.instrument.lower(),
-                                                                     self.aperture.lower()))
-                    ensure_dir_exists(self.data_dir)
-
-                    # Copy files from filesystem
-                    dark_files, not_copied = copy_files(new_filenames, self.data_dir)
-
-                    logging.info('\tNew_filenames: {}'.format(new_filenames))
-                    logging.info('\tData dir: {}'.format(self.data_dir))
-                    logging.info('\tCopied to working dir: {}'.format(dark_files))
-                    logging.info('\tNot copied: {}'.format(not_copied))
-
-                    # Run the dark monitor
-                    self.process(dark_files)
-                    monitor_run = True
-
+                # Keep the MAST results for this aperture that fall
+                # between the search start and end times, and add the
+                # files found by earlier searches
+                if (instrument, aperture) in separate_entries:
+                    new_entries = separate_entries[(instrument, aperture)]
                 else:
-                    logging.info(('\tDark monitor skipped. {} new dark files for {}, {}. {} new files are '
-                                  'required to run dark current monitor.').format(
-                        len(new_entries), instrument, aperture, file_count_threshold[0]))
-                    monitor_run = False
-
-                # Update the query history
-                new_entry = {'instrument': instrument,
-                             'aperture': aperture,
-                             'start_time_mjd': self.query_start,
-                             'end_time_mjd': self.query_end,
-                             'files_found': len(new_entries),
-                             'run_monitor': monitor_run,
-                             'entry_date': datetime.datetime.now()}
-                self.query_table.__table__.insert().execute(new_entry)
-                logging.info('\tUpdated the query history table')
+                    instrument_entries = all_entries.get(instrument, {})
+                    new_entries = [entry for entry in instrument_entries.get(aperture, [])
+                                   if search_start <= entry['date_obs_mjd'] <= self.query_end]
+                files_found = previous_counts[instrument][aperture] + len(new_entries)
+
+                logging.info('\tAperture: {}, new entries: {}'.format(self.aperture, files_found))
+
+                # Only the number of files found by earlier searches is
+                # known, so retrieve them if the monitor is to be run
+                if files_found >= file_count_threshold and search_start > self.query_start:
+                    refetch_starts[(instrument, aperture)] = self.query_start
+
+                full_frame = siaf[aperture].AperType == 'FULLSCA'
+                candidates.append((instrument, aperture, self.query_start, new_entries, files_found,
+                                   file_count_threshold, full_frame))
+
+        # Retrieve the files found by earlier searches. These queries
+        # are run concurrently.
+        refetched_entries = mast_query_darks_concurrently(refetch_starts, self.query_end)
+
+        work_units = [journal.work_unit() for journal in unfinished.values()]
+        query_history = []
+        for candidate in candidates:
+            (instrument, aperture, query_start, new_entries, files_found, threshold,
+             full_frame) = candidate
+            self.instrument = instrument
+            self.aperture = aperture
+            self.query_start = query_start
+
+            # Identify which database tables to use
+            self.identify_tables()
+
+            if (instrument, aperture) in refetched_entries:
+                new_entries = refetched_entries[(instrument, aperture)]
+                files_found = len(new_entries)
+
+            # Check to see if there are enough new files to meet the
+            # monitor's signal-to-noise requirements
+            if files_found >= threshold:
+                logging.info('\tSufficient new dark files found for {}, {} to run the dark monitor.'
+                             .format(self.instrument, self.aperture))
+
+                # Get full paths to the files
+                new_filenames = []
+                for file_entry in new_entries:
+                    try:
+                        new_filenames.append(filesystem_path(file_entry['filename']))
+                    except FileNotFoundError:
+                        logging.warning('\t\tUnable to locate {} in filesystem. Not including in '
+                                        'processing.'.format(file_entry['filename']))
+
+                # Save the work needed for this aperture, to be run
+                # once all apertures have been checked
+                work_unit = ApertureWorkUnit(instrument, aperture, self.query_start, self.query_end,
+                                             new_filenames, files_found, full_frame)
+                RunJournal(journal_dir, instrument, aperture).start(work_unit)
+                work_units.append(work_unit)
+
+            else:
+                logging.info(('\tDark monitor skipped. {} new dark files for {}, {}. {} new files '
+                              'are required to run dark current monitor.')
+                             .format(files_found, instrument, aperture, threshold[0]))
+                new_entry = self.query_history_entry(files_found, False)
+                query_history.append((self.query_table, new_entry))
+
+        # Run the dark monitor on the apertures with enough new files
+        results = self.run_work_units(work_units)
+        for work_unit, monitor_run in results:
+            self.instrument = work_unit.instrument
+            self.aperture = work_unit.aperture
+            self.query_start = work_unit.query_start
+            self.query_end = work_unit.query_end
+            self.identify_tables()
+            new_entry = self.query_history_entry(work_unit.files_found, monitor_run)
+            query_history.append((self.query_table, new_entry))
+
+        # Update the query history tables in a single transaction. Entry
+        # dates must be unique, so make sure that no two entries share
+        # the same timestamp.
+        entry_date = datetime.datetime.now()
+        with engine.begin() as connection:
+            for query_table, new_entry in query_history:
+                new_entry['entry_date'] = entry_date
+                connection.execute(query_table.__table__.insert(), new_entry)
+                entry_date = max(datetime.datetime.now(),
+                                 entry_date + datetime.timedelta(microseconds=1))
+        logging.info('Updated the query history tables')
+
+        # Completed work units no longer need to be resumed. Failed ones
+        # are retried by the next run, up to a limit.
+        for work_unit, monitor_run in results:
+            journal = RunJournal(journal_dir, work_unit.instrument, work_unit.aperture)
+            if monitor_run:
+                journal.remove()
+            elif journal.record_failure() >= MAX_RESUME_ATTEMPTS:
+                logging.warning('Giving up on {}, {} after {} failed attempts.'.format(
+                    work_unit.instrument, work_unit.aperture, MAX_RESUME_ATTEMPTS))
+                journal.remove()
 
         logging.info('Dark Monitor completed successfully.')
 
+    def run_pipeline(self, file_list):
+        """Run the required ``calwebb_detector1`` steps on the dark
+        current files, producing slope files. The files are independent
+        of one another, so they are run through the pipeline in
+        parallel. Each dark current file is deleted once its slope file
+        has been created.
+
+        Parameters
+        ----------
+        file_list : list
+            List of filenames (including full paths) to the dark current
+            files
+
+        Returns
+        -------
+        slope_files : list
+            List of slope files. Files on which the pipeline failed are
+            not included.
+        """
+
+        # Determine which pipeline steps need to be executed
+        required_steps = pipeline_tools.get_pipeline_steps(self.instrument)
+        logging.info('\tRequired calwebb1_detector pipeline steps to have the data in the '
+                     'correct format:')
+        for item in required_steps:
+            logging.info('\t\t{}: {}'.format(item, required_steps[item]))
+
+        # Modify the list of pipeline steps to skip those not needed for the
+        # preparation of dark current data
+        required_steps['dark_current'] = False
+        required_steps['persistence'] = False
+
+        # NIRSpec IR^2 readout pattern NRSIRS2 is the only one with
+        # nframes not a power of 2
+        if self.read_pattern not in pipeline_tools.GROUPSCALE_READOUT_PATTERNS:
+            required_steps['group_scale'] = False
+
+        # Run pipeline steps on files, generating slope files. The files
+        # are independent of one another, so they are run through the
+        # pipeline in parallel.
+        if self.pipeline_processes is None:
+            number_of_processes = int(get_config().get('cores', 1))
+        else:
+            number_of_processes = self.pipeline_processes
+        number_of_processes = min(number_of_processes, len(file_list))
+        pipeline_inputs = [(filename, required_steps) for filename in file_list]
+        if number_of_processes > 1 and not multiprocessing.current_process().daemon:
+            pool = multiprocessing.Pool(processes=number_of_processes)
+            pipeline_outputs = pool.starmap(run_pipeline_on_file, pipeline_inputs)
+            pool.close()
+            pool.join()
+        else:
+            pipeline_outputs = [run_pipeline_on_file(*inputs) for inputs in pipeline_inputs]
+
+        slope_files = []
+        for filename, processed_file in zip(file_list, pipeline_outputs):
+            if processed_file is None:
+                logging.warning('\tPipeline failed on {}. Not including in processing.'
+                                .format(filename))
+                continue
+            slope_files.append(processed_file)
+
+            # Delete the staged dark ramp file to save disk space, but
+            # only once the slope file has been created
+            if processed_file != filename and os.path.isfile(processed_file):
+                os.remove(filename)
+
+        if len(slope_files) == 0:
+            raise ValueError('Pipeline failed on all input files for {}, {}.'
+                             .format(self.instrument, self.aperture))
+
+        return slope_files
+
+    def run_work_units(self, work_units):
+        """Run the dark monitor on each of the given instrument/aperture
+        combinations. Apertures are independent of one another, so they
+        are processed in parallel, with the most expensive apertures
+        started first.
+
+        The ``cores`` given in the configuration file are divided
+        between the apertures and the pipeline: up to ``cores``
+        apertures are processed at once, and each of them runs its
+        files through the pipeline using ``cores // apertures``
+        processes. With fewer apertures than cores, the remaining cores
+        are therefore used to run each aperture's files in parallel.
+
+        Parameters
+        ----------
+        work_units : list
+            List of ``ApertureWorkUnit`` objects
+
+        Returns
+        -------
+        results : list
+            List of ``(work_unit, monitor_run)`` tuples, where
+            ``monitor_run`` is ``True`` if the monitor completed
+            successfully for the aperture
+        """
+
+        work_units = sorted(work_units, key=lambda unit: unit.priority, reverse=True)
+        logging.info('Running the dark monitor on {} apertures: {}'
+                     .format(len(work_units), [unit.aperture for unit in work_units]))
+
+        cores = int(get_config().get('cores', 1))
+        number_of_processes = max(min(cores, len(work_units)), 1)
+        pipeline_processes = max(cores // number_of_processes, 1)
+        logging.info('Processing {} apertures at a time, each using {} processes for the pipeline'
+                     .format(number_of_processes, pipeline_processes))
+
+        run_aperture = partial(process_aperture, output_dir=self.output_dir,
+                               use_running_baseline=self.use_running_baseline,
+                               pipeline_processes=pipeline_processes)
+        if number_of_processes > 1:
+            # Database connections cannot be shared with the child
+            # processes, so release them before forking
+            session.close()
+            engine.dispose()
+
+            # Unlike those of multiprocessing.Pool, the executor's worker
+            # processes are not daemonic, so that each of them can start
+            # its own pool of pipeline processes. Work units are started
+            # in the order they are submitted.
+            with ProcessPoolExecutor(max_workers=number_of_processes) as executor:
+                futures = [executor.submit(run_aperture, work_unit) for work_unit in work_units]
+                results = [future.result() for future in as_completed(futures)]
+        else:
+            results = [run_aperture(work_unit) for work_unit in work_units]
+
+        return results
+
+    def save_badpix_bitmask(self, bitmask, mean_slope_file):
+        """Save the bad pixel bitmask created by ``classify_bad_pixels``
+        next to the mean slope image it was created from
+
+        Parameters
+        ----------
+        bitmask : numpy.ndarray
+            2D ``uint8`` bad pixel bitmask
+
+        mean_slope_file : str
+            Name of the mean slope image file
+
+        Returns
+        -------
+        output_filename : str
+            Name of fits file containing the bitmask
+        """
+
+        output_filename = mean_slope_file.replace('_mean_slope_image.fits', '_badpix_bitmask.fits')
+
+        primary_hdu = fits.PrimaryHDU()
+        primary_hdu.header['INSTRUME'] = (self.instrument, 'JWST instrument')
+        primary_hdu.header['APERTURE'] = (self.aperture, 'Aperture name')
+        primary_hdu.header['SLOPEIMG'] = (os.path.basename(mean_slope_file), 'Mean slope image')
+        for pixel_type, bit in pixel_masks.BADPIX_BITS.items():
+            primary_hdu.header['{}_BIT'.format(pixel_type.upper())] = \
+                (bit, 'Bit flagging {} pixels'.format(pixel_type))
+        bitmask_hdu = fits.ImageHDU(bitmask, name='BADPIX')
+        hdu_list = fits.HDUList([primary_hdu, bitmask_hdu])
+        hdu_list.writeto(output_filename, overwrite=True)
+        set_permissions(output_filename)
+
+        return output_filename
+
+    def save_badpix_map(self, pixel_type):
+        """Save the map of existing bad pixels of the given type for
+        the current detector to its cache file
+
+        Parameters
+        ----------
+        pixel_type : str
+            Type of bad pixel. Options are ``hot``, ``dead``, and
+            ``noisy``
+        """
+
+        cached = self.badpix_maps[(self.detector, pixel_type)]
+        map_file = self.get_badpix_map_filename(pixel_type)
+        ensure_dir_exists(os.path.dirname(map_file))
+
+        # Write to a uniquely named temporary file first, so that an
+        # interrupted write does not leave behind a corrupt cache, and
+        # apertures on the same detector being processed at the same
+        # time do not write to the same file
+        file_descriptor, temporary_file = tempfile.mkstemp(suffix='.npz',
+                                                           dir=os.path.dirname(map_file))
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temporary:
+                np.savez_compressed(temporary, map=np.packbits(cached['map']),
+                                    shape=np.array(cached['map'].shape), last_id=cached['last_id'],
+                                    num_read=cached['num_read'])
+            os.replace(temporary_file, map_file)
+        except Exception:
+            os.remove(temporary_file)
+            raise
+        set_permissions(map_file)
+
     def save_mean_slope_image(self, slope_img, stdev_img, files):
         """Save the mean slope image and associated stdev image to a
         file
@@ -862,25 +2003,27 @@ class Dark():
 
     def shift_to_full_frame(self, coords):
         """Shift the input list of pixels from the subarray coordinate
-        system to the full frame coordinate system
+        system to the (0-indexed) full frame coordinate system. The
+        subarray offsets, ``SUBSTRT1`` (x) and ``SUBSTRT2`` (y), are
+        1-indexed.
 
         Parameters
         ----------
         coords : tup
-            (x, y) pixel coordinates in subarray coordinate system
+            (row, column) pixel coordinates in subarray coordinate
+            system, as returned by ``numpy.where``
 
         Returns
         -------
         coords : tup
-            (x, y) pixel coordinates in full frame coordinate system
+            (row, column) pixel coordinates in full frame coordinate
+            system
         """
 
-        x = coords[0]
-        x += self.x0
-        y = coords[1]
-        y += self.y0
+        rows = np.asarray(coords[0]) + (self.y0 - 1)
+        columns = np.asarray(coords[1]) + (self.x0 - 1)
 
-        return (x, y)
+        return (rows, columns)
 
     def stats_by_amp(self, image, amps):
         """Calculate statistics in the input image for each amplifier as
@@ -959,56 +2102,46 @@ class Dark():
             logging.info(('\tFull frame exposure detected. Adding the full frame to the list '
                           'of amplifiers upon which to calculate statistics.'))
 
-        for key in amps:
-            x_start, x_end, x_step = amps[key][0]
-            y_start, y_end, y_step = amps[key][1]
-            indexes = np.mgrid[y_start: y_end: y_step, x_start: x_end: x_step]
+        # Basic statistics, sigma clipped areal mean and stdev, along
+        # with a histogram, for all amps in one pass over the image
+        amp_stats = calculations.amplifier_stats(image, amps)
 
-            # Basic statistics, sigma clipped areal mean and stdev
-            amp_mean, amp_stdev = calculations.mean_stdev(image[indexes[0], indexes[1]])
+        # Fit a Gaussian to the histograms of all amps at once. Save
+        # best-fit params and uncertainties, as well as reduced chi
+        # squared
+        bin_centers_list = []
+        hist_list = []
+        initial_params = []
+        for key in amps:
+            amp_mean, amp_stdev, hist, bin_centers = amp_stats[key]
             amp_means[key] = amp_mean
             amp_stdevs[key] = amp_stdev
-
-            # Create a histogram
-            lower_bound = (amp_mean - 7 * amp_stdev)
-            upper_bound = (amp_mean + 7 * amp_stdev)
-
-            hist, bin_edges = np.histogram(image[indexes[0], indexes[1]], bins='auto',
-                                           range=(lower_bound, upper_bound))
-            bin_centers = (bin_edges[1:] + bin_edges[0: -1]) / 2.
-            initial_params = [np.max(hist), amp_mean, amp_stdev]
-
-            # Fit a Gaussian to the histogram. Save best-fit params and
-            # uncertainties, as well as reduced chi squared
-            amplitude, peak, width = calculations.gaussian1d_fit(bin_centers, hist, initial_params)
+            bin_centers_list.append(bin_centers)
+            hist_list.append(hist)
+            initial_params.append([np.max(hist), amp_mean, amp_stdev])
+        gaussian_fits = calculations.gaussian1d_fit_batch(bin_centers_list, hist_list,
+                                                          initial_params)
+
+        for key, (amplitude, peak, width) in zip(amps, gaussian_fits):
+            amp_mean, amp_stdev, hist, bin_centers = amp_stats[key]
             gaussian_params[key] = [amplitude, peak, width]
 
             gauss_fit_model = models.Gaussian1D(amplitude=amplitude[0], mean=peak[0], stddev=width[0])
             gauss_fit = gauss_fit_model(bin_centers)
-
-            positive = hist > 0
-            degrees_of_freedom = len(hist) - 3.
-            total_pix = np.sum(hist[positive])
-            p_i = gauss_fit[positive] / total_pix
-            gaussian_chi_squared[key] = (np.sum((hist[positive] - (total_pix * p_i) ** 2) / (total_pix * p_i))
-                                         / degrees_of_freedom)
+            gaussian_chi_squared[key] = calculations.reduced_chi_squared(hist, gauss_fit, 3)
 
             # Double Gaussian fit only for full frame data (and only for
             # NIRISS, NIRCam at the moment.)
-            if key == '5':
-                if self.instrument.upper() in ['NIRISS', 'NIRCAM']:
-                    initial_params = (np.max(hist), amp_mean, amp_stdev * 0.8,
-                                      np.max(hist) / 7., amp_mean / 2., amp_stdev * 0.9)
-                    double_gauss_params, double_gauss_sigma = calculations.double_gaussian_fit(bin_centers, hist, initial_params)
-                    double_gaussian_params[key] = [[param, sig] for param, sig in zip(double_gauss_params, double_gauss_sigma)]
-                    double_gauss_fit = calculations.double_gaussian(bin_centers, *double_gauss_params)
-                    degrees_of_freedom = len(bin_centers) - 6.
-                    dp_i = double_gauss_fit[positive] / total_pix
-                    double_gaussian_chi_squared[key] = np.sum((hist[positive] - (total_pix * dp_i) ** 2) / (total_pix * dp_i)) / degrees_of_freedom
-
-                else:
-                    double_gaussian_params[key] = [[0., 0.] for i in range(6)]
-                    double_gaussian_chi_squared[key] = 0.
+            if key == '5' and self.instrument.upper() in ['NIRISS', 'NIRCAM']:
+                initial_params = (np.max(hist), amp_mean, amp_stdev * 0.8,
+                                  np.max(hist) / 7., amp_mean / 2., amp_stdev * 0.9)
+                double_gauss_params, double_gauss_sigma = calculations.double_gaussian_fit_batch(
+                    [bin_centers], [hist], [initial_params])[0]
+                double_gaussian_params[key] = [[param, sig] for param, sig
+                                               in zip(double_gauss_params, double_gauss_sigma)]
+                double_gauss_fit = calculations.double_gaussian(bin_centers, *double_gauss_params)
+                double_gaussian_chi_squared[key] = calculations.reduced_chi_squared(
+                    hist, double_gauss_fit, 6)
             else:
                 double_gaussian_params[key] = [[0., 0.] for i in range(6)]
                 double_gaussian_chi_squared[key] = 0.
@@ -1025,13 +2158,458 @@ class Dark():
         return (amp_means, amp_stdevs, gaussian_params, gaussian_chi_squared, double_gaussian_params,
                 double_gaussian_chi_squared, hist.astype(np.float), bin_centers)
 
+    def update_badpix_map(self, coordinates, pixel_type):
+        """Add the given bad pixels to the map of existing bad pixels of
+        the given type for the current detector, and save the map.
+
+        Parameters
+        ----------
+        coordinates : tuple
+            Tuple of two lists, containing the row and column
+            coordinates of bad pixels in the full frame coordinate
+            system
+
+        pixel_type : str
+            Type of bad pixel. Options are ``dead``, ``hot``, and
+            ``noisy``
+        """
+
+        # If the map has not been loaded yet, it will pick up the new
+        # pixels from the database when it is
+        if (self.detector, pixel_type) not in self.badpix_maps:
+            self.get_badpix_map(pixel_type)
+            return
+
+        badpix_map = self.badpix_maps[(self.detector, pixel_type)]['map']
+        rows = np.asarray(coordinates[0], dtype=int)
+        columns = np.asarray(coordinates[1], dtype=int)
+        badpix_map[rows, columns] = True
+        self.save_badpix_map(pixel_type)
+
+    def update_running_baseline(self, slope_files, slope_image, stdev_image,
+                                slope_image_stack=None):
+        """Fold slope images into the running baseline for the current
+        aperture, and record this in the run journal. Values far from
+        the sigma-clipped mean slope image are left out (see
+        ``RunningBaseline.update``).
+
+        Parameters
+        ----------
+        slope_files : list
+            List of slope files
+
+        slope_image : numpy.ndarray
+            2D sigma-clipped mean of the slope images
+
+        stdev_image : numpy.ndarray
+            2D sigma-clipped standard deviation of the slope images
+
+        slope_image_stack : numpy.ndarray
+            3D stack of the slope images. If ``None``, the stack is read
+            in from ``slope_files``.
+        """
+
+        if slope_image_stack is None:
+            slope_image_stack, slope_exptimes = pipeline_tools.image_stack(
+                slope_files, memmap_dir=self.data_dir)
+
+        baseline_dir = os.path.join(self.output_dir, 'running_baselines')
+        running_baseline = RunningBaseline(baseline_dir, self.instrument, self.aperture)
+        running_baseline.update(slope_image_stack, slope_image, stdev_image, sigma_threshold=3,
+                                rows_per_tile=MEAN_IMAGE_ROWS_PER_TILE)
+        logging.info('\tAdded {} slope images to the running baseline'
+                     .format(len(slope_image_stack)))
+
+        if self.journal is not None:
+            self.journal.record('baseline_updated')
+
+    def uses_running_baseline(self):
+        """Return ``True`` if the slope images of the current aperture
+        are compared against, and folded into, a running baseline
+        """
+
+        return self.use_running_baseline and self.full_frame()
+
+
+class RunJournal():
+    """Record of the progress of the dark monitor on a single
+    instrument/aperture combination, kept in a JSON file so that an
+    interrupted run can be resumed from the last completed stage.
+
+    The stages, in order, are given by ``JOURNAL_STAGES``:
+    ``discovered`` (the new files have been found), ``pipelined``
+    (slope files have been created), ``combined`` (the mean slope
+    image has been saved), ``committed`` (the results have been
+    added to the database), and ``baseline_updated`` (the slope images
+    have been folded into the running baseline, if one is used). The
+    journal is removed once the query history has been updated.
+
+    Parameters
+    ----------
+    directory : str
+        Directory containing the run journals
+
+    instrument : str
+        Name of instrument
+
+    aperture : str
+        Name of aperture
+
+    Attributes
+    ----------
+    filename : str
+        Name of the JSON file containing the journal
+
+    state : dict
+        Contents of the journal. Empty if there is no journal.
+    """
+
+    def __init__(self, directory, instrument, aperture):
+        """Initialize an instance of the ``RunJournal`` class."""
+
+        self.directory = directory
+        self.instrument = instrument
+        self.aperture = aperture
+        self.filename = os.path.join(directory,
+                                     '{}_{}.json'.format(instrument.lower(), aperture.lower()))
+
+        self.state = {}
+        if os.path.isfile(self.filename):
+            with open(self.filename) as journal_file:
+                self.state = json.load(journal_file)
+
+    def reached(self, stage):
+        """Return ``True`` if the given stage has been completed
+
+        Parameters
+        ----------
+        stage : str
+            Name of stage (from ``JOURNAL_STAGES``)
+        """
+
+        if 'stage' not in self.state:
+            return False
+
+        return JOURNAL_STAGES.index(self.state['stage']) >= JOURNAL_STAGES.index(stage)
+
+    def record(self, stage, **values):
+        """Record that a stage has been completed, along with any
+        values needed to resume from that stage
+
+        Parameters
+        ----------
+        stage : str
+            Name of stage (from ``JOURNAL_STAGES``)
+
+        values : dict
+            Values to save in the journal
+        """
+
+        self.state.update(values)
+        self.state['stage'] = stage
+        self.save()
+
+    def record_failure(self):
+        """Record a failed attempt at the work unit
+
+        Returns
+        -------
+        attempts : int
+            Number of failed attempts so far
+        """
+
+        self.state['attempts'] = self.state.get('attempts', 0) + 1
+        self.save()
+
+        return self.state['attempts']
+
+    def remove(self):
+        """Remove the journal"""
+
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        self.state = {}
+
+    def resumable(self, stage, key):
+        """Return ``True`` if the given stage has been completed, and
+        the files it produced are still present
+
+        Parameters
+        ----------
+        stage : str
+            Name of stage (from ``JOURNAL_STAGES``)
+
+        key : str
+            Key of the journal entry listing the file(s) produced by
+            the stage
+        """
+
+        if not self.reached(stage):
+            return False
+
+        filenames = self.state[key]
+        if isinstance(filenames, str):
+            filenames = [filenames]
+
+        return all([os.path.isfile(filename) for filename in filenames])
+
+    def save(self):
+        """Write the journal to its file"""
+
+        ensure_dir_exists(self.directory)
+
+        # Write to a temporary file first so that an interrupted write
+        # does not leave behind a corrupt journal
+        temporary_file = self.filename.replace('.json', '.tmp')
+        with open(temporary_file, 'w') as journal_file:
+            json.dump(self.state, journal_file)
+        os.replace(temporary_file, self.filename)
+
+    def start(self, work_unit):
+        """Begin a new journal for the given work unit
+
+        Parameters
+        ----------
+        work_unit : ApertureWorkUnit
+            Description of the work to be done for the aperture
+        """
+
+        self.state = {'instrument': work_unit.instrument,
+                      'aperture': work_unit.aperture,
+                      'query_start': work_unit.query_start,
+                      'query_end': work_unit.query_end,
+                      'filenames': work_unit.filenames,
+                      'files_found': work_unit.files_found,
+                      'full_frame': bool(work_unit.full_frame),
+                      'attempts': 0}
+        self.record('discovered')
+
+    def work_unit(self):
+        """Return the work unit described by the journal
+
+        Returns
+        -------
+        work_unit : ApertureWorkUnit
+            Description of the work to be done for the aperture
+        """
+
+        return ApertureWorkUnit(self.state['instrument'], self.state['aperture'],
+                                self.state['query_start'], self.state['query_end'],
+                                self.state['filenames'], self.state['files_found'],
+                                self.state['full_frame'])
+
+
+class RunningBaseline():
+    """Baseline dark current rate and noise images for an aperture,
+    kept as running per-pixel statistics of all of the slope images
+    seen so far, excluding sigma-clipped values. The statistics are
+    stored as memory-mapped ``.npy`` files containing the count, mean,
+    and sum of squared differences from the mean (``M2``) for each
+    pixel, and new slope images are folded in using Welford's
+    algorithm. Updating the baseline therefore costs the same
+    regardless of how many slope images it already contains.
+
+    Updates are made to temporary copies of the files, which replace
+    the originals only once all three are complete. If an update is
+    interrupted while the copies are being swapped in, the swap is
+    finished the next time the baseline is opened, so the files never
+    hold a partial update.
+
+    Parameters
+    ----------
+    directory : str
+        Directory containing the running baseline files
+
+    instrument : str
+        Name of instrument
+
+    aperture : str
+        Name of aperture
+
+    Attributes
+    ----------
+    filenames : dict
+        Names of the ``.npy`` files containing the ``count``, ``mean``,
+        and ``m2`` arrays
+    """
+
+    def __init__(self, directory, instrument, aperture):
+        """Initialize an instance of the ``RunningBaseline`` class."""
+
+        self.directory = directory
+        self.filenames = {}
+        for name in ['count', 'mean', 'm2']:
+            filename = '{}_{}_running_{}.npy'.format(instrument.lower(), aperture.lower(), name)
+            self.filenames[name] = os.path.join(directory, filename)
+        self.swap_file = os.path.join(directory, '{}_{}_running.swap'.format(instrument.lower(),
+                                                                             aperture.lower()))
+
+        self.recover()
+
+    @classmethod
+    def from_mean_file(cls, filename):
+        """Return the running baseline whose mean image is stored in the
+        given file
+
+        Parameters
+        ----------
+        filename : str
+            Name of the ``.npy`` file containing the mean image (as in
+            ``filenames['mean']``)
+
+        Returns
+        -------
+        running_baseline : RunningBaseline
+            The running baseline
+        """
+
+        basename = os.path.basename(filename)
+        suffix = '_running_mean.npy'
+        if not basename.endswith(suffix):
+            raise ValueError('{} is not the mean image of a running baseline.'.format(filename))
+        instrument, aperture = basename[:-len(suffix)].split('_', 1)
+
+        return cls(os.path.dirname(filename), instrument, aperture)
+
+    def exists(self):
+        """Return ``True`` if the running baseline files exist"""
+
+        return all([os.path.isfile(filename) for filename in self.filenames.values()])
+
+    def get_images(self):
+        """Return the baseline mean and standard deviation images
+
+        Returns
+        -------
+        mean_image : numpy.ndarray
+            2D baseline mean slope image
+
+        stdev_image : numpy.ndarray
+            2D baseline standard deviation image
+        """
+
+        arrays = [np.lib.format.open_memmap(self.filenames[name], mode='r')
+                  for name in ['count', 'mean', 'm2']]
+
+        return calculations.welford_stats(*arrays)
+
+    def recover(self):
+        """Finish swapping in the files of an interrupted update if all
+        of them were complete, or otherwise remove them"""
+
+        swap_complete = os.path.isfile(self.swap_file)
+        for filename in self.filenames.values():
+            temporary_file = '{}.tmp'.format(filename)
+            if os.path.isfile(temporary_file):
+                if swap_complete:
+                    os.replace(temporary_file, filename)
+                else:
+                    os.remove(temporary_file)
+        if swap_complete:
+            os.remove(self.swap_file)
+
+    def update(self, cube, mean_image, stdev_image, sigma_threshold=3, rows_per_tile=None):
+        """Fold a stack of slope images into the running baseline. The
+        baseline files are created if they do not yet exist. Values
+        more than ``sigma_threshold`` standard deviations from the
+        sigma-clipped mean are left out. This approximates the clipping
+        done when combining the stack (which is centred on the median),
+        so that the baseline statistics can be compared with
+        sigma-clipped mean and stdev images.
+
+        Parameters
+        ----------
+        cube : numpy.ndarray
+            3D stack of slope images
+
+        mean_image : numpy.ndarray
+            2D sigma-clipped mean of the stack (output from
+            ``calculations.mean_image``)
+
+        stdev_image : numpy.ndarray
+            2D sigma-clipped standard deviation of the stack
+
+        sigma_threshold : int
+            Number of sigma used when clipping the stack
+
+        rows_per_tile : int
+            Number of rows of the stack to fold in at a time. If
+            ``None``, the entire stack is folded in at once.
+        """
+
+        shape = cube.shape[1:]
+        ensure_dir_exists(self.directory)
+        temporary_files = {name: '{}.tmp'.format(filename)
+                           for name, filename in self.filenames.items()}
+        if self.exists():
+            for name, filename in self.filenames.items():
+                shutil.copyfile(filename, temporary_files[name])
+        else:
+            for name, dtype in [('count', np.int32), ('mean', np.float64), ('m2', np.float64)]:
+                array = np.lib.format.open_memmap(temporary_files[name], mode='w+', dtype=dtype,
+                                                  shape=shape)
+                array[:] = 0
+                array.flush()
+                del array
+
+        try:
+            count, mean, m2 = [np.lib.format.open_memmap(temporary_files[name], mode='r+')
+                               for name in ['count', 'mean', 'm2']]
+            if count.shape != shape:
+                raise ValueError('Slope images of shape {} do not match running baseline of '
+                                 'shape {}.'.format(shape, count.shape))
+
+            if rows_per_tile is None:
+                rows_per_tile = shape[0]
+            for row_start in range(0, shape[0], rows_per_tile):
+                rows = slice(row_start, min(row_start + rows_per_tile, shape[0]))
+                tile = np.array(cube[:, rows, :], dtype=np.float64)
+                clipped = np.abs(tile - mean_image[rows]) > sigma_threshold * stdev_image[rows]
+                tile[clipped] = np.nan
+                calculations.welford_update(count[rows], mean[rows], m2[rows], tile)
+
+            for array in [count, mean, m2]:
+                array.flush()
+            del count, mean, m2
+        except BaseException:
+            for temporary_file in temporary_files.values():
+                os.remove(temporary_file)
+            raise
+
+        # Swap in the updated files, marking that they are all complete
+        # so that an interrupted swap can be finished by recover()
+        for temporary_file in temporary_files.values():
+            set_permissions(temporary_file)
+        open(self.swap_file, 'w').close()
+        self.recover()
+
+
+def parse_args():
+    """Parse command line arguments
+
+    Returns
+    -------
+    args : argparse.Namespace
+        Parsed command line arguments
+    """
+
+    parser = argparse.ArgumentParser(description='Run the dark current monitor')
+    parser.add_argument('--running_baseline', action='store_true',
+                        help='Compare full frame data against a running baseline built up from '
+                             'all previous slope images, rather than a single baseline mean slope '
+                             'image')
+
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
 
+    args = parse_args()
+
     module = os.path.basename(__file__).strip('.py')
     start_time, log_file = initialize_instrument_monitor(module)
 
-    monitor = Dark()
+    monitor = Dark(use_running_baseline=args.running_baseline)
     monitor.run()
 
     update_monitor_table(module, start_time, log_file)
@@ -13,13 +13,41 @@ Use
 
         from jwql.instrument_monitors import pipeline_tools
         pipeline_steps = pipeline_tools.completed_pipeline_steps(filename)
+
+    Products of the pipeline can be shared between monitors through a
+    cache keyed on the identity of the input file and the pipeline
+    steps run. The dark monitor caches the 0th group of its NIRCam
+    ramps after the ``SHARED_STEPS``, which the bias monitor then
+    reuses:
+    ::
+
+        cache_key = pipeline_tools.pipeline_cache_key(filename, steps)
+        if cache_key is None or not pipeline_tools.get_cached_pipeline_product(cache_key,
+                                                                                output_file):
+            output_file = pipeline_tools.run_calwebb_detector1_steps(filename, steps)
+            if cache_key is not None:
+                pipeline_tools.cache_pipeline_product(cache_key, output_file)
  """
 
 from collections import OrderedDict
+from contextlib import ExitStack
 import copy
+import fcntl
+import gc
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
 import numpy as np
 
 from astropy.io import fits
+import crds
+from crds.core.exceptions import CrdsError
+import jwst
+from jwst.datamodels import RampModel
 from jwst.dq_init import DQInitStep
 from jwst.dark_current import DarkCurrentStep
 from jwst.firstframe import FirstFrameStep
@@ -36,6 +64,9 @@ from jwst.saturation import SaturationStep
 from jwst.superbias import SuperBiasStep
 
 from jwql.utils.constants import JWST_INSTRUMENT_NAMES_UPPERCASE
+from jwql.utils.instrument_properties import FileMetadata
+from jwql.utils.permissions import set_permissions
+from jwql.utils.utils import get_config
 
 # Define the fits header keyword that accompanies each step
 PIPE_KEYWORDS = {'S_GRPSCL': 'group_scale', 'S_DQINIT': 'dq_init', 'S_SATURA': 'saturation',
@@ -51,11 +82,139 @@ PIPELINE_STEP_MAPPING = {'dq_init': DQInitStep, 'dark_current': DarkCurrentStep,
                          'rate': RampFitStep, 'refpix': RefPixStep, 'rscd': RSCD_Step,
                          'saturation': SaturationStep, 'superbias': SuperBiasStep}
 
+# Numpy datatypes corresponding to values of the fits BITPIX keyword
+BITPIX_DATATYPES = {8: np.uint8, 16: np.int16, 32: np.int32, 64: np.int64,
+                    -32: np.float32, -64: np.float64}
+
+# Maximum total size, in bytes, of the pipeline product cache. The least
+# recently used products are removed once the cache exceeds this size.
+PIPELINE_CACHE_MAX_SIZE = 500 * 1024 ** 3
+
+# Pipeline steps, and their parameters, run by the bias monitor. The dark
+# monitor runs the same steps with the same parameters at the start of
+# its NIRCam pipeline, and caches the 0th group of the product after them
+# so that the bias monitor can use it rather than rerunning the steps.
+SHARED_STEPS = OrderedDict([('dq_init', True), ('saturation', True), ('superbias', True),
+                            ('refpix', True)])
+SHARED_STEP_PARAMETERS = {'refpix': {'odd_even_rows': False, 'odd_even_columns': True,
+                                     'use_side_ref_pixels': True}}
+
+# Primary header keywords identifying the version of an input file
+FILE_IDENTITY_KEYWORDS = ['DATE', 'CHECKSUM', 'DATASUM']
+
+# ioctl request used to make a copy-on-write clone (reflink) of a file on
+# filesystems that support it (e.g. Btrfs, XFS)
+FICLONE = 0x40049409
+
 # Readout patterns that have nframes != a power of 2. These readout patterns
 # require the group_scale pipeline step to be run.
 GROUPSCALE_READOUT_PATTERNS = ['NRSIRS2']
 
 
+def allocate_array(shape, dtype, memmap_dir=None):
+    """Create an empty array, optionally backed by a scratch file on
+    disk.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the array
+
+    dtype : numpy.dtype
+        Datatype of the array
+
+    memmap_dir : str
+        If not ``None``, the array is created as a ``numpy.memmap``
+        backed by a scratch file in this directory. The scratch file
+        is removed from the directory immediately, so that its disk
+        space is released as soon as the array is no longer in use.
+
+    Returns
+    -------
+    array : numpy.ndarray
+        Empty array with the requested shape and datatype
+    """
+
+    if memmap_dir is None:
+        return np.empty(shape, dtype=dtype)
+
+    file_descriptor, scratch_file = tempfile.mkstemp(suffix='.dat', dir=memmap_dir)
+    try:
+        array = np.memmap(scratch_file, dtype=dtype, mode='w+', shape=shape)
+    finally:
+        os.close(file_descriptor)
+        os.remove(scratch_file)
+
+    return array
+
+
+def cache_pipeline_product(cache_key, filename, cache_dir=None, max_size=PIPELINE_CACHE_MAX_SIZE):
+    """Add a copy of a pipeline product to the pipeline product cache,
+    and then remove the least recently used products if the cache has
+    grown beyond ``max_size``. The cache never shares a file with the
+    monitors' working products, so that its entries are not changed by
+    anything done to those products, and evicting an entry releases its
+    disk space.
+
+    Parameters
+    ----------
+    cache_key : str
+        Key identifying the product (output from
+        ``pipeline_cache_key``)
+
+    filename : str
+        Name of the pipeline product file
+
+    cache_dir : str
+        Directory containing the cache. If ``None``, the directory
+        given by ``get_pipeline_cache_dir`` is used.
+
+    max_size : int
+        Maximum total size of the cache, in bytes
+    """
+
+    if cache_dir is None:
+        cache_dir = get_pipeline_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    cached_file = os.path.join(cache_dir, '{}.fits'.format(cache_key))
+    clone_file(filename, cached_file)
+    set_permissions(cached_file)
+
+    evict_pipeline_cache(cache_dir, max_size)
+
+
+def clone_file(source, destination):
+    """Copy a file, using a copy-on-write clone (reflink) where the
+    filesystem supports it. The copy is made in a temporary file in the
+    destination directory first, so that other processes never see a
+    partially written file.
+
+    Parameters
+    ----------
+    source : str
+        Name of the file to copy
+
+    destination : str
+        Name of the copy
+    """
+
+    file_descriptor, temporary_file = tempfile.mkstemp(suffix='.tmp',
+                                                       dir=os.path.dirname(destination))
+    try:
+        with open(source, 'rb') as source_file, os.fdopen(file_descriptor, 'wb') as temporary:
+            try:
+                fcntl.ioctl(temporary.fileno(), FICLONE, source_file.fileno())
+            except OSError:
+                shutil.copyfileobj(source_file, temporary)
+        shutil.copymode(source, temporary_file)
+        os.replace(temporary_file, destination)
+    except Exception:
+        if os.path.isfile(temporary_file):
+            os.remove(temporary_file)
+        raise
+
+
 def completed_pipeline_steps(filename):
     """Return a list of the completed pipeline steps for a given file.
 
@@ -89,6 +248,201 @@ def completed_pipeline_steps(filename):
     return completed
 
 
+def evict_pipeline_cache(cache_dir, max_size):
+    """Remove the least recently used products from the pipeline
+    product cache until the total size of its entries is no more than
+    ``max_size``. The modification time of each product is used as the
+    time it was last used.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory containing the cache
+
+    max_size : int
+        Maximum total size of the cache, in bytes
+    """
+
+    products = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.fits'):
+            status = entry.stat()
+            products.append((status.st_mtime, status.st_size, entry.path))
+
+    total_size = sum([size for _, size, _ in products])
+    for _, size, path in sorted(products):
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already removed by another process
+            pass
+        total_size -= size
+
+
+def fits_datatype(header):
+    """Return the ``numpy`` datatype of the data that accompanies
+    the given fits header, taking into account any scaling of the
+    data via the ``BSCALE`` and ``BZERO`` keywords.
+
+    Parameters
+    ----------
+    header : astropy.io.fits.Header
+        Header of an image extension
+
+    Returns
+    -------
+    dtype : numpy.dtype
+        Datatype of the (scaled) data
+    """
+
+    dtype = np.dtype(BITPIX_DATATYPES[header['BITPIX']])
+    bscale = header.get('BSCALE', 1)
+    bzero = header.get('BZERO', 0)
+
+    if bscale == 1 and bzero == 0:
+        return dtype
+
+    # Unsigned integers are stored as signed integers with an offset
+    if bscale == 1 and dtype.kind == 'i' and bzero == 2 ** (8 * dtype.itemsize - 1):
+        return np.dtype('uint{}'.format(8 * dtype.itemsize))
+
+    return np.dtype(np.float64)
+
+
+def file_identity(filename):
+    """Return a description identifying an input file of the pipeline,
+    built without reading the file's data: its name, size, and the
+    creation date and checksums from its primary header. Unlike its
+    modification time, these are the same for the original file and
+    any copies of it staged in the monitors' working directories.
+
+    Parameters
+    ----------
+    filename : str
+        Name of file
+
+    Returns
+    -------
+    identity : dict
+        Description of the file
+    """
+
+    header = fits.getheader(filename, 0)
+    identity = {keyword: header.get(keyword) for keyword in FILE_IDENTITY_KEYWORDS}
+    identity['name'] = os.path.basename(filename)
+    identity['size'] = os.path.getsize(filename)
+
+    return identity
+
+
+def find_cached_pipeline_product(cache_key, cache_dir=None):
+    """Return the name of a product in the pipeline product cache, if
+    present, and mark it as recently used. The product may be read,
+    but must not be modified. Since it may be evicted by another
+    process at any time, it should be opened promptly, and a
+    ``FileNotFoundError`` treated as a cache miss.
+
+    Parameters
+    ----------
+    cache_key : str
+        Key identifying the product (output from
+        ``pipeline_cache_key``)
+
+    cache_dir : str
+        Directory containing the cache. If ``None``, the directory
+        given by ``get_pipeline_cache_dir`` is used.
+
+    Returns
+    -------
+    cached_file : str
+        Name of the cached product, or ``None`` if it is not in the
+        cache
+    """
+
+    if cache_dir is None:
+        cache_dir = get_pipeline_cache_dir()
+    cached_file = os.path.join(cache_dir, '{}.fits'.format(cache_key))
+
+    try:
+        os.utime(cached_file)
+    except FileNotFoundError:
+        return None
+
+    return cached_file
+
+
+def get_cached_pipeline_product(cache_key, output_filename, cache_dir=None):
+    """Retrieve a product from the pipeline product cache, if present.
+    The product is copied (using a reflink where possible) to
+    ``output_filename``, and is marked as recently used.
+
+    Parameters
+    ----------
+    cache_key : str
+        Key identifying the product (output from
+        ``pipeline_cache_key``)
+
+    output_filename : str
+        Name of the file in which to place the product
+
+    cache_dir : str
+        Directory containing the cache. If ``None``, the directory
+        given by ``get_pipeline_cache_dir`` is used.
+
+    Returns
+    -------
+    found : bool
+        ``True`` if the product was found in the cache and placed in
+        ``output_filename``
+    """
+
+    cached_file = find_cached_pipeline_product(cache_key, cache_dir=cache_dir)
+    if cached_file is None:
+        return False
+
+    try:
+        clone_file(cached_file, output_filename)
+    except FileNotFoundError:
+        # Evicted by another process
+        return False
+
+    return True
+
+
+def get_crds_context():
+    """Return the name of the CRDS context used to select the reference
+    files for the pipeline
+
+    Returns
+    -------
+    context : str
+        Name of the context (e.g. ``jwst_0641.pmap``), or ``None`` if
+        it cannot be determined
+    """
+
+    try:
+        return crds.get_context_name('jwst')
+    except (CrdsError, OSError) as error:
+        context = os.environ.get('CRDS_CONTEXT')
+        if context is None:
+            logging.warning('Unable to determine the CRDS context: {}'.format(error))
+        return context
+
+
+def get_pipeline_cache_dir():
+    """Return the directory containing the pipeline product cache
+
+    Returns
+    -------
+    cache_dir : str
+        Directory containing the cache
+    """
+
+    return os.path.join(get_config()['outputs'], 'pipeline_cache')
+
+
 def get_pipeline_steps(instrument):
     """Get the names and order of the ``calwebb_detector1`` pipeline
     steps for a given instrument. Use values that match up with the
@@ -144,54 +498,140 @@ def get_pipeline_steps(instrument):
     return required_steps
 
 
-def image_stack(file_list):
+def image_stack(file_list, memmap_dir=None):
     """Given a list of fits files containing 2D images, read in all data
     and place into a 3D stack
 
+    The stack is built in two passes. The first pass reads only the
+    headers of the files in order to determine the total number of
+    integrations and the datatype of the stack. The second pass reads
+    the data from each file directly into a preallocated array.
+
     Parameters
     ----------
     file_list : list
-        List of fits file names
+        List of fits file names, or of their ``FileMetadata``. Files
+        given by their ``FileMetadata`` are only opened once.
+
+    memmap_dir : str
+        If not ``None``, the stack is placed in a ``numpy.memmap``
+        backed by a scratch file in this directory, rather than in
+        memory.
 
     Returns
     -------
     cube : numpy.ndarray
         3D stack of the 2D images
+
+    exptimes : numpy.ndarray
+        1D array of the effective integration time of each integration
+        in ``cube``
     """
 
+    # First pass: get the shape and datatype of each input
+    num_images = []
+    dtypes = []
     exptimes = []
     for i, input_file in enumerate(file_list):
-        with fits.open(input_file) as hdu:
-            image = hdu[1].data
-            exptime = hdu[0].header['EFFINTTM']
-            num_ints = hdu[0].header['NINTS']
-
-        # Stack all inputs together into a single 3D image cube
+        with ExitStack() as stack:
+            if not isinstance(input_file, FileMetadata):
+                input_file = stack.enter_context(FileMetadata(input_file))
+            primary_header = input_file.header
+            image_header = input_file.hdulist[1].header
+        exptime = primary_header['EFFINTTM']
+        num_ints = primary_header['NINTS']
+
+        naxis = image_header['NAXIS']
+        if naxis > 3:
+            raise ValueError("4-dimensional input slope images not supported.")
+        ndim = (image_header['NAXIS2'], image_header['NAXIS1'])
         if i == 0:
-            ndim_base = image.shape
-            if len(ndim_base) == 3:
-                cube = copy.deepcopy(image)
-            elif len(ndim_base) == 2:
-                cube = np.expand_dims(image, 0)
+            ndim_base = ndim
+        elif ndim != ndim_base:
+            raise ValueError("Input images are of inconsistent size in x/y dimension.")
+
+        if naxis == 3:
+            num_images.append(image_header['NAXIS3'])
         else:
-            ndim = image.shape
-            if ndim_base[-2:] == ndim[-2:]:
-                if len(ndim) == 2:
-                    image = np.expand_dims(image, 0)
-                elif len(ndim) > 3:
-                    raise ValueError("4-dimensional input slope images not supported.")
-                cube = np.vstack((cube, image))
-            else:
-                raise ValueError("Input images are of inconsistent size in x/y dimension.")
-        exptimes.append([exptime] * num_ints)
+            num_images.append(1)
+        dtypes.append(fits_datatype(image_header))
+        exptimes.extend([exptime] * num_ints)
+
+    # Second pass: fill a preallocated stack with the data
+    shape = (int(np.sum(num_images)),) + ndim_base
+    cube = allocate_array(shape, np.result_type(*dtypes), memmap_dir=memmap_dir)
+    index = 0
+    for input_file, nimages in zip(file_list, num_images):
+        with ExitStack() as stack:
+            if not isinstance(input_file, FileMetadata):
+                input_file = stack.enter_context(FileMetadata(input_file))
+            cube[index: index + nimages, :, :] = input_file.hdulist[1].data
+        index += nimages
+
+    return cube, np.array(exptimes)
+
+
+def pipeline_cache_key(input_file, steps, step_parameters=None):
+    """Return the key identifying the product of running the given
+    pipeline steps on the given file. The key depends on the identity
+    of the file (see ``file_identity``), the steps and their
+    parameters, the version of the ``jwst`` package, and the CRDS
+    context, so products can be shared between monitors that run the
+    same steps on the same data. Only the primary header of the file
+    is read. If the CRDS context cannot be determined, there is no key,
+    and the product must be neither looked up in nor added to the
+    cache.
+
+    Parameters
+    ----------
+    input_file : str
+        File on which the pipeline steps are run
 
-    return cube, exptimes
+    steps : collections.OrderedDict
+        Keys are the individual pipeline steps (as seen in the
+        ``PIPE_KEYWORDS`` values above). Boolean values indicate whether
+        a step is run or not.
+
+    step_parameters : dict
+        Non-default parameters for the steps. Keys are step names and
+        values are dictionaries of parameter values.
+
+    Returns
+    -------
+    cache_key : str
+        Hexadecimal key, or ``None`` if the CRDS context cannot be
+        determined
+    """
+
+    crds_context = get_crds_context()
+    if crds_context is None:
+        logging.warning('Not using the pipeline cache for {}, since the CRDS context is unknown'
+                        .format(input_file))
+        return None
+
+    description = {'input': file_identity(input_file),
+                   'steps': [step_name for step_name in steps if steps[step_name]],
+                   'parameters': step_parameters or {},
+                   'jwst_version': jwst.__version__,
+                   'crds_context': crds_context}
+    description = json.dumps(description, sort_keys=True)
+
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
 
 
-def run_calwebb_detector1_steps(input_file, steps):
+def run_calwebb_detector1_steps(input_file, steps, step_parameters=None, save_intermediate=None,
+                                save_zeroth_group=None, output_filename=None):
     """Run the steps of ``calwebb_detector1`` specified in the steps
     dictionary on the input file
 
+    The datamodel is passed from one step to the next in memory, and
+    only the product of the final step is written to disk, along with
+    any intermediate products listed in ``save_intermediate`` or
+    ``save_zeroth_group``. Each
+    model is closed as soon as the following step has been run, so
+    that only one or two copies of the data are held in memory at a
+    time, and all memory is released before returning.
+
     Parameters
     ----------
     input_file : str
@@ -202,26 +642,126 @@ def run_calwebb_detector1_steps(input_file, steps):
         ``PIPE_KEYWORDS`` values above). Boolean values indicate whether
         a step should be run or not. Steps are run in the official
         ``calwebb_detector1`` order.
+
+    step_parameters : dict
+        Non-default parameters for the steps. Keys are step names and
+        values are dictionaries of parameter values.
+
+    save_intermediate : list
+        Names of steps whose output should also be saved. Each is saved
+        to ``input_file`` with the step name appended.
+
+    save_zeroth_group : list
+        Names of steps for which only the 0th group of the first
+        integration of the output should be saved (see
+        ``save_zeroth_group_product``). Each is saved to
+        ``input_file`` with the step name and ``0thgroup`` appended.
+
+    output_filename : str
+        Name of the file in which to save the final product. If
+        ``None``, the name of the final step is appended to
+        ``input_file``.
+
+    Returns
+    -------
+    output_filename : str
+        Name of the file containing the final product
     """
 
-    first_step_to_be_run = True
-    for step_name in steps:
-        if steps[step_name]:
-            if first_step_to_be_run:
-                model = PIPELINE_STEP_MAPPING[step_name].call(input_file)
-                first_step_to_be_run = False
-            else:
-                model = PIPELINE_STEP_MAPPING[step_name].call(model)
-            suffix = step_name
-    output_filename = input_file.replace('.fits', '_{}.fits'.format(suffix))
-    if suffix != 'rate':
-        model.save(output_filename)
-    else:
-        model[0].save(output_filename)
+    if step_parameters is None:
+        step_parameters = {}
+    if save_intermediate is None:
+        save_intermediate = []
+    if save_zeroth_group is None:
+        save_zeroth_group = []
+
+    steps_to_call = [step_name for step_name in steps if steps[step_name]]
+    model = None
+    try:
+        for step_name in steps_to_call:
+            step_input = input_file if model is None else model
+            parameters = step_parameters.get(step_name, {})
+            result = PIPELINE_STEP_MAPPING[step_name].call(step_input, **parameters)
+
+            # Release the previous model once the step has made a new one
+            if model is not None and result is not model:
+                model.close()
+            model = result
+
+            if step_name in save_intermediate and step_name != steps_to_call[-1]:
+                model.save(input_file.replace('.fits', '_{}.fits'.format(step_name)))
+            if step_name in save_zeroth_group:
+                zeroth_group_file = input_file.replace('.fits',
+                                                       '_{}_0thgroup.fits'.format(step_name))
+                save_zeroth_group_product(model, zeroth_group_file)
+
+        if output_filename is None:
+            output_filename = input_file.replace('.fits', '_{}.fits'.format(steps_to_call[-1]))
+        if steps_to_call[-1] != 'rate':
+            model.save(output_filename)
+        else:
+            model[0].save(output_filename)
+
+    finally:
+        # Ramp fitting returns a tuple of models
+        if isinstance(model, tuple):
+            for item in model:
+                if item is not None:
+                    item.close()
+        elif model is not None:
+            model.close()
+        del model
+        gc.collect()
 
     return output_filename
 
 
+def save_zeroth_group_product(model, output_filename):
+    """Save the 0th group of the first integration of a ramp, along
+    with its data quality, in a new file. This is the same product
+    that running the same steps on the 0th group alone would make, for
+    steps that act on each group independently.
+
+    Parameters
+    ----------
+    model : jwst.datamodels.RampModel
+        Ramp from which to save the 0th group
+
+    output_filename : str
+        Name of the output file
+    """
+
+    with RampModel(data=model.data[0:1, 0:1], pixeldq=model.pixeldq,
+                   groupdq=model.groupdq[0:1, 0:1], err=model.err[0:1, 0:1]) as zeroth_group:
+        zeroth_group.update(model)
+        zeroth_group.meta.exposure.nints = 1
+        zeroth_group.meta.exposure.ngroups = 1
+        zeroth_group.save(output_filename)
+
+
+def starts_with_shared_steps(steps):
+    """Return ``True`` if the given pipeline steps begin with the
+    ``SHARED_STEPS``, in which case the product after those steps can
+    be shared with the bias monitor
+
+    Parameters
+    ----------
+    steps : collections.OrderedDict
+        Keys are the individual pipeline steps (as seen in the
+        ``PIPE_KEYWORDS`` values above). Boolean values indicate whether
+        a step is run or not.
+
+    Returns
+    -------
+    shared : bool
+        Whether the steps begin with the shared steps
+    """
+
+    steps_to_call = [step_name for step_name in steps if steps[step_name]]
+
+    return steps_to_call[:len(SHARED_STEPS)] == list(SHARED_STEPS)
+
+
 def steps_to_run(all_steps, finished_steps):
     """Given a list of pipeline steps that need to be completed as well
     as a list of steps that have already been completed, return a list
@@ -242,9 +782,13 @@ def steps_to_run(all_steps, finished_steps):
     steps_to_run : collections.OrderedDict
         A dictionaru with keys equal to the pipeline steps and boolean
         values indicating whether a particular step has yet to be run.
+        Steps are in the order of ``all_steps``.
     """
 
-    torun = copy.deepcopy(finished_steps)
+    torun = OrderedDict([(key, copy.deepcopy(finished_steps[key])) for key in all_steps])
+    for key in finished_steps:
+        if key not in torun:
+            torun[key] = copy.deepcopy(finished_steps[key])
 
     for key in all_steps:
         if all_steps[key] == finished_steps[key]:
@@ -9,6 +9,13 @@ smaller and contain no labels.  Images are saved into the
 ``preview_image_filesystem`` and ``thumbnail_filesystem``, organized
 by subdirectories pertaining to the ``program_id`` in the filenames.
 
+The size and modification time of each input file, along with the
+images generated from it, are recorded in a manifest (an SQLite
+database in the ``outputs`` directory). Subsequent runs only generate
+images for new files, or regenerate them for files that have changed.
+Files for which images could not be generated are recorded too, and
+are only tried again once they change.
+
 Authors
 -------
 
@@ -26,11 +33,17 @@ Use
         python generate_preview_images.py
 """
 
+import bisect
+from collections import OrderedDict
+import fnmatch
 import glob
+import json
 import logging
 import multiprocessing
 import os
 import re
+import sqlite3
+import time
 
 import numpy as np
 
@@ -47,6 +60,14 @@ SW_DET_GAP = 145  # pixels = int(4.5 arcsec / 0.031 arcsec/pixel)
 FULLX = 2048  # Width of the full detector
 FULLY = 2048  # Height of the full detector
 
+# Number of exposure groups processed by each worker process before it
+# is replaced, so that memory held by matplotlib is released
+MAX_TASKS_PER_CHILD = 20
+
+# Sorted listings of the files in each output directory, keyed by
+# directory, so that each directory only needs to be scanned once
+DIRECTORY_LISTINGS = {}
+
 
 def array_coordinates(channelmod, detector_list, lowerleft_list):
     """Create an appropriately sized ``numpy`` array to contain the
@@ -216,11 +237,18 @@ def check_existence(file_list, outdir):
                         file_parts['parallel_seq_id'], file_parts['activity'],
                         file_parts['exposure_id'], mosaic_str, file_parts['suffix'])
 
-    current_files = glob.glob(os.path.join(outdir, search_string))
-    if len(current_files) > 0:
-        return True
-    else:
-        return False
+    # Only files starting with the part of the search string before the
+    # first wildcard can match it. These are adjacent in the sorted
+    # directory listing.
+    listing = get_directory_listing(outdir)
+    prefix = re.split(r'[*?\[]', search_string, maxsplit=1)[0]
+    index = bisect.bisect_left(listing, prefix)
+    while index < len(listing) and listing[index].startswith(prefix):
+        if fnmatch.fnmatchcase(listing[index], search_string):
+            return True
+        index += 1
+
+    return False
 
 
 def create_dummy_filename(filelist):
@@ -311,13 +339,14 @@ def create_mosaic(filenames):
     full_xdim, full_ydim, full_lower_left = array_coordinates(mosaic_channel, detector,
                                                               data_lower_left)
 
-    # Create the array to hold all the data
+    # Create the array to hold all the data, using the same datatype
+    # as the data
     datashape = data[0].shape
     datadim = len(datashape)
     if datadim == 2:
-        full_array = np.zeros((1, full_ydim, full_xdim)) * np.nan
+        full_array = np.full((1, full_ydim, full_xdim), np.nan, dtype=data[0].dtype)
     elif datadim == 3:
-        full_array = np.zeros((datashape[0], full_ydim, full_xdim)) * np.nan
+        full_array = np.full((datashape[0], full_ydim, full_xdim), np.nan, dtype=data[0].dtype)
     else:
         raise ValueError('Difference image for {} must be either 2D or 3D.'.format(filenames[0]))
 
@@ -497,6 +526,106 @@ def find_data_channel(detectors):
     return channel
 
 
+def find_exposure_groups(input_files):
+    """Find the groups of files from common exposures, ordered from the
+    largest to the smallest total file size
+
+    Parameters
+    ----------
+    input_files : dict
+        ``(size, mtime)`` of each file, keyed by filename (e.g. the
+        output of ``find_input_files``)
+
+    Returns
+    -------
+    exposure_groups : list
+        List of exposure groups, each of which is a list of filenames
+        as returned by ``group_filenames``
+    """
+
+    # Files are grouped within each program directory
+    files_by_directory = OrderedDict()
+    for filename in input_files:
+        files_by_directory.setdefault(os.path.dirname(filename), []).append(filename)
+
+    exposure_groups = []
+    for filenames in files_by_directory.values():
+        exposure_groups.extend(group_filenames(filenames))
+
+    # Start on the largest groups first, so that they do not hold up
+    # the end of the run
+    exposure_groups.sort(key=lambda file_list: sum(input_files[filename][0]
+                                                   for filename in file_list),
+                         reverse=True)
+
+    return exposure_groups
+
+
+def find_input_files(programs):
+    """Find the fits files in the given programs, along with their
+    sizes and modification times. Each program directory is scanned
+    once, and the file information comes from the scan. Programs that
+    are not directories are skipped, as are those that cannot be read.
+
+    Parameters
+    ----------
+    programs : list
+        List of program identifiers (e.g. ``88600``)
+
+    Returns
+    -------
+    input_files : dict
+        ``(size, mtime)`` of each file, keyed by filename
+    """
+
+    input_files = OrderedDict()
+    for program in programs:
+        program_dir = os.path.join(get_config()['filesystem'], program)
+        if not os.path.isdir(program_dir):
+            continue
+        num_files = len(input_files)
+        try:
+            with os.scandir(program_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.fits') and not entry.name.startswith('.') \
+                            and entry.is_file():
+                        file_stat = entry.stat()
+                        input_files[entry.path] = (file_stat.st_size, file_stat.st_mtime)
+        except OSError as error:
+            logging.warning('Unable to read {}: {}'.format(program_dir, error))
+        logging.info('Found {} filenames in {}'.format(len(input_files) - num_files, program))
+
+    return input_files
+
+
+def get_directory_listing(directory):
+    """Return the sorted list of the files in the given directory. The
+    directory is scanned the first time it is requested, and the
+    listing is then kept up to date by ``update_directory_listings``.
+
+    Parameters
+    ----------
+    directory : str
+        Path to the directory
+
+    Returns
+    -------
+    listing : list
+        Sorted list of the names of the files in ``directory``. Empty
+        if the directory does not exist.
+    """
+
+    if directory not in DIRECTORY_LISTINGS:
+        try:
+            with os.scandir(directory) as entries:
+                listing = sorted(entry.name for entry in entries if entry.is_file())
+        except FileNotFoundError:
+            listing = []
+        DIRECTORY_LISTINGS[directory] = listing
+
+    return DIRECTORY_LISTINGS[directory]
+
+
 def get_base_output_name(filename_dict):
     """Returns the base output name used for preview images and
     thumbnails.
@@ -531,17 +660,94 @@ def generate_preview_images():
     # Begin logging
     logging.info("Beginning the script run")
 
-    # Process programs in parallel
+    # Find all input files, and forget any that no longer exist
     program_list = [os.path.basename(item) for item in glob.glob(os.path.join(get_config()['filesystem'], '*'))]
-    pool = multiprocessing.Pool(processes=int(get_config()['cores']))
-    pool.map(process_program, program_list)
-    pool.close()
-    pool.join()
+    input_files = find_input_files(program_list)
+    exposure_groups = find_exposure_groups(input_files)
+    logging.info('Found {} exposures in {} programs'
+                 .format(len(exposure_groups), len(program_list)))
+
+    manifest = PreviewManifest(os.path.join(get_config()['outputs'], 'preview_image_manifest.db'))
+    try:
+        manifest.prune(input_files)
+
+        # Only exposures containing new or changed files need images. If
+        # any file in the exposure already has images, they are out of
+        # date and are regenerated. Otherwise, skip exposures whose
+        # preview images already exist. The directory listings built
+        # here are inherited by the worker processes.
+        tasks = []
+        existing_files = []
+        for file_list in exposure_groups:
+            changed = (manifest.changed(filename, *input_files[filename]) for filename in file_list)
+            if not any(changed):
+                continue
+            overwrite = any(manifest.outputs(filename) is not None for filename in file_list)
+            preview_output_directory = get_output_directories(file_list[0])[0]
+            if not overwrite and check_existence(file_list, preview_output_directory):
+                existing_files.extend(file_list)
+                continue
+            tasks.append((file_list, overwrite))
+        logging.info('{} exposures need preview images'.format(len(tasks)))
+
+        # Files whose images already exist (e.g. all files, on the first
+        # run with a new manifest) are recorded in a single transaction
+        manifest.record(existing_files, input_files, [])
+        logging.info('Recorded {} files with existing preview images in the manifest'
+                     .format(len(existing_files)))
+
+        # Process the exposures in parallel, largest first. The manifest
+        # is only updated by this process, as each exposure finishes.
+        exposures = {file_list[0]: file_list for file_list, overwrite in tasks}
+        pool = multiprocessing.Pool(processes=int(get_config()['cores']),
+                                    maxtasksperchild=MAX_TASKS_PER_CHILD)
+        try:
+            results = pool.imap_unordered(process_file_group_task, tasks, chunksize=1)
+            for task_number, (filename, elapsed_time, saved_files) in enumerate(results, start=1):
+                logging.info('Finished exposure {} of {}: {} ({:.1f} seconds)'
+                             .format(task_number, len(tasks), filename, elapsed_time))
+                if saved_files is not None:
+                    manifest.replace_outputs(exposures[filename], input_files, saved_files)
+                else:
+                    manifest.record_failure(exposures[filename], input_files)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        manifest.close()
 
     # Complete logging:
     logging.info("Completed.")
 
 
+def get_output_directories(filename):
+    """Return the directories in which the preview image and thumbnail
+    of the given file are saved
+
+    Parameters
+    ----------
+    filename : str
+        Name of the fits file
+
+    Returns
+    -------
+    preview_output_directory : str
+        Directory containing the preview images
+
+    thumbnail_output_directory : str
+        Directory containing the thumbnails
+    """
+
+    try:
+        identifier = 'jw{}'.format(filename_parser(filename)['program_id'])
+    except ValueError:
+        identifier = os.path.basename(filename).split('.fits')[0]
+    preview_output_directory = os.path.join(get_config()['preview_image_filesystem'], identifier)
+    thumbnail_output_directory = os.path.join(get_config()['thumbnail_filesystem'], identifier)
+
+    return preview_output_directory, thumbnail_output_directory
+
+
 def group_filenames(filenames):
     """Given a list of JWST filenames, group together files from the
     same exposure. These files will share the same ``program_id``,
@@ -566,138 +772,420 @@ def group_filenames(filenames):
         information.
     """
 
-    # Some initializations
-    grouped, matched_names = [], []
+    # Files from a common exposure share the same key. Each file is
+    # parsed only once, and assigned to its exposure with a dictionary
+    # lookup.
+    exposures = OrderedDict()
     filenames.sort()
 
-    # Loop over each file in the list of good files
     for filename in filenames:
 
-        # Holds list of matching files for exposure
-        subgroup = []
-
-        # Generate string to be matched with other filenames
+        # Generate the exposure key for this file
         filename_dict = filename_parser(os.path.basename(filename))
 
-        # If the filename was already involved in a match, then skip
-        if filename not in matched_names:
+        # For stage 3 filenames, treat individually
+        if 'stage_3' in filename_dict['filename_type']:
+            exposure_key = (filename, )
 
-            # For stage 3 filenames, treat individually
-            if 'stage_3' in filename_dict['filename_type']:
-                matched_names.append(filename)
-                subgroup.append(filename)
+        # Group together stage 1 and 2 filenames
+        elif filename_dict['filename_type'] == 'stage_1_and_2':
 
-            # Group together stage 1 and 2 filenames
-            elif filename_dict['filename_type'] == 'stage_1_and_2':
+            # Determine detector naming convention
+            if filename_dict['detector'].upper() in NIRCAM_SHORTWAVE_DETECTORS:
+                detector_str = 'NRC_SW'
+            elif filename_dict['detector'].upper() in NIRCAM_LONGWAVE_DETECTORS:
+                detector_str = 'NRC_LW'
+            else:  # non-NIRCam detectors
+                detector_str = filename_dict['detector'].upper()
 
-                # Determine detector naming convention
-                if filename_dict['detector'].upper() in NIRCAM_SHORTWAVE_DETECTORS:
-                    detector_str = 'NRC[AB][1234]'
-                elif filename_dict['detector'].upper() in NIRCAM_LONGWAVE_DETECTORS:
-                    detector_str = 'NRC[AB]5'
-                else:  # non-NIRCam detectors
-                    detector_str = filename_dict['detector'].upper()
+            exposure_key = (os.path.dirname(filename), filename_dict['program_id'],
+                            filename_dict['observation'], filename_dict['visit'],
+                            filename_dict['visit_group'], filename_dict['parallel_seq_id'],
+                            filename_dict['activity'], filename_dict['exposure_id'],
+                            filename_dict['suffix'].lower(), detector_str)
 
-                # Build pattern to match against
-                base_output_name = get_base_output_name(filename_dict)
-                match_str = '{}{}_{}.fits'.format(base_output_name, detector_str, filename_dict['suffix'])
-                match_str = os.path.join(os.path.dirname(filename), match_str)
-                pattern = re.compile(match_str, re.IGNORECASE)
+        # Other filename types are not grouped, and are skipped
+        else:
+            continue
 
-                # Try to match the substring to each good file
-                for file_to_match in filenames:
-                    if pattern.match(file_to_match) is not None:
-                        matched_names.append(file_to_match)
-                        subgroup.append(file_to_match)
+        if exposure_key not in exposures:
+            exposures[exposure_key] = []
+        exposures[exposure_key].append(filename)
 
-        if len(subgroup) > 0:
-            grouped.append(subgroup)
+    grouped = list(exposures.values())
 
     return grouped
 
 
-def process_program(program):
-    """Generate preview images and thumbnails for the given program.
+def process_file_group(file_list, overwrite=False):
+    """Generate preview images and thumbnails for a group of files
+    from a common exposure (e.g. an element of the list returned by
+    ``group_filenames``).
 
     Parameters
     ----------
-    program : str
-        The program identifier (e.g. ``88600``)
-    """
+    file_list : list
+        List of filenames in the exposure group
 
-    # Group together common exposures
-    filenames = glob.glob(os.path.join(get_config()['filesystem'], program, '*.fits'))
-    grouped_filenames = group_filenames(filenames)
-    logging.info('Found {} filenames'.format(len(filenames)))
+    overwrite : bool
+        If ``True``, regenerate the images even if they already exist
 
-    for file_list in grouped_filenames:
-        filename = file_list[0]
+    Returns
+    -------
+    filename : str
+        The first filename in the group, which identifies the group
 
-        # Determine the save location
-        try:
-            identifier = 'jw{}'.format(filename_parser(filename)['program_id'])
-        except ValueError:
-            identifier = os.path.basename(filename).split('.fits')[0]
-        preview_output_directory = os.path.join(get_config()['preview_image_filesystem'], identifier)
-        thumbnail_output_directory = os.path.join(get_config()['thumbnail_filesystem'], identifier)
-
-        # Check to see if the preview images already exist and skip if they do
-        file_exists = check_existence(file_list, preview_output_directory)
-        if file_exists:
-            logging.info("JPG already exists for {}, skipping.".format(filename))
-            continue
+    elapsed_time : float
+        Time taken to process the group, in seconds
+
+    saved_files : list or None
+        The preview images and thumbnails that were created. Empty if
+        the preview images already existed, and ``None`` if they could
+        not be created.
+    """
 
-        # Create the output directories if necessary
-        if not os.path.exists(preview_output_directory):
-            os.makedirs(preview_output_directory)
-            permissions.set_permissions(preview_output_directory)
-            logging.info('Created directory {}'.format(preview_output_directory))
-        if not os.path.exists(thumbnail_output_directory):
-            os.makedirs(thumbnail_output_directory)
-            permissions.set_permissions(thumbnail_output_directory)
-            logging.info('Created directory {}'.format(thumbnail_output_directory))
-
-        # If the exposure contains more than one file (because more
-        # than one detector was used), then create a mosaic
-        max_size = 8
-        numfiles = len(file_list)
-        if numfiles > 1:
-            try:
-                mosaic_image, mosaic_dq = create_mosaic(file_list)
-                logging.info('Created mosiac for:')
-                for item in file_list:
-                    logging.info('\t{}'.format(item))
-            except (ValueError, FileNotFoundError) as error:
-                logging.error(error)
-            dummy_file = create_dummy_filename(file_list)
-            if numfiles in [2, 4]:
-                max_size = 16
-            elif numfiles in [8]:
-                max_size = 32
-
-        # Create the nominal preview image and thumbnail
+    start_time = time.time()
+    filename = file_list[0]
+
+    # Determine the save location
+    preview_output_directory, thumbnail_output_directory = get_output_directories(filename)
+
+    # Check to see if the preview images already exist and skip if they do
+    file_exists = check_existence(file_list, preview_output_directory)
+    if file_exists and not overwrite:
+        logging.info("JPG already exists for {}, skipping.".format(filename))
+        return filename, time.time() - start_time, []
+
+    # Create the output directories if necessary
+    if not os.path.exists(preview_output_directory):
+        os.makedirs(preview_output_directory)
+        permissions.set_permissions(preview_output_directory)
+        logging.info('Created directory {}'.format(preview_output_directory))
+    if not os.path.exists(thumbnail_output_directory):
+        os.makedirs(thumbnail_output_directory)
+        permissions.set_permissions(thumbnail_output_directory)
+        logging.info('Created directory {}'.format(thumbnail_output_directory))
+
+    # If the exposure contains more than one file (because more
+    # than one detector was used), then create a mosaic
+    max_size = 8
+    numfiles = len(file_list)
+    if numfiles > 1:
         try:
-            im = PreviewImage(filename, "SCI")
-            im.clip_percent = 0.01
-            im.scaling = 'log'
-            im.cmap = 'viridis'
-            im.output_format = 'jpg'
-            im.preview_output_directory = preview_output_directory
-            im.thumbnail_output_directory = thumbnail_output_directory
-
-            # If a mosaic was made from more than one file
-            # insert it and it's associated DQ array into the
-            # instance of PreviewImage. Also set the input
-            # filename to indicate that we have mosaicked data
-            if numfiles != 1:
-                im.data = mosaic_image
-                im.dq = mosaic_dq
-                im.file = dummy_file
-
-            im.make_image(max_img_size=max_size)
-            logging.info('Created preview image and thumbnail for: {}'.format(filename))
-        except ValueError as error:
-            logging.warning(error)
+            mosaic_image, mosaic_dq = create_mosaic(file_list)
+            logging.info('Created mosiac for:')
+            for item in file_list:
+                logging.info('\t{}'.format(item))
+        except (ValueError, FileNotFoundError) as error:
+            logging.error(error)
+        dummy_file = create_dummy_filename(file_list)
+        if numfiles in [2, 4]:
+            max_size = 16
+        elif numfiles in [8]:
+            max_size = 32
+
+    # Create the nominal preview image and thumbnail
+    try:
+        im = PreviewImage(filename, "SCI")
+        im.clip_percent = 0.01
+        im.scaling = 'log'
+        im.cmap = 'viridis'
+        im.output_format = 'jpg'
+        im.preview_output_directory = preview_output_directory
+        im.thumbnail_output_directory = thumbnail_output_directory
+
+        # If a mosaic was made from more than one file
+        # insert it and it's associated DQ array into the
+        # instance of PreviewImage. Also set the input
+        # filename to indicate that we have mosaicked data
+        if numfiles != 1:
+            im.data = mosaic_image
+            im.dq = mosaic_dq
+            im.file = dummy_file
+
+        im.make_image(max_img_size=max_size)
+        update_directory_listings(im.saved_files)
+        saved_files = im.saved_files
+        logging.info('Created preview image and thumbnail for: {}'.format(filename))
+    except ValueError as error:
+        logging.warning(error)
+        saved_files = None
+
+    return filename, time.time() - start_time, saved_files
+
+
+def process_file_group_task(task):
+    """Call ``process_file_group`` with the arguments in ``task``, for
+    use with ``multiprocessing.Pool.imap_unordered``. Any exception
+    raised while processing the group is caught and logged, so that a
+    failure on one exposure (e.g. a corrupt fits file) does not stop
+    the processing of the others.
+
+    Parameters
+    ----------
+    task : tuple
+        ``(file_list, overwrite)`` arguments to ``process_file_group``
+
+    Returns
+    -------
+    results : tuple
+        Output of ``process_file_group``. If an exception was raised,
+        ``saved_files`` is ``None``.
+    """
+
+    file_list, overwrite = task
+    start_time = time.time()
+    try:
+        return process_file_group(file_list, overwrite)
+    except Exception as error:
+        logging.exception('Failed to create preview images for {}: {}'.format(file_list[0], error))
+        return file_list[0], time.time() - start_time, None
+
+
+def update_directory_listings(filenames):
+    """Add newly created files to the listings of any directories that
+    have already been scanned by ``get_directory_listing``
+
+    Parameters
+    ----------
+    filenames : list
+        List of full paths to the new files
+    """
+
+    for filename in filenames:
+        directory, name = os.path.split(filename)
+        listing = DIRECTORY_LISTINGS.get(directory)
+        if listing is not None:
+            index = bisect.bisect_left(listing, name)
+            if index == len(listing) or listing[index] != name:
+                listing.insert(index, name)
+
+
+class PreviewManifest():
+    """Record of the input files for which preview images and
+    thumbnails have been generated, stored in an SQLite database.
+
+    For each input file, the manifest holds the size and modification
+    time of the file when its images were generated, and the list of
+    images generated from it. A file whose size or modification time
+    no longer match has changed since then. Files for which images
+    could not be generated are marked as failed, along with their size
+    and modification time, so that they are not tried again until they
+    change.
+
+    Only the main process of a run reads or writes the manifest, and
+    changes are written in as few transactions as possible. Since the
+    database may be on a shared network filesystem, where SQLite's file
+    locking is unreliable, only one run may use a manifest at a time.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the SQLite database. It is created if necessary.
+
+    Attributes
+    ----------
+    connection : sqlite3.Connection
+        Connection to the database
+
+    entries : dict
+        ``(size, mtime, outputs, failed)`` of each file in the
+        manifest, keyed by filename
+    """
+
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS manifest (filename TEXT PRIMARY KEY, '
+                                'size INTEGER, mtime REAL, outputs TEXT, '
+                                'failed INTEGER DEFAULT 0)')
+
+        # Add the failed column to manifests created before it existed
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(manifest)')]
+        if 'failed' not in columns:
+            self.connection.execute('ALTER TABLE manifest ADD COLUMN failed INTEGER DEFAULT 0')
+        self.connection.commit()
+
+        # Keep the whole manifest in memory for fast lookups
+        self.entries = {}
+        rows = self.connection.execute('SELECT filename, size, mtime, outputs, failed '
+                                       'FROM manifest')
+        for filename, size, mtime, outputs, failed in rows:
+            self.entries[filename] = (size, mtime, json.loads(outputs), bool(failed))
+
+    def changed(self, filename, size, mtime):
+        """Return ``True`` if the file is not in the manifest, or has
+        changed since it was recorded (whether or not images could be
+        generated from it)
+
+        Parameters
+        ----------
+        filename : str
+            Full path to the input file
+
+        size : int
+            Current size of the file
+
+        mtime : float
+            Current modification time of the file
+
+        Returns
+        -------
+        changed : bool
+            ``True`` if the file is new or has changed
+        """
+
+        entry = self.entries.get(filename)
+
+        return entry is None or entry[0] != size or entry[1] != mtime
+
+    def close(self):
+        """Close the connection to the database"""
+
+        self.connection.close()
+
+    def failed(self, filename):
+        """Return ``True`` if images could not be generated from the file
+        when it was recorded
+
+        Parameters
+        ----------
+        filename : str
+            Full path to the input file
+
+        Returns
+        -------
+        failed : bool
+            Whether the file is recorded as failed
+        """
+
+        entry = self.entries.get(filename)
+
+        return entry is not None and entry[3]
+
+    def outputs(self, filename):
+        """Return the images recorded for a file
+
+        Parameters
+        ----------
+        filename : str
+            Full path to the input file
+
+        Returns
+        -------
+        outputs : list or None
+            Full paths to the images generated from the file, or
+            ``None`` if the file is not in the manifest
+        """
+
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+
+        return entry[2]
+
+    def prune(self, input_files):
+        """Remove the files that no longer exist from the manifest
+
+        Parameters
+        ----------
+        input_files : dict
+            All existing input files (e.g. the output of
+            ``find_input_files``)
+        """
+
+        missing = [filename for filename in self.entries if filename not in input_files]
+        with self.connection:
+            self.connection.executemany('DELETE FROM manifest WHERE filename = ?',
+                                        [(filename, ) for filename in missing])
+        for filename in missing:
+            del self.entries[filename]
+
+    def record(self, file_list, input_files, outputs):
+        """Record the images generated from a group of files
+
+        Parameters
+        ----------
+        file_list : list
+            List of the input files in the exposure group
+
+        input_files : dict
+            ``(size, mtime)`` of each file, keyed by filename (e.g. the
+            output of ``find_input_files``)
+
+        outputs : list
+            Full paths to the images generated from the group
+        """
+
+        self._write([(filename, list(outputs), False) for filename in file_list], input_files)
+
+    def record_failure(self, file_list, input_files):
+        """Record that images could not be generated from a group of
+        files. Any images previously generated from the files are kept
+        in the manifest, so that they are replaced once the files change
+        and new images are generated.
+
+        Parameters
+        ----------
+        file_list : list
+            List of the input files in the exposure group
+
+        input_files : dict
+            ``(size, mtime)`` of each file, keyed by filename
+        """
+
+        self._write([(filename, self.outputs(filename) or [], True) for filename in file_list],
+                    input_files)
+
+    def replace_outputs(self, file_list, input_files, outputs):
+        """Record the images generated from a group of files, and delete
+        any images previously generated from those files that were not
+        generated again
+
+        Parameters
+        ----------
+        file_list : list
+            List of the input files in the exposure group
+
+        input_files : dict
+            ``(size, mtime)`` of each file, keyed by filename
+
+        outputs : list
+            Full paths to the images generated from the group
+        """
+
+        stale_outputs = set()
+        for filename in file_list:
+            stale_outputs.update(self.outputs(filename) or [])
+        stale_outputs.difference_update(outputs)
+
+        for stale_output in stale_outputs:
+            if os.path.isfile(stale_output):
+                os.remove(stale_output)
+                logging.info('Removed out of date image {}'.format(stale_output))
+
+        self.record(file_list, input_files, outputs)
+
+    def _write(self, entries, input_files):
+        """Write entries to the manifest in a single transaction
+
+        Parameters
+        ----------
+        entries : list
+            List of ``(filename, outputs, failed)`` tuples
+
+        input_files : dict
+            ``(size, mtime)`` of each file, keyed by filename
+        """
+
+        rows = []
+        for filename, outputs, failed in entries:
+            size, mtime = input_files[filename]
+            self.entries[filename] = (size, mtime, outputs, failed)
+            rows.append((filename, size, mtime, json.dumps(outputs), int(failed)))
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO manifest (filename, size, mtime, '
+                                        'outputs, failed) VALUES (?, ?, ?, ?, ?)', rows)
 
 
 if __name__ == '__main__':
@@ -110,6 +110,11 @@ def instrument_inventory(instrument, dataproduct=JWST_DATAPRODUCTS,
     response = Mast.service_request_async(service, params)
     result = response[0].json()
 
+    # Results spanning several pages are returned as one response per
+    # page
+    for page in response[1:]:
+        result['data'] += page.json()['data']
+
     # Return all the data
     if return_data:
         return result
@@ -22,6 +22,41 @@ import numpy as np
 from jwql.utils import calculations
 
 
+def test_amplifier_stats():
+    """Test the per-amplifier statistics and histograms"""
+
+    np.random.seed(0)
+    image = np.random.normal(loc=1., scale=0.1, size=(20, 40))
+    image[3, 5] = 10.
+    image[10, 30] = -5.
+    amps = {'1': [(0, 20, 1), (0, 20, 1)],
+            '2': [(20, 40, 1), (0, 20, 1)],
+            '5': [(0, 40, 1), (0, 20, 1)]}
+
+    stats = calculations.amplifier_stats(image, amps)
+    assert list(stats.keys()) == ['1', '2', '5']
+
+    for key in amps:
+        mean_value, stdev_value, hist, bin_centers = stats[key]
+        region = calculations.amplifier_view(image, amps[key])
+        assert np.shares_memory(region, image)
+
+        expected_mean, expected_stdev = calculations.mean_stdev(region)
+        assert np.isclose(mean_value, expected_mean, atol=0, rtol=1e-12)
+        assert np.isclose(stdev_value, expected_stdev, atol=0, rtol=1e-12)
+
+        # The histogram covers 7 sigma either side of the mean
+        hist_range = (mean_value - 7 * stdev_value, mean_value + 7 * stdev_value)
+        expected_hist, bin_edges = np.histogram(region, bins=len(hist), range=hist_range)
+        assert np.all(hist == expected_hist)
+        assert np.allclose(bin_centers, (bin_edges[1:] + bin_edges[0: -1]) / 2.)
+
+    # Step values are honored in the same way as by np.mgrid
+    stepped = calculations.amplifier_view(image, [(1, 40, 4), (0, 20, 2)])
+    indexes = np.mgrid[0: 20: 2, 1: 40: 4]
+    assert np.all(stepped == image[indexes[0], indexes[1]])
+
+
 def test_double_gaussian_fit():
     """Test the double Gaussian fitting function"""
 
@@ -45,6 +80,34 @@ def test_double_gaussian_fit():
                        atol=0, rtol=0.000001)
 
 
+def test_double_gaussian_fit_batch():
+    """Test that the batched double Gaussian fit matches single fits of
+    each histogram"""
+
+    # Noise is added so that the uncertainties are not vanishingly small
+    np.random.seed(0)
+    bin_centers = []
+    histograms = []
+    initial_params = []
+    for input_params, step in [([500, 0.5, 0.05, 300, 0.4, 0.03], 0.007),
+                               ([200, 1.2, 0.1, 400, 0.9, 0.08], 0.01)]:
+        centers = np.arange(0., 2., step)
+        hist = calculations.double_gaussian(centers, *input_params)
+        hist += np.random.normal(scale=5., size=len(centers))
+        bin_centers.append(centers)
+        histograms.append(hist)
+        initial_params.append([value * 1.1 for value in input_params])
+
+    results = calculations.double_gaussian_fit_batch(bin_centers, histograms, initial_params)
+    assert len(results) == len(histograms)
+
+    for i, (params, sigma) in enumerate(results):
+        expected_params, expected_sigma = calculations.double_gaussian_fit(
+            bin_centers[i], histograms[i], initial_params[i])
+        assert np.allclose(params, expected_params, atol=0, rtol=0.0001)
+        assert np.allclose(sigma, expected_sigma, atol=0, rtol=0.0001)
+
+
 def test_gaussian1d_fit():
     """Test histogram fitting function"""
 
@@ -58,8 +121,36 @@ def test_gaussian1d_fit():
 
     assert np.isclose(peak[0], mean_value, atol=0.0035, rtol=0.)
     assert np.isclose(width[0], sigma_value, atol=0.0035, rtol=0.)
-    assert ((mean_value <= peak[0]+7*peak[1]) & (mean_value >= peak[0]-7*peak[1]))
-    assert ((sigma_value <= width[0]+7*width[1]) & (sigma_value >= width[0]-7*width[1]))
+    assert ((mean_value <= peak[0] + 7 * peak[1]) & (mean_value >= peak[0] - 7 * peak[1]))
+    assert ((sigma_value <= width[0] + 7 * width[1]) & (sigma_value >= width[0] - 7 * width[1]))
+
+
+def test_gaussian1d_fit_batch():
+    """Test that the batched Gaussian fit matches individual fits of
+    histograms with different numbers of bins"""
+
+    np.random.seed(0)
+    bin_centers = []
+    histograms = []
+    initial_params = []
+    for mean_value, sigma_value, num_bins in [(0.5, 0.1, 50), (1.5, 0.2, 80), (-0.5, 0.05, 120)]:
+        data = np.random.normal(loc=mean_value, scale=sigma_value, size=100000)
+        hist, bin_edges = np.histogram(data, bins=num_bins)
+        bin_centers.append((bin_edges[1:] + bin_edges[0: -1]) / 2.)
+        histograms.append(hist)
+        initial_params.append([np.max(hist), mean_value * 1.1, sigma_value * 1.2])
+
+    batch_results = calculations.gaussian1d_fit_batch(bin_centers, histograms, initial_params)
+
+    for i, batch_result in enumerate(batch_results):
+        x_values = bin_centers[i]
+        hist = histograms[i]
+        single_result = calculations.gaussian1d_fit(x_values, hist, initial_params[i])
+        assert np.allclose(batch_result, single_result, rtol=1e-4)
+
+        fit_params = [value for value, uncertainty in batch_result]
+        fit = calculations.double_gaussian(x_values, *fit_params, 0., 0., 1.)
+        assert np.isfinite(calculations.reduced_chi_squared(hist, fit, 3))
 
 
 def test_mean_image():
@@ -91,6 +182,26 @@ def test_mean_image():
     assert np.all(dev_img == 0.5)
 
 
+def test_mean_image_tiled():
+    """Test that combining the stack in tiles of rows gives the same
+    results as combining the full stack at once"""
+
+    np.random.seed(0)
+    cube = np.random.normal(loc=1., scale=0.1, size=(25, 37, 11))
+
+    # Add outliers that will be removed by sigma clipping
+    cube[3, 5, 5] = 40.
+    cube[7, 36, 0] = -40.
+    cube[11, 20, 10] = np.nan
+
+    mean_img, dev_img = calculations.mean_image(cube, sigma_threshold=3)
+    for rows_per_tile in [1, 8, 37, 100]:
+        tiled_mean, tiled_dev = calculations.mean_image(cube, sigma_threshold=3,
+                                                        rows_per_tile=rows_per_tile)
+        assert np.array_equal(tiled_mean, mean_img)
+        assert np.array_equal(tiled_dev, dev_img)
+
+
 def test_mean_stdev():
     """Test calcualtion of the sigma-clipped mean from an image"""
 
@@ -103,3 +214,29 @@ def test_mean_stdev():
     meanval, stdval = calculations.mean_stdev(image, sigma_threshold=3)
     assert meanval == 1.
     assert stdval == 0.
+
+
+def test_welford_update():
+    """Test that running statistics built from batches of images match
+    those calculated from the full stack"""
+
+    np.random.seed(0)
+    cube = np.random.normal(loc=1., scale=0.2, size=(12, 5, 6))
+    cube[3, 2, 2] = np.nan
+
+    count = np.zeros((5, 6), dtype=np.int32)
+    mean = np.zeros((5, 6))
+    m2 = np.zeros((5, 6))
+    for batch in [cube[0: 4], cube[4: 5], cube[5:]]:
+        calculations.welford_update(count, mean, m2, batch)
+    mean_image, stdev_image = calculations.welford_stats(count, mean, m2)
+
+    assert count[2, 2] == 11
+    assert np.all(count[count != 11] == 12)
+    assert np.allclose(mean_image, np.nanmean(cube, axis=0))
+    assert np.allclose(stdev_image, np.nanstd(cube, axis=0))
+
+    empty_mean, empty_stdev = calculations.welford_stats(np.zeros((2, 2)), np.zeros((2, 2)),
+                                                         np.zeros((2, 2)))
+    assert np.all(np.isnan(empty_mean))
+    assert np.all(np.isnan(empty_stdev))
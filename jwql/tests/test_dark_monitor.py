@@ -24,11 +24,86 @@ from astropy.time import Time
 import numpy as np
 
 from jwql.instrument_monitors.common_monitors import dark_monitor
+from jwql.utils import pixel_masks
 from jwql.utils.utils import get_config
 
 ON_JENKINS = '/home/jenkins' in os.path.expanduser('~')
 
 
+def test_classify_bad_pixels():
+    """Test the combined hot/dead/noisy pixel bitmask"""
+    monitor = dark_monitor.Dark()
+
+    comparison_image = np.zeros((10, 10)) + 1.
+    comparison_image[2, 2] = 0.
+    mean_image = np.zeros((10, 10)) + 1.
+    mean_image[1, 1] = 2.2
+    mean_image[2, 2] = 1.5
+    mean_image[6, 6] = 0.06
+
+    baseline_noise = np.zeros((10, 10)) + 0.5
+    noise_image = np.zeros((10, 10)) + 0.5
+    noise_image[1, 1] = 1.0
+    noise_image[9, 9] = 1.0
+
+    inputs = [image.copy() for image in [mean_image, comparison_image, noise_image, baseline_noise]]
+    bitmask, flat_indices = monitor.classify_bad_pixels(mean_image, comparison_image, noise_image,
+                                                        baseline_noise)
+
+    assert bitmask.dtype == np.uint8
+    assert bitmask[1, 1] == pixel_masks.HOT_PIXEL | pixel_masks.NOISY_PIXEL
+    assert bitmask[2, 2] == pixel_masks.HOT_PIXEL
+    assert bitmask[6, 6] == pixel_masks.DEAD_PIXEL
+    assert bitmask[9, 9] == pixel_masks.NOISY_PIXEL
+    assert np.sum(bitmask > 0) == 4
+    assert np.all(flat_indices['hot'] == np.array([11, 22]))
+    assert np.all(flat_indices['dead'] == np.array([66]))
+    assert np.all(flat_indices['noisy'] == np.array([11, 99]))
+
+    # Inputs are left unchanged
+    for original, image in zip(inputs, [mean_image, comparison_image, noise_image, baseline_noise]):
+        assert np.all(original == image)
+
+
+@pytest.mark.parametrize('instrument,x0,y0', [('nircam', 1985, 1985), ('miri', 969, 961)])
+def test_exclude_existing_badpix(monkeypatch, instrument, x0, y0):
+    """Test that bad pixels on the last row and column of a subarray
+    are placed correctly in the full frame bad pixel map"""
+
+    monitor = dark_monitor.Dark()
+    monitor.instrument = instrument
+    monitor.detector = 'DETECTOR'
+    monitor.x0 = x0
+    monitor.y0 = y0
+    full_frame_shape = monitor.get_full_frame_shape()
+
+    # Bad pixels in the last row and last column of a 64x64 subarray
+    # in the top right corner of the detector
+    bitmask = np.zeros((64, 64), dtype=np.uint8)
+    bitmask[63, 10] = pixel_masks.HOT_PIXEL
+    bitmask[5, 63] = pixel_masks.HOT_PIXEL
+    bitmask[63, 63] = pixel_masks.HOT_PIXEL
+    badpix = monitor.shift_to_full_frame(np.where(bitmask))
+    assert badpix[0].tolist() == [y0 + 4, y0 + 62, y0 + 62]
+    assert badpix[1].tolist() == [x0 + 62, x0 + 9, x0 + 62]
+    assert np.max(badpix[0]) == full_frame_shape[0] - 1
+    assert np.max(badpix[1]) == full_frame_shape[1] - 1
+
+    # One of the pixels has already been found
+    existing = np.zeros(full_frame_shape, dtype=bool)
+    existing[y0 + 62, x0 + 9] = True
+    monitor.badpix_maps[('DETECTOR', 'hot')] = {'map': existing, 'last_id': 0, 'num_read': 0}
+    monkeypatch.setattr(monitor, 'get_badpix_map', lambda pixel_type: existing)
+    monkeypatch.setattr(monitor, 'save_badpix_map', lambda pixel_type: None)
+
+    new_pixels = monitor.exclude_existing_badpix(badpix, 'hot')
+    assert new_pixels == ([y0 + 4, y0 + 62], [x0 + 62, x0 + 62])
+
+    # The new pixels are added to the map
+    monitor.update_badpix_map(new_pixels, 'hot')
+    assert np.all(np.array(np.where(existing)) == np.array(badpix))
+
+
 def test_find_hot_dead_pixels():
     """Test hot and dead pixel searches"""
     monitor = dark_monitor.Dark()
@@ -103,6 +178,73 @@ def test_mast_query_darks():
     assert filenames == truth_filenames
 
 
+def test_mast_query_darks_by_aperture():
+    """Test that the bulk MAST query results are sorted by instrument
+    and aperture, using a local stub in place of the MAST service"""
+
+    def dark_entry(aperture, filename, date):
+        return {'apername': aperture, 'filename': filename, 'date_obs_mjd': date}
+
+    entries = {'NRC_DARK': [dark_entry('NRCA1_FULL', 'file1.fits', 58000.),
+                            dark_entry('NRCB2_FULL', 'file2.fits', 58001.),
+                            dark_entry('NRCA1_FULL', 'file3.fits', 58002.)],
+               'MIR_DARKALL': [dark_entry('MIRIM_FULL', 'file4.fits', 58003.)],
+               'MIR_DARKIMG': [],
+               'MIR_DARKMRS': [dark_entry('MIRIFU_CHANNEL1A', 'file5.fits', 58004.)]}
+    requests = []
+
+    def stub_service(instrument, dataproduct=None, add_filters=None, return_data=False, caom=False):
+        requests.append((instrument, add_filters['exp_type']))
+        assert 'apername' not in add_filters
+        return {'data': entries[add_filters['exp_type']]}
+
+    start_dates = {'nircam': 57357., 'miri': 57500.}
+    results = dark_monitor.mast_query_darks_by_aperture(start_dates, 59000.,
+                                                        query_service=stub_service)
+
+    assert sorted(requests) == [('MIRI', 'MIR_DARKALL'), ('MIRI', 'MIR_DARKIMG'),
+                                ('MIRI', 'MIR_DARKMRS'), ('NIRCam', 'NRC_DARK')]
+    assert sorted(results.keys()) == ['miri', 'nircam']
+    nircam_files = [entry['filename'] for entry in results['nircam']['NRCA1_FULL']]
+    assert nircam_files == ['file1.fits', 'file3.fits']
+    assert [entry['filename'] for entry in results['nircam']['NRCB2_FULL']] == ['file2.fits']
+    assert sorted(results['miri'].keys()) == ['MIRIFU_CHANNEL1A', 'MIRIM_FULL']
+
+    # Instruments with incomplete results for any exposure type are
+    # left out, without affecting the other instruments
+    def truncating_service(instrument, dataproduct=None, add_filters=None, return_data=False,
+                           caom=False):
+        data = entries[add_filters['exp_type']]
+        if add_filters['exp_type'] == 'MIR_DARKMRS':
+            return {'data': data[0: 0], 'paging': {'rowsFiltered': len(data)}}
+        return {'data': data, 'paging': {'rowsFiltered': len(data)}}
+
+    results = dark_monitor.mast_query_darks_by_aperture(start_dates, 59000.,
+                                                        query_service=truncating_service)
+    assert sorted(results.keys()) == ['nircam']
+    nircam_files = [entry['filename'] for entry in results['nircam']['NRCA1_FULL']]
+    assert nircam_files == ['file1.fits', 'file3.fits']
+
+
+def test_mast_query_darks_concurrently(monkeypatch):
+    """Test that the separate MAST queries are matched up with their
+    instrument/aperture combinations"""
+
+    def stub_query(instrument, aperture, start_date, end_date):
+        return [{'filename': '{}_{}_{}_{}.fits'.format(instrument, aperture, start_date, end_date)}]
+
+    monkeypatch.setattr(dark_monitor, 'mast_query_darks', stub_query)
+    searches = {('nircam', 'NRCA1_FULL'): 58000., ('miri', 'MIRIM_FULL'): 58500.}
+    results = dark_monitor.mast_query_darks_concurrently(searches, 59000.)
+
+    nircam_file = results[('nircam', 'NRCA1_FULL')][0]['filename']
+    miri_file = results[('miri', 'MIRIM_FULL')][0]['filename']
+    assert nircam_file == 'nircam_NRCA1_FULL_58000.0_59000.0.fits'
+    assert miri_file == 'miri_MIRIM_FULL_58500.0_59000.0.fits'
+    assert len(results) == 2
+    assert dark_monitor.mast_query_darks_concurrently({}, 59000.) == {}
+
+
 def test_noise_check():
     """Test the search for noisier than average pixels"""
 
@@ -124,15 +266,223 @@ def test_noise_check():
     assert np.all(noisy[1] == np.array([3, 9]))
 
 
+def test_parse_args(monkeypatch):
+    """Test that the running baseline can be turned on from the command
+    line"""
+
+    monkeypatch.setattr('sys.argv', ['dark_monitor.py'])
+    assert not dark_monitor.parse_args().running_baseline
+
+    monkeypatch.setattr('sys.argv', ['dark_monitor.py', '--running_baseline'])
+    assert dark_monitor.parse_args().running_baseline
+
+
+def test_run_journal(tmpdir):
+    """Test recording and resuming progress on a work unit"""
+
+    directory = str(tmpdir.join('run_journal'))
+    work_unit = dark_monitor.ApertureWorkUnit('nircam', 'NRCA1_FULL', 57357.0, 58000.0,
+                                              ['file1_uncal.fits', 'file2_uncal.fits'], 3, True)
+
+    journal = dark_monitor.RunJournal(directory, 'nircam', 'NRCA1_FULL')
+    assert not journal.reached('discovered')
+    journal.start(work_unit)
+
+    slope_files = [str(tmpdir.join('file1_rate.fits')), str(tmpdir.join('file2_rate.fits'))]
+    journal.record('pipelined', files=work_unit.filenames, slope_files=slope_files)
+
+    # An interrupted run is picked up by the next one
+    journals = dark_monitor.load_run_journals(directory)
+    assert len(journals) == 1
+    resumed = journals[0]
+    assert resumed.reached('pipelined')
+    assert not resumed.reached('combined')
+    assert vars(resumed.work_unit()) == vars(work_unit)
+
+    # Stages can only be resumed if their products still exist
+    assert not resumed.resumable('pipelined', 'slope_files')
+    for filename in slope_files:
+        open(filename, 'w').close()
+    assert resumed.resumable('pipelined', 'slope_files')
+
+    assert resumed.record_failure() == 1
+    resumed.remove()
+    assert dark_monitor.load_run_journals(directory) == []
+
+
+def fake_process_aperture(work_unit, output_dir, use_running_baseline=False,
+                          pipeline_processes=None):
+    """Stand-in for ``dark_monitor.process_aperture`` that reports the
+    resources it was given"""
+
+    import multiprocessing
+    return work_unit.aperture, pipeline_processes, multiprocessing.current_process().daemon
+
+
+@pytest.mark.parametrize('cores, apertures, pipeline_processes', [(1, 2, 1), (4, 2, 2), (2, 3, 1)])
+def test_run_work_units(monkeypatch, cores, apertures, pipeline_processes):
+    """Test that the cores are divided between the apertures and the
+    pipeline runs of each aperture"""
+
+    monkeypatch.setattr(dark_monitor, 'get_config', lambda: {'cores': cores})
+    monkeypatch.setattr(dark_monitor, 'process_aperture', fake_process_aperture)
+    work_units = [dark_monitor.ApertureWorkUnit('nircam', 'NRCA{}_FULL'.format(i), 57357.0, 58000.0,
+                                                ['file_uncal.fits'], 1, True)
+                  for i in range(apertures)]
+
+    monitor = dark_monitor.Dark()
+    monitor.output_dir = ''
+    results = monitor.run_work_units(work_units)
+
+    assert sorted(result[0] for result in results) == [unit.aperture for unit in work_units]
+    assert all(result[1] == pipeline_processes for result in results)
+
+    # Aperture workers must be able to start their own pipeline pools
+    assert not any(result[2] for result in results)
+
+
+def test_running_baseline(tmpdir):
+    """Test that the running baseline leaves out clipped values, and can
+    be read back as a baseline slope image"""
+
+    directory = str(tmpdir)
+    baseline = dark_monitor.RunningBaseline(directory, 'nircam', 'NRCA1_FULL')
+    cube = np.ones((5, 4, 4))
+    cube[:, 0, 0] = [0.9, 1.1, 0.9, 1.1, 100.]
+    mean_image = np.ones((4, 4))
+    stdev_image = np.zeros((4, 4)) + 0.1
+    baseline.update(cube, mean_image, stdev_image, sigma_threshold=3, rows_per_tile=3)
+
+    baseline_mean, baseline_stdev = baseline.get_images()
+    assert np.allclose(baseline_mean, 1.)
+    assert np.isclose(baseline_stdev[0, 0], 0.1)
+    assert np.allclose(baseline_stdev[1:, :], 0.)
+
+    # The running baseline can be found again from its mean file name
+    monitor = dark_monitor.Dark()
+    running_mean, running_stdev = monitor.read_baseline_slope_image(baseline.filenames['mean'])
+    assert np.all(running_mean == baseline_mean)
+    assert np.all(running_stdev == baseline_stdev)
+    missing_file = os.path.join(directory, 'missing_running_mean.npy')
+    assert monitor.read_baseline_slope_image(missing_file) is None
+
+
+def test_running_baseline_interrupted_update(monkeypatch, tmpdir):
+    """Test that an interrupted update leaves the running baseline
+    files unchanged, and that an interrupted swap of the updated files
+    is finished when the baseline is next opened"""
+
+    directory = str(tmpdir)
+    baseline = dark_monitor.RunningBaseline(directory, 'nircam', 'NRCA1_FULL')
+    cube = np.ones((2, 4, 4))
+    mean_image = np.ones((4, 4))
+    stdev_image = np.zeros((4, 4)) + 0.1
+    baseline.update(cube, mean_image, stdev_image)
+
+    def failing_update(count, mean, m2, images):
+        raise RuntimeError('Interrupted')
+
+    monkeypatch.setattr(dark_monitor.calculations, 'welford_update', failing_update)
+    with pytest.raises(RuntimeError):
+        baseline.update(cube, mean_image, stdev_image, rows_per_tile=2)
+    monkeypatch.undo()
+
+    count = np.load(baseline.filenames['count'])
+    assert np.all(count == 2)
+    assert sorted(os.listdir(directory)) == sorted([os.path.basename(filename) for filename
+                                                    in baseline.filenames.values()])
+
+    # Updated files are only swapped in once all of them are complete
+    with open('{}.tmp'.format(baseline.filenames['count']), 'wb') as temporary_file:
+        np.save(temporary_file, count + 1)
+    baseline = dark_monitor.RunningBaseline(directory, 'nircam', 'NRCA1_FULL')
+    assert np.all(np.load(baseline.filenames['count']) == 2)
+    for name in ['count', 'mean', 'm2']:
+        with open('{}.tmp'.format(baseline.filenames[name]), 'wb') as temporary_file:
+            np.save(temporary_file, np.load(baseline.filenames[name]) + 1)
+    open(baseline.swap_file, 'w').close()
+    baseline = dark_monitor.RunningBaseline(directory, 'nircam', 'NRCA1_FULL')
+    assert np.all(np.load(baseline.filenames['count']) == 3)
+    assert len(os.listdir(directory)) == 3
+
+
+def test_resume_baseline_update(monkeypatch, tmpdir):
+    """Test that the slope images of a work unit are folded into the
+    running baseline exactly once when a run is interrupted after its
+    results are committed, but before the baseline is updated"""
+
+    monitor = dark_monitor.Dark(use_running_baseline=True)
+    monitor.instrument = 'nircam'
+    monitor.aperture = 'NRCA1_FULL'
+    monitor.output_dir = str(tmpdir)
+    monitor.data_dir = str(tmpdir)
+
+    slope_files = [str(tmpdir.join('file{}_rate.fits'.format(i))) for i in range(3)]
+    mean_slope_file = str(tmpdir.join('mean_slope.fits'))
+    for filename in slope_files + [mean_slope_file]:
+        open(filename, 'w').close()
+    work_unit = dark_monitor.ApertureWorkUnit('nircam', 'NRCA1_FULL', 57357.0, 58000.0,
+                                              ['file_uncal.fits'], 3, True)
+    journal = dark_monitor.RunJournal(str(tmpdir.join('run_journal')), 'nircam', 'NRCA1_FULL')
+    journal.start(work_unit)
+    journal.record('pipelined', files=work_unit.filenames, slope_files=slope_files)
+    journal.record('combined', mean_slope_file=mean_slope_file)
+    journal.record('committed', baseline_pending=True)
+    monitor.journal = journal
+
+    cube = np.ones((3, 4, 4))
+    mean_image = np.ones((4, 4))
+    stdev_image = np.zeros((4, 4)) + 0.1
+    monkeypatch.setattr(dark_monitor.pipeline_tools, 'image_stack',
+                        lambda files, memmap_dir=None: (cube, np.ones(3)))
+    monkeypatch.setattr(monitor, 'read_baseline_slope_image',
+                        lambda filename: (mean_image, stdev_image))
+
+    # A failure part way through the update leaves no trace
+    welford_update = dark_monitor.calculations.welford_update
+
+    def failing_update(count, mean, m2, images):
+        raise RuntimeError('Interrupted')
+
+    monkeypatch.setattr(dark_monitor.calculations, 'welford_update', failing_update)
+    with pytest.raises(RuntimeError):
+        monitor.resume_baseline_update()
+    baseline = dark_monitor.RunningBaseline(str(tmpdir.join('running_baselines')), 'nircam',
+                                            'NRCA1_FULL')
+    assert not baseline.exists()
+    assert not journal.reached('baseline_updated')
+
+    # The resumed run folds in the slope images once, and only once
+    monkeypatch.setattr(dark_monitor.calculations, 'welford_update', welford_update)
+    monitor.journal = dark_monitor.RunJournal(journal.directory, 'nircam', 'NRCA1_FULL')
+    monitor.resume_baseline_update()
+    monitor.resume_baseline_update()
+    assert monitor.journal.reached('baseline_updated')
+    assert np.all(np.load(baseline.filenames['count']) == 3)
+
+
+def test_split_mast_searches():
+    """Test that only recent searches are combined into a single query
+    for each instrument"""
+
+    search_starts = {'nircam': {'NRCA1_FULL': 58990., 'NRCA2_FULL': 58980., 'NRCA3_FULL': 57357.},
+                     'miri': {'MIRIM_FULL': 57357.},
+                     'fgs': {}}
+    combined, separate = dark_monitor.split_mast_searches(search_starts, 59000., max_days=30.)
+
+    assert combined == {'nircam': 58980.}
+    assert separate == {('nircam', 'NRCA3_FULL'): 57357., ('miri', 'MIRIM_FULL'): 57357.}
+
+
 def test_shift_to_full_frame():
     """Test pixel coordinate shifting to be in full frame coords"""
 
     monitor = dark_monitor.Dark()
-    monitor.x0 = 512
-    monitor.y0 = 512
+    monitor.x0 = 1025
+    monitor.y0 = 513
 
     coordinates = (np.array([6, 7]), np.array([6, 3]))
     new_coords = monitor.shift_to_full_frame(coordinates)
 
     assert np.all(new_coords[0] == np.array([518, 519]))
-    assert np.all(new_coords[1] == np.array([518, 515]))
+    assert np.all(new_coords[1] == np.array([1030, 1027]))
@@ -24,6 +24,9 @@ import pytest
 import random
 import string
 
+from sqlalchemy import Column, Index, Integer, LargeBinary, MetaData, String, Table
+from sqlalchemy import create_engine, inspect
+
 from jwql.database import database_interface as di
 from jwql.utils.constants import ANOMALIES
 from jwql.utils.utils import get_config
@@ -116,7 +119,7 @@ def test_monitor_orm_factory():
     if not os.path.isdir(test_dir):
         os.mkdir(test_dir)
     with open(test_filename, 'w') as f:
-        f.write('TEST_COLUMN, string')
+        f.write('TEST_COLUMN, string\nINDEXED_COLUMN, string, index')
 
     # Create the test table ORM
     TestMonitorTable = di.monitor_orm_factory(test_table_name)
@@ -125,11 +128,59 @@ def test_monitor_orm_factory():
     # Ensure the ORM exists and contains appropriate columns
     assert str(TestMonitorTable) == "<class 'jwql.database.database_interface.{}'>"\
         .format(test_table_name)
-    for column in ['id', 'entry_date', 'test_column']:
+    for column in ['id', 'entry_date', 'test_column', 'indexed_column']:
         assert column in table_attributes
 
+    # Ensure that only the requested column is indexed
+    assert TestMonitorTable.__table__.c.indexed_column.index
+    assert not TestMonitorTable.__table__.c.test_column.index
+
     # Remove test files and directories
     if os.path.isfile(test_filename):
         os.remove(test_filename)
     if os.path.isdir(test_dir):
         os.rmdir(test_dir)
+
+
+def test_update_existing_tables():
+    """Test that columns and indexes missing from an existing table are
+    added"""
+
+    engine = create_engine('sqlite://')
+
+    # Create a table with the original definition
+    original = MetaData()
+    Table('test_table', original, Column('id', Integer, primary_key=True), Column('name', String()))
+    original.create_all(engine)
+    engine.execute("INSERT INTO test_table (id, name) VALUES (1, 'a')")
+
+    # Add a column and an index to the definition
+    updated = MetaData()
+    Table('test_table', updated, Column('id', Integer, primary_key=True), Column('name', String()),
+          Column('mask', LargeBinary), Index('test_table_name_mask_idx', 'name', 'mask'))
+    Table('missing_table', updated, Column('id', Integer, primary_key=True))
+
+    changes = di.update_existing_tables(engine, updated)
+    assert changes == ['Added column test_table.mask',
+                       'Added index test_table_name_mask_idx to test_table']
+
+    inspector = inspect(engine)
+    columns = [column['name'] for column in inspector.get_columns('test_table')]
+    assert columns == ['id', 'name', 'mask']
+    indexes = [index['name'] for index in inspector.get_indexes('test_table')]
+    assert indexes == ['test_table_name_mask_idx']
+    assert 'missing_table' not in inspector.get_table_names()
+    assert list(engine.execute('SELECT id, name, mask FROM test_table')) == [(1, 'a', None)]
+
+    # Tables that are already up to date are left alone
+    assert di.update_existing_tables(engine, updated) == []
+
+
+def test_monitor_table_indexes():
+    """Test that indexes spanning several columns are added to the
+    monitor table ORMs"""
+
+    indexes = {index.name: [column.name for column in index.columns]
+               for index in di.NIRCamBiasStats.__table__.indexes}
+    assert indexes['nircam_bias_stats_aperture_uncal_filename_idx'] == ['aperture',
+                                                                        'uncal_filename']
@@ -0,0 +1,171 @@
+#! /usr/bin/env python
+
+"""Tests for the ``generate_preview_images`` module.
+
+Use
+---
+
+    These tests can be run via the command line (omit the ``-s`` to
+    suppress verbose output to stdout):
+    ::
+
+        pytest -s test_generate_preview_images.py
+"""
+
+import os
+import sqlite3
+
+from jwql.jwql_monitors import generate_preview_images
+from jwql.jwql_monitors.generate_preview_images import check_existence, group_filenames, \
+    PreviewManifest, update_directory_listings
+
+
+def test_check_existence(tmpdir):
+    """Test that existing preview images are found, including those
+    created after the directory was first checked"""
+
+    outdir = str(tmpdir)
+    for preview in ['jw00312002001_02102_00001_nrca1_rate_integ0.jpg',
+                    'jw00312002001_02102_00001_NRC_SWA_MOSAIC_rate_integ0.jpg']:
+        open(os.path.join(outdir, preview), 'w').close()
+
+    assert check_existence(['/data/jw00312002001_02102_00001_nrca1_rate.fits'], outdir)
+    assert not check_existence(['/data/jw00312002001_02102_00001_nrca2_rate.fits'], outdir)
+    assert check_existence(['/data/jw00312002001_02102_00001_nrca1_rate.fits',
+                            '/data/jw00312002001_02102_00001_nrca2_rate.fits'], outdir)
+    assert not check_existence(['/data/jw00312002001_02102_00001_nrca5_rate.fits',
+                                '/data/jw00312002001_02102_00001_nrcb5_rate.fits'], outdir)
+
+    preview_file = os.path.join(outdir, 'jw00312002001_02102_00001_nrca2_rate_integ0.jpg')
+    update_directory_listings([preview_file])
+    assert check_existence(['/data/jw00312002001_02102_00001_nrca2_rate.fits'], outdir)
+
+
+def test_find_input_files(monkeypatch, tmpdir):
+    """Test that fits files are found in each program directory, and
+    that other entries in the filesystem are skipped"""
+
+    filesystem = tmpdir.mkdir('filesystem')
+    program_dir = filesystem.mkdir('jw00312')
+    for name in ['jw00312002001_02102_00001_nrca1_rate.fits', 'notes.txt', '.hidden.fits']:
+        program_dir.join(name).write('data')
+    filesystem.join('README').write('not a program')
+    monkeypatch.setattr(generate_preview_images, 'get_config',
+                        lambda: {'filesystem': str(filesystem)})
+
+    input_files = generate_preview_images.find_input_files(['jw00312', 'README', 'jw99999'])
+
+    fits_file = str(program_dir.join('jw00312002001_02102_00001_nrca1_rate.fits'))
+    assert list(input_files) == [fits_file]
+    assert input_files[fits_file][0] == 4
+
+
+def test_group_filenames():
+    """Test that files are grouped by exposure"""
+
+    filenames = ['/data/jw00312/jw00312002001_02102_00001_nrcb1_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrca5_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrca1_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrcb5_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrca1_cal.fits',
+                 '/data/jw00312/jw00312002001_02102_00002_nrca1_rate.fits',
+                 '/data/jw00312/jw00312001001_02101_00001_nrs1_rate.fits',
+                 '/data/jw00312/jw00312001001_02101_00001_nrs2_rate.fits',
+                 '/data/jw00312/jw00312-o002_t001_nircam_clear-f150w_i2d.fits',
+                 '/data/jw00312/jw00312001001_02101_00001-seg001_nrca1_rate.fits']
+
+    expected = [['/data/jw00312/jw00312-o002_t001_nircam_clear-f150w_i2d.fits'],
+                ['/data/jw00312/jw00312001001_02101_00001_nrs1_rate.fits'],
+                ['/data/jw00312/jw00312001001_02101_00001_nrs2_rate.fits'],
+                ['/data/jw00312/jw00312002001_02102_00001_nrca1_cal.fits'],
+                ['/data/jw00312/jw00312002001_02102_00001_nrca1_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrcb1_rate.fits'],
+                ['/data/jw00312/jw00312002001_02102_00001_nrca5_rate.fits',
+                 '/data/jw00312/jw00312002001_02102_00001_nrcb5_rate.fits'],
+                ['/data/jw00312/jw00312002001_02102_00002_nrca1_rate.fits']]
+
+    assert group_filenames(filenames) == expected
+
+
+def test_process_file_group_task(monkeypatch):
+    """Test that an exception raised while processing one exposure is
+    caught, rather than ending the run"""
+
+    def corrupt_file(file_list, overwrite):
+        raise OSError('Corrupt file: {}'.format(file_list[0]))
+
+    monkeypatch.setattr(generate_preview_images, 'process_file_group', corrupt_file)
+    file_list = ['/data/jw00312002001_02102_00001_nrca1_rate.fits']
+    results = generate_preview_images.process_file_group_task((file_list, False))
+
+    assert results[0] == '/data/jw00312002001_02102_00001_nrca1_rate.fits'
+    assert results[2] is None
+
+
+def test_preview_manifest(tmpdir):
+    """Test that the manifest identifies new and changed files, and
+    removes out of date images"""
+
+    database = str(tmpdir.join('manifest.db'))
+    stale_image = str(tmpdir.join('jw00312002001_02102_00001_nrca1_rate_integ1.jpg'))
+    open(stale_image, 'w').close()
+    input_files = {'a_rate.fits': (100, 1.5), 'b_rate.fits': (200, 2.5)}
+
+    manifest = PreviewManifest(database)
+    assert manifest.changed('a_rate.fits', 100, 1.5)
+    assert manifest.outputs('a_rate.fits') is None
+    manifest.record(['a_rate.fits', 'b_rate.fits'], input_files, ['image.jpg', stale_image])
+    manifest.close()
+
+    # The manifest persists between runs
+    manifest = PreviewManifest(database)
+    assert not manifest.changed('a_rate.fits', 100, 1.5)
+    assert manifest.changed('a_rate.fits', 100, 3.5)
+    assert manifest.outputs('b_rate.fits') == ['image.jpg', stale_image]
+
+    # Images that are not regenerated are removed
+    manifest.replace_outputs(['a_rate.fits', 'b_rate.fits'], input_files, ['image.jpg'])
+    assert not os.path.isfile(stale_image)
+    assert manifest.outputs('a_rate.fits') == ['image.jpg']
+
+    # Failed files are not tried again until they change, and keep
+    # their earlier images so that these are replaced later
+    assert not manifest.failed('a_rate.fits')
+    manifest.record_failure(['a_rate.fits'], {'a_rate.fits': (100, 1.5)})
+    assert manifest.failed('a_rate.fits')
+    assert not manifest.changed('a_rate.fits', 100, 1.5)
+    assert manifest.changed('a_rate.fits', 150, 1.5)
+    assert manifest.outputs('a_rate.fits') == ['image.jpg']
+    manifest.close()
+    manifest = PreviewManifest(database)
+    assert manifest.failed('a_rate.fits')
+    assert not manifest.failed('b_rate.fits')
+    manifest.record(['a_rate.fits'], input_files, ['image.jpg'])
+    assert not manifest.failed('a_rate.fits')
+
+    # Files that no longer exist are forgotten
+    manifest.prune({'a_rate.fits': (100, 1.5)})
+    assert manifest.outputs('b_rate.fits') is None
+    manifest.close()
+    assert PreviewManifest(database).outputs('b_rate.fits') is None
+
+
+def test_preview_manifest_migration(tmpdir):
+    """Test that manifests created before failures were recorded can
+    still be read"""
+
+    database = str(tmpdir.join('manifest.db'))
+    connection = sqlite3.connect(database)
+    connection.execute('CREATE TABLE manifest (filename TEXT PRIMARY KEY, size INTEGER, '
+                       'mtime REAL, outputs TEXT)')
+    connection.execute('INSERT INTO manifest VALUES (?, ?, ?, ?)',
+                       ('a_rate.fits', 100, 1.5, '["image.jpg"]'))
+    connection.commit()
+    connection.close()
+
+    manifest = PreviewManifest(database)
+    assert manifest.outputs('a_rate.fits') == ['image.jpg']
+    assert not manifest.failed('a_rate.fits')
+    manifest.record_failure(['a_rate.fits'], {'a_rate.fits': (100, 1.5)})
+    manifest.close()
+    assert PreviewManifest(database).failed('a_rate.fits')
@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+
+"""Tests for the ``image_rendering`` module.
+
+Use
+---
+
+    These tests can be run via the command line (omit the ``-s`` to
+    suppress verbose output to stdout):
+    ::
+
+        pytest -s test_image_rendering.py
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.colors as colors  # noqa: E402
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+import pytest  # noqa: E402
+
+from jwql.utils import image_rendering  # noqa: E402
+
+
+@pytest.mark.parametrize('scale', ['linear', 'log'])
+def test_render_image(scale):
+    """Test that rendered colors match those from ``matplotlib``"""
+
+    np.random.seed(0)
+    image = np.random.normal(100., 10., size=(20, 30))
+    image[3, 4] = np.nan
+    min_value, max_value = 90., 115.
+
+    rgb = image_rendering.render_image(image, min_value, max_value, scale=scale, cmap='viridis')
+    assert rgb.shape == (20, 30, 3)
+    assert rgb.dtype == np.uint8
+
+    # Expected colors, from matplotlib
+    if scale == 'log':
+        norm = colors.LogNorm(vmin=1, vmax=max_value - min_value + 1)
+        values = image - min_value + 1
+    else:
+        norm = colors.Normalize(vmin=min_value, vmax=max_value)
+        values = image
+    expected = plt.get_cmap('viridis', 256)(norm(values))
+    good = np.isfinite(norm(values).filled(np.nan))
+    assert np.all(np.abs(rgb[good].astype(int) - np.round(expected[good][:, 0: 3] * 255)) <= 1)
+    assert np.all(rgb[~good] == image_rendering.BAD_PIXEL_COLOR)
+    assert tuple(rgb[3, 4]) == image_rendering.BAD_PIXEL_COLOR
+
+    # Values above the maximum take the last color in the colormap
+    brightest = np.unravel_index(np.nanargmax(image), image.shape)
+    assert np.all(rgb[brightest] == image_rendering.colormap_lut('viridis')[-1])
+
+    # Flipped output
+    flipped = image_rendering.render_image(image, min_value, max_value, scale=scale, origin='lower')
+    assert np.all(flipped == rgb[::-1])
+
+
+def test_save_image(tmpdir):
+    """Test that thumbnails are saved with the expected size"""
+
+    image = np.arange(2048. * 1024.).reshape(1024, 2048)
+    size = image_rendering.thumbnail_size(image.shape)
+    rgb = image_rendering.render_image(image, 0., image.max(), scale='log', size=size)
+    filename = str(tmpdir.join('test.thumb'))
+    image_rendering.save_image(rgb, filename, image_format='jpeg')
+
+    with Image.open(filename) as thumbnail:
+        assert thumbnail.format == 'JPEG'
+        assert thumbnail.size == (496, 248)
+
+
+@pytest.mark.parametrize('shape,size', [((2048, 2048), (369, 369)),
+                                        ((64, 2048), (496, 15)),
+                                        ((2048, 64), (11, 369)),
+                                        ((160, 320), (496, 248))])
+def test_thumbnail_size(shape, size):
+    """Test that thumbnail sizes match those created by ``matplotlib``"""
+
+    assert image_rendering.thumbnail_size(shape) == size
@@ -20,6 +20,7 @@ Use
 import os
 import pytest
 
+from astropy.io import fits
 import numpy as np
 
 from jwql.utils import instrument_properties
@@ -83,3 +84,21 @@ def test_calc_frame_time():
     assert np.isclose(nrc_fullframe, nearir_fullframe, atol=0.001, rtol=0)
     assert np.isclose(nrc_160, nircam_160, atol=0.001, rtol=0)
     assert np.isclose(nrs_fullframe, nearir_fullframe, atol=0.001, rtol=0)
+
+
+def test_file_metadata(tmpdir):
+    """Test that headers and data are read from a file opened once"""
+
+    filename = str(tmpdir.join('test_uncal.fits'))
+    primary = fits.PrimaryHDU()
+    primary.header['DATE-OBS'] = '2019-04-02'
+    primary.header['TIME-OBS'] = '12:30:05.25'
+    sci = fits.ImageHDU(np.arange(2 * 3 * 4 * 5, dtype=np.float32).reshape(2, 3, 4, 5), name='SCI')
+    pixeldq = fits.ImageHDU(np.ones((4, 5), dtype=np.uint32), name='PIXELDQ')
+    fits.HDUList([primary, sci, pixeldq]).writeto(filename)
+
+    with instrument_properties.FileMetadata(filename) as metadata:
+        obstime = instrument_properties.get_obstime(filename)
+        assert instrument_properties.get_obstime(metadata) == obstime
+        assert np.all(metadata.sci(1, 2) == sci.data[1, 2, :, :])
+        assert np.all(metadata.dq == 1)
@@ -77,3 +77,23 @@ def test_instrument_dataproduct_filtering():
     dps = [row['dataproduct_type'] for row in data['data']]
 
     assert all([i == dp for i in dps])
+
+
+def test_instrument_inventory_pages(monkeypatch):
+    """Test that results spanning several pages are combined, using a
+    local stub in place of the MAST service"""
+
+    class PageResponse():
+        def __init__(self, rows):
+            self.rows = rows
+
+        def json(self):
+            return {'data': self.rows, 'paging': {'rowsFiltered': 3}}
+
+    pages = [PageResponse([{'filename': 'file1.fits'}, {'filename': 'file2.fits'}]),
+             PageResponse([{'filename': 'file3.fits'}])]
+    monkeypatch.setattr(mm.Mast, 'service_request_async', lambda service, params: pages)
+
+    data = mm.instrument_inventory('nircam', return_data=True)
+
+    assert [row['filename'] for row in data['data']] == ['file1.fits', 'file2.fits', 'file3.fits']
@@ -21,6 +21,7 @@ from collections import OrderedDict
 import os
 import pytest
 
+from astropy.io import fits
 import numpy as np
 
 from jwql.instrument_monitors import pipeline_tools
@@ -134,7 +135,164 @@ def test_image_stack():
     truth[2, :, :] = 15.
 
     assert np.all(image_stack == truth)
-    assert exptimes == [[10.5], [10.5], [10.5]]
+    assert np.all(exptimes == np.array([10.5, 10.5, 10.5]))
+
+    # Build the same stack in a memory-mapped scratch file
+    memmap_stack, memmap_exptimes = pipeline_tools.image_stack(files, memmap_dir=directory)
+    assert isinstance(memmap_stack, np.memmap)
+    assert np.all(memmap_stack == truth)
+    assert np.all(memmap_exptimes == exptimes)
+
+
+def write_ramp(filename, date='2019-10-01T00:00:00.000', ngroups=2):
+    """Write a small ramp file with the given creation date"""
+
+    primary = fits.PrimaryHDU()
+    primary.header['DATE'] = date
+    sci = fits.ImageHDU(np.zeros((1, ngroups, 4, 4), dtype=np.uint16), name='SCI')
+    fits.HDUList([primary, sci]).writeto(filename, overwrite=True)
+
+
+def test_pipeline_cache(monkeypatch, tmpdir):
+    """Test storing, retrieving, and evicting products in the pipeline
+    product cache"""
+
+    monkeypatch.setattr(pipeline_tools, 'get_crds_context', lambda: 'jwst_0641.pmap')
+    cache_dir = str(tmpdir.mkdir('pipeline_cache'))
+    input_file = str(tmpdir.join('input_uncal.fits'))
+    write_ramp(input_file)
+
+    steps = OrderedDict([('dq_init', True), ('saturation', True), ('refpix', False)])
+    cache_key = pipeline_tools.pipeline_cache_key(input_file, steps)
+
+    # The key depends on the steps and their parameters
+    assert cache_key == pipeline_tools.pipeline_cache_key(input_file, steps.copy())
+    parameters = {'saturation': {'n_pix_grow_sat': 2}}
+    assert cache_key != pipeline_tools.pipeline_cache_key(input_file, steps, parameters)
+    steps['refpix'] = True
+    assert cache_key != pipeline_tools.pipeline_cache_key(input_file, steps)
+
+    # The key is the same for copies of the input file in other
+    # directories, even with different modification times, but not
+    # for other versions of the file
+    refpix_key = pipeline_tools.pipeline_cache_key(input_file, steps)
+    copied_file = str(tmpdir.mkdir('staged').join('input_uncal.fits'))
+    write_ramp(copied_file)
+    os.utime(copied_file, (0, 0))
+    assert refpix_key == pipeline_tools.pipeline_cache_key(copied_file, steps)
+    write_ramp(copied_file, date='2019-11-01T00:00:00.000')
+    assert refpix_key != pipeline_tools.pipeline_cache_key(copied_file, steps)
+    write_ramp(copied_file, ngroups=3)
+    assert refpix_key != pipeline_tools.pipeline_cache_key(copied_file, steps)
+    renamed_file = str(tmpdir.join('other_uncal.fits'))
+    write_ramp(renamed_file)
+    assert refpix_key != pipeline_tools.pipeline_cache_key(renamed_file, steps)
+
+    output_file = str(tmpdir.join('input_refpix.fits'))
+    assert not pipeline_tools.get_cached_pipeline_product(cache_key, output_file,
+                                                          cache_dir=cache_dir)
+
+    product_file = str(tmpdir.join('product.fits'))
+    with open(product_file, 'wb') as file_object:
+        file_object.write(b'x' * 100)
+    pipeline_tools.cache_pipeline_product(cache_key, product_file, cache_dir=cache_dir)
+    assert pipeline_tools.get_cached_pipeline_product(cache_key, output_file, cache_dir=cache_dir)
+    with open(output_file, 'rb') as file_object:
+        assert file_object.read() == b'x' * 100
+
+    # Cache entries never share a file with the products they were
+    # copied from, or with the products retrieved from them
+    cached_file = pipeline_tools.find_cached_pipeline_product(cache_key, cache_dir=cache_dir)
+    assert cached_file == os.path.join(cache_dir, '{}.fits'.format(cache_key))
+    assert not os.path.samefile(product_file, cached_file)
+    assert not os.path.samefile(output_file, cached_file)
+    assert pipeline_tools.find_cached_pipeline_product('missing', cache_dir=cache_dir) is None
+
+    # Adding a second product beyond the maximum size evicts the least
+    # recently used one
+    os.utime(os.path.join(cache_dir, '{}.fits'.format(cache_key)), (0, 0))
+    pipeline_tools.cache_pipeline_product('newer', product_file, cache_dir=cache_dir, max_size=150)
+    assert sorted(os.listdir(cache_dir)) == ['newer.fits']
+
+
+def test_pipeline_cache_key_unknown_context(monkeypatch, tmpdir):
+    """Test that there is no pipeline cache key when the CRDS context
+    is unknown, and that the key depends on the context"""
+
+    input_file = str(tmpdir.join('input_uncal.fits'))
+    write_ramp(input_file)
+    steps = OrderedDict([('dq_init', True), ('saturation', True)])
+
+    monkeypatch.setattr(pipeline_tools, 'get_crds_context', lambda: None)
+    assert pipeline_tools.pipeline_cache_key(input_file, steps) is None
+
+    monkeypatch.setattr(pipeline_tools, 'get_crds_context', lambda: 'jwst_0641.pmap')
+    old_key = pipeline_tools.pipeline_cache_key(input_file, steps)
+    monkeypatch.setattr(pipeline_tools, 'get_crds_context', lambda: 'jwst_0642.pmap')
+    assert pipeline_tools.pipeline_cache_key(input_file, steps) != old_key
+
+
+def test_starts_with_shared_steps():
+    """Test that the NIRCam pipeline begins with the steps shared with
+    the bias monitor, and the MIRI pipeline does not"""
+
+    assert pipeline_tools.starts_with_shared_steps(pipeline_tools.get_pipeline_steps('nircam'))
+    assert not pipeline_tools.starts_with_shared_steps(pipeline_tools.get_pipeline_steps('miri'))
+    steps = OrderedDict([('dq_init', True), ('refpix', True)])
+    assert not pipeline_tools.starts_with_shared_steps(steps)
+
+
+def test_run_calwebb_detector1_steps(monkeypatch, tmpdir):
+    """Test that steps are chained in memory, with only the requested
+    products saved and all models closed"""
+
+    models = []
+    saved = []
+
+    class FakeModel():
+        def __init__(self, history):
+            self.history = history
+            self.closed = False
+            models.append(self)
+
+        def close(self):
+            self.closed = True
+
+        def save(self, filename):
+            saved.append((filename, self.history))
+
+    def fake_step(step_name):
+        class FakeStep():
+            @staticmethod
+            def call(step_input, **kwargs):
+                history = [] if isinstance(step_input, str) else step_input.history
+                return FakeModel(history + [(step_name, kwargs)])
+        return FakeStep
+
+    step_names = ['dq_init', 'saturation', 'superbias', 'refpix']
+    mapping = {step_name: fake_step(step_name) for step_name in step_names}
+    monkeypatch.setattr(pipeline_tools, 'PIPELINE_STEP_MAPPING', mapping)
+    monkeypatch.setattr(pipeline_tools, 'save_zeroth_group_product',
+                        lambda model, filename: saved.append((filename, model.history)))
+
+    input_file = str(tmpdir.join('test_uncal.fits'))
+    steps = OrderedDict([('dq_init', True), ('saturation', True), ('superbias', False),
+                         ('refpix', True)])
+    parameters = {'refpix': {'odd_even_rows': False}}
+    output_file = pipeline_tools.run_calwebb_detector1_steps(input_file, steps,
+                                                             step_parameters=parameters,
+                                                             save_intermediate=['saturation'],
+                                                             save_zeroth_group=['saturation'])
+
+    assert output_file == input_file.replace('.fits', '_refpix.fits')
+    saturation_file = input_file.replace('.fits', '_saturation.fits')
+    zeroth_group_file = input_file.replace('.fits', '_saturation_0thgroup.fits')
+    assert [filename for filename, history in saved] == [saturation_file, zeroth_group_file,
+                                                         output_file]
+    assert saved[-1][1] == [('dq_init', {}), ('saturation', {}),
+                            ('refpix', {'odd_even_rows': False})]
+    assert len(models) == 3
+    assert all([model.closed for model in models])
 
 
 def test_steps_to_run():
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+
+"""Tests for the ``pixel_masks`` module.
+
+Use
+---
+
+    These tests can be run via the command line (omit the ``-s`` to
+    suppress verbose output to stdout):
+    ::
+
+        pytest -s test_pixel_masks.py
+"""
+
+import numpy as np
+import pytest
+
+from jwql.utils import pixel_masks
+
+
+@pytest.mark.parametrize('first_pixel', [False, True])
+def test_encode_decode_mask(first_pixel):
+    """Test that masks survive a round trip through the encoding"""
+
+    np.random.seed(0)
+    mask = np.random.random((30, 40)) > 0.95
+    mask[:, 7] = True
+    mask[0, 0] = first_pixel
+    mask[-1, -1] = True
+
+    encoded = pixel_masks.encode_mask(mask)
+    assert isinstance(encoded, bytes)
+
+    decoded = pixel_masks.decode_mask(encoded)
+    assert decoded.shape == mask.shape
+    assert np.all(decoded == mask)
+
+    # Empty masks
+    empty = np.zeros((2048, 2048), dtype=bool)
+    assert np.all(pixel_masks.decode_mask(pixel_masks.encode_mask(empty)) == empty)
+
+
+def test_mask_coordinates():
+    """Test the conversion between coordinate lists and masks"""
+
+    coordinates = ([1, 1, 2], [0, 3, 5])
+    mask = pixel_masks.coordinates_to_mask(coordinates, (4, 6))
+
+    assert mask.sum() == 3
+    assert mask[1, 3]
+    assert pixel_masks.mask_to_coordinates(mask) == coordinates
@@ -26,6 +26,7 @@ import pytest
 import shutil
 
 from astropy.io import fits
+import numpy as np
 
 from jwql.utils.preview_image import PreviewImage
 from jwql.utils.utils import get_config, ensure_dir_exists
@@ -67,6 +68,28 @@ def test_directory(test_dir=TEST_DIRECTORY):
         os.remove(file)
 
 
+def test_get_data(tmpdir):
+    """Test that only the first and last groups of each integration
+    are read in, with the requested datatype"""
+
+    np.random.seed(0)
+    ramp = np.random.randint(0, 65535, size=(2, 5, 10, 12)).astype(np.uint16)
+    filename = str(tmpdir.join('test_uncal.fits'))
+    fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(ramp, name='SCI')]).writeto(filename)
+
+    image = PreviewImage(filename, 'SCI')
+    assert image.data.dtype == np.float32
+    assert image.data.shape == (2, 2, 10, 12)
+    assert np.all(image.data[:, 0, :, :] == ramp[:, 0, :, :])
+    assert np.all(image.data[:, 1, :, :] == ramp[:, -1, :, :])
+    difference = ramp[:, -1, :, :].astype(float) - ramp[:, 0, :, :]
+    assert np.all(image.difference_image(image.data) == difference)
+    assert np.all(image.dq)
+
+    image = PreviewImage(filename, 'SCI', dtype=np.float64)
+    assert image.data.dtype == np.float64
+
+
 def get_test_fits_files():
     """Get a list of the FITS files on central storage to make preview images.
 
@@ -22,7 +22,7 @@ import os
 from pathlib import Path
 import pytest
 
-from jwql.utils.utils import copy_files, get_config, filename_parser, \
+from jwql.utils.utils import copy_files, get_config, filename_parser, stage_files, \
     filesystem_path, _validate_config
 
 # Determine if tests are being run on jenkins
@@ -387,3 +387,48 @@ def test_validate_config():
 
     is_valid = _validate_config(good_config_dict)
     assert is_valid is None, 'Failed to validate correct JSON dict'
+
+
+@pytest.mark.parametrize('link', [True, False])
+def test_stage_files(tmpdir, link):
+    """Test that files are linked or copied into the working directory"""
+
+    source_dir = tmpdir.mkdir('source')
+    out_dir = str(tmpdir.mkdir('working'))
+    original_files = []
+    for i in range(3):
+        original_file = source_dir.join('file_{}.fits'.format(i))
+        original_file.write_binary(os.urandom(1000 * (i + 1)))
+        original_files.append(str(original_file))
+    missing_file = str(source_dir.join('missing.fits'))
+
+    success, failure = stage_files(original_files + [missing_file], out_dir, link=link,
+                                   chunk_size=256)
+    expected = [os.path.join(out_dir, os.path.basename(filename)) for filename in original_files]
+    assert success == expected
+    assert failure == [missing_file]
+    assert sorted(os.listdir(out_dir)) == ['file_0.fits', 'file_1.fits', 'file_2.fits']
+
+    for original_file, staged_file in zip(original_files, success):
+        with open(original_file, 'rb') as original, open(staged_file, 'rb') as staged:
+            assert original.read() == staged.read()
+        # Linked files share the data of the original file
+        assert os.path.samefile(original_file, staged_file) == link
+
+    # Files already present are not staged again
+    success, failure = stage_files(original_files, out_dir, link=link)
+    assert len(success) == 3
+    assert failure == []
+
+    # Outputs keep the order of the inputs, and broken links left in the
+    # working directory are replaced
+    new_file = source_dir.join('file_3.fits')
+    new_file.write_binary(os.urandom(1000))
+    os.symlink(str(source_dir.join('removed.fits')), os.path.join(out_dir, 'file_3.fits'))
+    filenames = [missing_file, original_files[2], str(new_file), original_files[0]]
+    success, failure = stage_files(filenames, out_dir, link=link)
+    expected_names = ['file_2.fits', 'file_3.fits', 'file_0.fits']
+    assert success == [os.path.join(out_dir, name) for name in expected_names]
+    assert failure == [missing_file]
+    with open(os.path.join(out_dir, 'file_3.fits'), 'rb') as staged:
+        assert staged.read() == new_file.read_binary()
@@ -24,6 +24,111 @@ from scipy.optimize import curve_fit
 from scipy.stats import sigmaclip
 
 
+def amplifier_stats(image, amps, sigma_threshold=3, hist_range=7):
+    """Calculate the sigma-clipped mean and standard deviation, along
+    with a histogram of the pixel values, for each amplifier in an
+    image. Amplifiers covering regions of the same shape are stacked
+    and sigma-clipped together, rather than one at a time. The values
+    of each amplifier are sorted once, after which both the clipping
+    and the histogram only need binary searches of the sorted values.
+
+    The histogram for each amplifier covers the mean plus or minus
+    ``hist_range`` times the clipped standard deviation. The bin width
+    follows Scott's rule using the clipped standard deviation, so the
+    number of bins depends only on the number of pixels in the
+    amplifier, and no additional pass through the data is needed to
+    determine the binning.
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D array on which to calculate statistics
+
+    amps : dict
+        Dictionary containing amp boundary coordinates (output from
+        ``amplifier_info`` function)
+        ``amps[key] = [(xmin, xmax, xstep), (ymin, ymax, ystep)]``
+
+    sigma_threshold : float
+        Number of sigma to use when sigma-clipping
+
+    hist_range : float
+        Half-width of the histogram range, in units of the clipped
+        standard deviation
+
+    Returns
+    -------
+    stats : dict
+        Keys match those in ``amps``. Values are tuples of
+        ``(mean, stdev, hist, bin_centers)``
+    """
+
+    # Group the amplifiers by the shape of the region they cover
+    groups = {}
+    for key in amps:
+        groups.setdefault(amplifier_view(image, amps[key]).shape, []).append(key)
+
+    stats = {}
+    for shape, keys in groups.items():
+
+        # Copy the regions into a double precision array, as they would
+        # otherwise be converted at every binary search
+        regions = np.empty((len(keys),) + shape)
+        for region, key in zip(regions, keys):
+            region[:] = amplifier_view(image, amps[key])
+        regions = regions.reshape(len(keys), -1)
+        regions.sort(axis=1)
+        mean_values, stdev_values = _mean_stdev_rows(regions, sigma_threshold=sigma_threshold)
+
+        for key, region, mean_value, stdev_value in zip(keys, regions, mean_values, stdev_values):
+
+            # Scott's rule, bin width = 3.49 * sigma / n**(1/3), across
+            # a range of 2 * hist_range * sigma
+            num_bins = max(1, int(np.ceil(2. * hist_range * region.size ** (1. / 3.) / 3.49)))
+            lower_bound = mean_value - hist_range * stdev_value
+            upper_bound = mean_value + hist_range * stdev_value
+            bin_edges = np.histogram_bin_edges(region, bins=num_bins,
+                                               range=(lower_bound, upper_bound))
+            bin_centers = (bin_edges[1:] + bin_edges[0: -1]) / 2.
+
+            # As in np.histogram, the last bin includes its upper edge
+            hist = np.diff(np.searchsorted(region, bin_edges, side='left'))
+            hist[-1] += np.searchsorted(region, bin_edges[-1], side='right') \
+                - np.searchsorted(region, bin_edges[-1], side='left')
+
+            stats[key] = (mean_value, stdev_value, hist, bin_centers)
+
+    return {key: stats[key] for key in amps}
+
+
+def amplifier_view(image, bounds):
+    """Return a view of the portion of an image covered by a single
+    amplifier
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D image, or stack of 2D images (in which case the amplifier
+        is taken from the last two axes)
+
+    bounds : list
+        Amp boundary coordinates for a single amplifier (e.g. a value
+        from the dictionary returned by ``amplifier_info``)
+        ``[(xmin, xmax, xstep), (ymin, ymax, ystep)]``
+
+    Returns
+    -------
+    region : numpy.ndarray
+        View of ``image`` covering the amplifier. This shares memory
+        with ``image``.
+    """
+
+    x_start, x_end, x_step = bounds[0]
+    y_start, y_end, y_step = bounds[1]
+
+    return image[..., y_start: y_end: y_step, x_start: x_end: x_step]
+
+
 def double_gaussian(x, amp1, peak1, sigma1, amp2, peak2, sigma2):
     """Equate two Gaussians
 
@@ -73,6 +178,38 @@ def double_gaussian_fit(x_values, y_values, input_params):
     return params, sigma
 
 
+def double_gaussian_fit_batch(x_values, y_values, input_params):
+    """Fit two Gaussians to each of several arrays at once. The fits
+    are done simultaneously with a vectorized Levenberg-Marquardt
+    solver using the analytic derivatives of the model.
+
+    Parameters
+    ----------
+    x_values : list
+        List of 1D arrays of x values to be fit. Arrays may have
+        different lengths.
+
+    y_values : list
+        List of 1D arrays of y values to be fit, matching ``x_values``
+
+    input_params : list
+        List of initial guesses for Gaussian coefficients, one for each
+        array. ``[amplitude1, peak1, stdev1, amplitude2, peak2, stdev2]``
+
+    Returns
+    -------
+    results : list
+        List of ``(params, sigma)`` tuples, one for each array, in the
+        same format as the output of ``double_gaussian_fit``
+    """
+
+    params, cov = _levenberg_marquardt_batch(_double_gaussian_jacobian, x_values, y_values,
+                                             input_params)
+    sigma = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+
+    return [(fit_params, fit_sigma) for fit_params, fit_sigma in zip(params, sigma)]
+
+
 def gaussian1d_fit(x_values, y_values, params):
     """Fit 1D Gaussian to an array. Designed around fitting to histogram
     of pixel values.
@@ -110,10 +247,266 @@ def gaussian1d_fit(x_values, y_values, params):
     return amplitude, peak, width
 
 
-def mean_image(cube, sigma_threshold=3):
+def gaussian1d_fit_batch(x_values, y_values, params):
+    """Fit a 1D Gaussian to each of several arrays at once (e.g. the
+    histograms of pixel values from each amplifier). The fits are done
+    simultaneously with a vectorized Levenberg-Marquardt solver using
+    the analytic derivatives of the model.
+
+    Parameters
+    ----------
+    x_values : list
+        List of 1D arrays of x values to be fit. Arrays may have
+        different lengths.
+
+    y_values : list
+        List of 1D arrays of y values to be fit, matching ``x_values``
+
+    params : list
+        List of initial guesses ``[amplitude, peak, width]``, one for
+        each array
+
+    Returns
+    -------
+    results : list
+        List of ``(amplitude, peak, width)`` tuples, one for each
+        array, in the same format as the output of ``gaussian1d_fit``
+    """
+
+    best_fit, cov = _levenberg_marquardt_batch(_gaussian1d_jacobian, x_values, y_values, params)
+    cov_diag = np.diagonal(cov, axis1=1, axis2=2)
+
+    # Arrange each parameter into (best_fit_value, uncertainty) tuple
+    results = []
+    for fit_params, fit_variance in zip(best_fit, cov_diag):
+        results.append(tuple((value, np.sqrt(variance))
+                             for value, variance in zip(fit_params, fit_variance)))
+
+    return results
+
+
+def _double_gaussian_jacobian(x, params):
+    """Evaluate the sum of two Gaussians and its derivatives with
+    respect to each parameter, for a batch of parameter sets
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        2D array (fits x points) of x values
+
+    params : numpy.ndarray
+        2D array (fits x 6) of Gaussian coefficients
+
+    Returns
+    -------
+    model : numpy.ndarray
+        2D array (fits x points) of model values
+
+    jacobian : numpy.ndarray
+        3D array (fits x points x 6) of model derivatives
+    """
+
+    model_1, jacobian_1 = _gaussian1d_jacobian(x, params[:, 0: 3])
+    model_2, jacobian_2 = _gaussian1d_jacobian(x, params[:, 3: 6])
+
+    return model_1 + model_2, np.concatenate([jacobian_1, jacobian_2], axis=2)
+
+
+def _gaussian1d_jacobian(x, params):
+    """Evaluate a 1D Gaussian and its derivatives with respect to each
+    parameter, for a batch of parameter sets
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        2D array (fits x points) of x values
+
+    params : numpy.ndarray
+        2D array (fits x 3) of ``[amplitude, peak, width]`` values
+
+    Returns
+    -------
+    model : numpy.ndarray
+        2D array (fits x points) of model values
+
+    jacobian : numpy.ndarray
+        3D array (fits x points x 3) of model derivatives
+    """
+
+    amplitude = params[:, 0: 1]
+    peak = params[:, 1: 2]
+    width = params[:, 2: 3]
+
+    offset = (x - peak) / width
+    exponential = np.exp(-0.5 * offset ** 2)
+    model = amplitude * exponential
+    jacobian = np.stack([exponential, model * offset / width, model * offset ** 2 / width], axis=2)
+
+    return model, jacobian
+
+
+def _levenberg_marquardt_batch(model_jacobian, x_values, y_values, initial_params,
+                               max_iterations=200, tolerance=1.49012e-08):
+    """Least-squares fit of a model to several arrays at once using the
+    Levenberg-Marquardt algorithm. Arrays of different lengths are
+    padded, with the padding given zero weight.
+
+    Parameters
+    ----------
+    model_jacobian : func
+        Function taking a 2D array of x values and a 2D array of
+        parameters, and returning the model values and the Jacobian
+        (e.g. ``_gaussian1d_jacobian``)
+
+    x_values : list
+        List of 1D arrays of x values to be fit
+
+    y_values : list
+        List of 1D arrays of y values to be fit
+
+    initial_params : list
+        List of initial parameter guesses, one for each array
+
+    max_iterations : int
+        Maximum number of iterations
+
+    tolerance : float
+        Fits stop once the relative decrease of their sum of squared
+        residuals falls below this value
+
+    Returns
+    -------
+    params : numpy.ndarray
+        2D array (fits x parameters) of best-fit parameters
+
+    cov : numpy.ndarray
+        3D array (fits x parameters x parameters) of parameter
+        covariance matrices, scaled by the reduced sum of squared
+        residuals in the same way as ``scipy.optimize.curve_fit``
+    """
+
+    num_fits = len(x_values)
+    num_points = np.array([len(x) for x in x_values])
+    x = np.zeros((num_fits, np.max(num_points)))
+    y = np.zeros_like(x)
+    weights = np.zeros_like(x)
+    for i, (x_fit, y_fit) in enumerate(zip(x_values, y_values)):
+        x[i, 0: num_points[i]] = x_fit
+        y[i, 0: num_points[i]] = y_fit
+        weights[i, 0: num_points[i]] = 1.
+        # Keep the padded x values within the data range
+        x[i, num_points[i]:] = x_fit[0]
+
+    params = np.array(initial_params, dtype=np.float64)
+    num_params = params.shape[1]
+    identity = np.eye(num_params)
+
+    model, jacobian = model_jacobian(x, params)
+    residuals = weights * (y - model)
+    ssr = np.sum(residuals ** 2, axis=1)
+    damping = np.full(num_fits, 1.e-3)
+    active = np.ones(num_fits, dtype=bool)
+
+    for iteration in range(max_iterations):
+        jacobian = jacobian * weights[:, :, np.newaxis]
+        jtj = np.einsum('bnp,bnq->bpq', jacobian, jacobian)
+        jtr = np.einsum('bnp,bn->bp', jacobian, residuals)
+
+        # Marquardt scaling of the damping term
+        scaled_diagonal = np.diagonal(jtj, axis1=1, axis2=2)[:, :, np.newaxis] * identity
+        matrix = jtj + damping[:, np.newaxis, np.newaxis] * scaled_diagonal
+        step = np.einsum('bpq,bq->bp', np.linalg.pinv(matrix), jtr)
+        step[~active] = 0.
+
+        trial_params = params + step
+        trial_model, trial_jacobian = model_jacobian(x, trial_params)
+        trial_residuals = weights * (y - trial_model)
+        trial_ssr = np.sum(trial_residuals ** 2, axis=1)
+
+        improved = active & np.isfinite(trial_ssr) & (trial_ssr <= ssr)
+        converged = improved & (ssr - trial_ssr <= tolerance * ssr)
+
+        params[improved] = trial_params[improved]
+        model[improved] = trial_model[improved]
+        jacobian[improved] = trial_jacobian[improved]
+        residuals[improved] = trial_residuals[improved]
+        ssr[improved] = trial_ssr[improved]
+        damping[improved] /= 10.
+        damping[active & ~improved] *= 10.
+
+        # Fits whose damping has grown this large can no longer move
+        active &= ~converged & (damping < 1.e16)
+        if not np.any(active):
+            break
+
+    # Covariance from the Jacobian at the best-fit parameters
+    _, jacobian = model_jacobian(x, params)
+    jacobian = jacobian * weights[:, :, np.newaxis]
+    jtj = np.einsum('bnp,bnq->bpq', jacobian, jacobian)
+    reduced_ssr = ssr / (num_points - num_params)
+    cov = np.linalg.pinv(jtj) * reduced_ssr[:, np.newaxis, np.newaxis]
+
+    return params, cov
+
+
+def mean_image(cube, sigma_threshold=3, rows_per_tile=None):
     """Combine a stack of 2D images into a mean slope image, using
     sigma-clipping on a pixel-by-pixel basis
 
+    Parameters
+    ----------
+    cube : numpy.ndarray
+        3D array containing a stack of 2D images. This may also be a
+        ``numpy.memmap``, in which case only one tile at a time is read
+        into memory when ``rows_per_tile`` is set.
+
+    sigma_threshold : int
+        Number of sigma to use when sigma-clipping values in each
+        pixel
+
+    rows_per_tile : int
+        Number of rows of the stack to combine at a time. If ``None``,
+        the entire stack is combined at once. Since the clipping is
+        done independently for each pixel, the results are identical
+        to those from the full stack, but the peak memory usage is
+        limited to roughly one tile times the number of images.
+
+    Returns
+    -------
+    mean_image : numpy.ndarray
+        2D sigma-clipped mean image
+
+    stdev_image : numpy.ndarray
+        2D sigma-clipped standard deviation image
+    """
+
+    if rows_per_tile is None:
+        return _clipped_mean_image(cube, sigma_threshold)
+
+    nimages, ny, nx = cube.shape
+    mean_image = None
+    std_image = None
+    for row_start in range(0, ny, rows_per_tile):
+        row_end = min(row_start + rows_per_tile, ny)
+        tile_mean, tile_std = _clipped_mean_image(np.asarray(cube[:, row_start: row_end, :]),
+                                                  sigma_threshold)
+
+        # Output datatype follows that of the clipped tile
+        if mean_image is None:
+            mean_image = np.zeros((ny, nx), dtype=tile_mean.dtype)
+            std_image = np.zeros((ny, nx), dtype=tile_std.dtype)
+        mean_image[row_start: row_end, :] = tile_mean
+        std_image[row_start: row_end, :] = tile_std
+
+    return mean_image, std_image
+
+
+def _clipped_mean_image(cube, sigma_threshold):
+    """Sigma-clip a stack of 2D images along the stacking axis and
+    return the mean and standard deviation images. This is the
+    calculation used by ``mean_image`` for the full stack or for
+    each tile.
+
     Parameters
     ----------
     cube : numpy.ndarray
@@ -139,6 +532,67 @@ def mean_image(cube, sigma_threshold=3):
     return mean_image, std_image
 
 
+def _mean_stdev_rows(data, sigma_threshold=3):
+    """Calculate the sigma-clipped mean and stdev of each row of a
+    sorted 2D array at once. The clipping is done in the same way as by
+    ``mean_stdev``, repeating until no more values are removed from
+    any row. As the rows are sorted, the values kept always form a
+    contiguous range of each row. The sums needed at each iteration are
+    then differences of cumulative sums, and the new range is found by
+    binary search, so the data are only passed over once.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        2D array of which to calculate statistics along each row. Each
+        row must be sorted.
+
+    sigma_threshold : float
+        Number of sigma to use when sigma-clipping
+
+    Returns
+    -------
+    mean_values : numpy.ndarray
+        Sigma-clipped mean of each row
+
+    stdev_values : numpy.ndarray
+        Sigma-clipped standard deviation of each row
+    """
+
+    num_rows, num_values = data.shape
+    rows = np.arange(num_rows)
+
+    # Sum the values relative to the median of each row, to preserve
+    # precision in the sums of squares
+    medians = data[:, num_values // 2].astype(np.float64)
+    deviations = data - medians[:, np.newaxis]
+    sums = np.zeros((num_rows, num_values + 1))
+    np.cumsum(deviations, axis=1, out=sums[:, 1:])
+    sums_of_squares = np.zeros((num_rows, num_values + 1))
+    np.cumsum(deviations ** 2, axis=1, out=sums_of_squares[:, 1:])
+
+    start = np.zeros(num_rows, dtype=int)
+    end = np.full(num_rows, num_values)
+    while True:
+        num_kept = end - start
+        mean_deviations = (sums[rows, end] - sums[rows, start]) / num_kept
+        variances = (sums_of_squares[rows, end] - sums_of_squares[rows, start]) / num_kept \
+            - mean_deviations ** 2
+        mean_values = medians + mean_deviations
+        stdev_values = np.sqrt(np.maximum(variances, 0.))
+
+        lower = mean_values - sigma_threshold * stdev_values
+        upper = mean_values + sigma_threshold * stdev_values
+        new_start = [np.searchsorted(row, limit, side='left') for row, limit in zip(data, lower)]
+        new_end = [np.searchsorted(row, limit, side='right') for row, limit in zip(data, upper)]
+        new_start = np.maximum(new_start, start)
+        new_end = np.minimum(new_end, end)
+
+        if np.all(new_start == start) and np.all(new_end == end):
+            return mean_values, stdev_values
+        start, end = new_start, new_end
+
+
 def mean_stdev(image, sigma_threshold=3):
     """Calculate the sigma-clipped mean and stdev of an input array
 
@@ -164,3 +618,98 @@ def mean_stdev(image, sigma_threshold=3):
     stdev_value = np.std(clipped)
 
     return mean_value, stdev_value
+
+
+def reduced_chi_squared(hist, fit, num_params):
+    """Calculate the reduced chi-squared of a model fit to a histogram,
+    using only the histogram bins with non-zero counts
+
+    Parameters
+    ----------
+    hist : numpy.ndarray
+        1D array of histogram values
+
+    fit : numpy.ndarray
+        1D array of model values at the histogram bin centers
+
+    num_params : int
+        Number of free parameters in the model
+
+    Returns
+    -------
+    chi_squared : float
+        Reduced chi-squared of the fit
+    """
+
+    positive = hist > 0
+    degrees_of_freedom = len(hist) - float(num_params)
+    chi_squared = np.sum((hist[positive] - fit[positive] ** 2) / fit[positive]) / degrees_of_freedom
+
+    return chi_squared
+
+
+def welford_stats(count, mean, m2):
+    """Return the mean and standard deviation images from running
+    per-pixel statistics kept by ``welford_update``
+
+    Parameters
+    ----------
+    count : numpy.ndarray
+        2D array of the number of values folded into each pixel
+
+    mean : numpy.ndarray
+        2D array of the running mean of each pixel
+
+    m2 : numpy.ndarray
+        2D array of the running sum of squared differences from the
+        mean of each pixel
+
+    Returns
+    -------
+    mean_image : numpy.ndarray
+        2D mean image. Pixels with no values are set to NaN.
+
+    stdev_image : numpy.ndarray
+        2D (population) standard deviation image. Pixels with no values
+        are set to NaN.
+    """
+
+    count = np.asarray(count)
+    populated = count > 0
+    mean_image = np.where(populated, mean, np.nan)
+    stdev_image = np.where(populated, np.sqrt(m2 / np.maximum(count, 1)), np.nan)
+
+    return mean_image, stdev_image
+
+
+def welford_update(count, mean, m2, images):
+    """Fold a stack of 2D images into running per-pixel statistics
+    using Welford's algorithm. The cost of an update depends only on
+    the number of new images, not on the number of images previously
+    folded in. ``count``, ``mean``, and ``m2`` are updated in place,
+    so they may be views into (e.g. memory-mapped) arrays. Non-finite
+    values are skipped.
+
+    Parameters
+    ----------
+    count : numpy.ndarray
+        2D array of the number of values folded into each pixel
+
+    mean : numpy.ndarray
+        2D array of the running mean of each pixel
+
+    m2 : numpy.ndarray
+        2D array of the running sum of squared differences from the
+        mean of each pixel
+
+    images : numpy.ndarray
+        3D stack of 2D images to fold in
+    """
+
+    for image in images:
+        image = np.asarray(image, dtype=np.float64)
+        good = np.isfinite(image)
+        count[good] += 1
+        delta = np.where(good, image - mean, 0.)
+        mean += delta / np.maximum(count, 1)
+        m2 += np.where(good, delta * (image - mean), 0.)
@@ -0,0 +1,265 @@
+"""Functions for quickly rendering images to PNG or JPEG files without
+creating ``matplotlib`` figures.
+
+Images are clipped, scaled (linearly or logarithmically), and mapped
+onto a colormap lookup table entirely in ``numpy``, and the resulting
+RGB array is resized and encoded with ``Pillow``. This is intended for
+images that need no axes, colorbars, or titles, such as thumbnails.
+The colors match those of ``matplotlib.pyplot.imshow`` for the same
+limits, scaling, and colormap, and thumbnails are given the same
+dimensions as those produced by ``matplotlib`` with the default figure
+settings and ``bbox_inches='tight'``.
+
+Use
+---
+
+    This module can be imported as such:
+    ::
+
+        from jwql.utils import image_rendering
+        rgb = image_rendering.render_image(image, min_value, max_value, scale='log',
+                                           size=image_rendering.thumbnail_size(image.shape))
+        image_rendering.save_image(rgb, 'thumbnail.thumb', image_format='jpeg')
+"""
+
+from functools import lru_cache
+
+import matplotlib
+from matplotlib import cm
+import numpy as np
+from PIL import Image
+
+# Number of colors in colormap lookup tables
+NUM_COLORS = 256
+
+# Width and height, in pixels, of the axes area of a default
+# ``matplotlib`` figure (6.4 x 4.8 inches at 100 dpi, with the default
+# subplot margins). Thumbnails are scaled to fit within this area.
+THUMBNAIL_BOX = (496., 369.6)
+
+# Color given to pixels that cannot be displayed (e.g. NaN values, or
+# non-positive values in log-scaled images)
+BAD_PIXEL_COLOR = (255, 255, 255)
+
+
+def colormap_lut(cmap, num_colors=NUM_COLORS):
+    """Return a lookup table of the RGB values of a ``matplotlib``
+    colormap. Tables are cached, so each colormap is only sampled once.
+
+    Parameters
+    ----------
+    cmap : str
+        Name of the ``matplotlib`` colormap (e.g. ``viridis``)
+
+    num_colors : int
+        Number of colors in the table
+
+    Returns
+    -------
+    lut : numpy.ndarray
+        2D ``uint8`` array (``num_colors`` x 3) of RGB values
+    """
+
+    return _colormap_lut(cmap, num_colors).copy()
+
+
+@lru_cache(maxsize=None)
+def _colormap_lut(cmap, num_colors):
+    """Cached calculation of ``colormap_lut``
+
+    Parameters
+    ----------
+    cmap : str
+        Name of the ``matplotlib`` colormap
+
+    num_colors : int
+        Number of colors in the table
+
+    Returns
+    -------
+    lut : numpy.ndarray
+        2D ``uint8`` array (``num_colors`` x 3) of RGB values
+    """
+
+    try:
+        colormap = matplotlib.colormaps[cmap].resampled(num_colors)
+    except AttributeError:
+        # matplotlib < 3.6
+        colormap = cm.get_cmap(cmap, num_colors)
+    rgba = colormap(np.arange(num_colors))
+
+    return np.round(rgba[:, 0: 3] * 255).astype(np.uint8)
+
+
+def fit_size(shape, box):
+    """Return the size of an image scaled to fit within a box while
+    keeping its aspect ratio
+
+    Parameters
+    ----------
+    shape : tuple
+        ``(y, x)`` shape of the image
+
+    box : tuple
+        ``(width, height)`` of the box, in pixels
+
+    Returns
+    -------
+    size : tuple
+        ``(width, height)`` of the scaled image, in pixels
+    """
+
+    ny, nx = shape[-2:]
+    scale = min(box[0] / nx, box[1] / ny)
+
+    # Allow for floating point error in the scaled dimension that
+    # exactly fills the box
+    width = max(1, int(nx * scale + 1.e-6))
+    height = max(1, int(ny * scale + 1.e-6))
+
+    return width, height
+
+
+def normalize_image(image, min_value, max_value, scale='linear'):
+    """Scale an image onto the range 0 to 1, in the same way as the
+    ``matplotlib`` ``Normalize`` and ``LogNorm`` classes
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D image
+
+    min_value : float
+        Value mapped to 0
+
+    max_value : float
+        Value mapped to 1
+
+    scale : str
+        Image scaling (``log``, ``linear``). For ``log`` scaling, the
+        image is first shifted so that ``min_value`` becomes 1, as is
+        done by ``PreviewImage``.
+
+    Returns
+    -------
+    normalized : numpy.ndarray
+        2D array of normalized values. Values outside of the limits
+        are not clipped. Pixels that cannot be displayed are set to
+        NaN.
+    """
+
+    if scale not in ['linear', 'log']:
+        raise ValueError('WARNING: scaling option {} not supported.'.format(scale))
+
+    image = np.asarray(image, dtype=np.float64)
+
+    if scale == 'log':
+        # Shift data so everything is positive
+        shifted = image - min_value + 1
+        log_max = np.log10(max_value - min_value + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shifted[shifted <= 0] = np.nan
+            normalized = np.log10(shifted)
+        if log_max > 0:
+            normalized /= log_max
+        else:
+            normalized[np.isfinite(normalized)] = 0.
+    else:
+        if max_value > min_value:
+            normalized = (image - min_value) / (max_value - min_value)
+        else:
+            normalized = np.where(np.isfinite(image), 0., np.nan)
+
+    return normalized
+
+
+def render_image(image, min_value, max_value, scale='linear', cmap='viridis', origin='upper',
+                 size=None):
+    """Render an image as an RGB array, using a colormap lookup table
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        2D image
+
+    min_value : float
+        Minimum value for display
+
+    max_value : float
+        Maximum value for display
+
+    scale : str
+        Image scaling (``log``, ``linear``)
+
+    cmap : str
+        Name of the ``matplotlib`` colormap
+
+    origin : str
+        ``upper`` to place the first row of the image at the top of
+        the output, or ``lower`` to place it at the bottom
+
+    size : tuple
+        ``(width, height)`` of the output, in pixels. If ``None``, the
+        output has the same dimensions as ``image``.
+
+    Returns
+    -------
+    rgb : numpy.ndarray
+        3D ``uint8`` array (y x x x 3) of RGB values
+    """
+
+    normalized = normalize_image(image, min_value, max_value, scale=scale)
+    lut = _colormap_lut(cmap, NUM_COLORS)
+
+    # Values below the minimum or above the maximum take the first or
+    # last color in the table
+    bad = ~np.isfinite(normalized)
+    normalized[bad] = 0.
+    indexes = np.clip((normalized * NUM_COLORS).astype(np.int64), 0, NUM_COLORS - 1)
+    rgb = lut[indexes]
+    rgb[bad] = BAD_PIXEL_COLOR
+
+    if origin == 'lower':
+        rgb = rgb[::-1]
+
+    if size is not None and tuple(size) != (rgb.shape[1], rgb.shape[0]):
+        rgb = np.asarray(Image.fromarray(rgb).resize(tuple(size), resample=Image.BILINEAR))
+
+    return rgb
+
+
+def save_image(rgb, filename, image_format=None):
+    """Save an RGB array to an image file
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        3D ``uint8`` array (y x x x 3) of RGB values (e.g. from
+        ``render_image``)
+
+    filename : str
+        Output filename
+
+    image_format : str
+        Image format (e.g. ``png``, ``jpeg``). If ``None``, the format
+        is determined from the extension of ``filename``.
+    """
+
+    Image.fromarray(rgb).save(filename, format=image_format, quality=95)
+
+
+def thumbnail_size(shape):
+    """Return the size of the thumbnail of an image
+
+    Parameters
+    ----------
+    shape : tuple
+        ``(y, x)`` shape of the image
+
+    Returns
+    -------
+    size : tuple
+        ``(width, height)`` of the thumbnail, in pixels
+    """
+
+    return fit_size(shape, THUMBNAIL_BOX)
@@ -15,6 +15,15 @@ Uses
 
         from jwql.utils import instrument_properties as inst
         amps = inst.amplifier_info('my_files.fits')
+
+    To read several pieces of information from the same file while
+    opening it only once:
+
+    ::
+
+        with inst.FileMetadata('my_files.fits') as metadata:
+            amps = inst.amplifier_info(metadata)
+            obs_time = inst.get_obstime(metadata)
 """
 
 from copy import deepcopy
@@ -27,6 +36,106 @@ import numpy as np
 from jwql.utils.constants import AMPLIFIER_BOUNDARIES, FOUR_AMP_SUBARRAYS, NIRCAM_SUBARRAYS_ONE_OR_FOUR_AMPS
 
 
+class FileMetadata():
+    """Access to the headers and data of a fits file, which is opened
+    only once, the first time anything is read from it. Data are only
+    read when requested, and the ``SCI`` data can be read one group at
+    a time. This can be passed to the functions in this module in place
+    of a filename, and should be closed when no longer needed (or used
+    as a context manager).
+
+    Parameters
+    ----------
+    filename : str
+        Name of fits file
+
+    Attributes
+    ----------
+    filename : str
+        Name of fits file
+    """
+
+    def __init__(self, filename):
+        """Initialize an instance of the ``FileMetadata`` class."""
+
+        self.filename = filename
+        self._hdulist = None
+        self._dq = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the file"""
+
+        if self._hdulist is not None:
+            self._hdulist.close()
+            self._hdulist = None
+        self._dq = None
+
+    @property
+    def dq(self):
+        """Data quality array, from the ``DQ`` extension, or the
+        ``PIXELDQ`` extension for ramp files
+        """
+
+        if self._dq is None:
+            try:
+                self._dq = self.hdulist['DQ'].data
+            except KeyError:
+                try:
+                    self._dq = self.hdulist['PIXELDQ'].data
+                except KeyError:
+                    raise KeyError('DQ extension not found.')
+
+        return self._dq
+
+    @property
+    def hdulist(self):
+        """The opened ``astropy.io.fits.HDUList``"""
+
+        if self._hdulist is None:
+            self._hdulist = fits.open(self.filename)
+
+        return self._hdulist
+
+    @property
+    def header(self):
+        """Primary header"""
+
+        return self.hdulist[0].header
+
+    def sci(self, integration=0, group=0):
+        """Read a single 2D frame of the ``SCI`` data. Only the
+        requested frame is read from the file.
+
+        Parameters
+        ----------
+        integration : int
+            Integration number, for 3D and 4D data
+
+        group : int
+            Group number, for 4D data
+
+        Returns
+        -------
+        data : numpy.ndarray
+            2D image
+        """
+
+        sci_hdu = self.hdulist['SCI']
+        naxis = sci_hdu.header['NAXIS']
+        if naxis == 4:
+            return sci_hdu.section[integration, group, :, :]
+        elif naxis == 3:
+            return sci_hdu.section[integration, :, :]
+
+        return sci_hdu.data
+
+
 def amplifier_info(filename, omit_reference_pixels=True):
     """Calculate the number of amplifiers used to collect the data in a
     given file using the array size and exposure time of a single frame
@@ -35,8 +144,8 @@ def amplifier_info(filename, omit_reference_pixels=True):
 
     Parameters
     ----------
-    filename : str
-        Name of fits file to investigate
+    filename : str or FileMetadata
+        Name of fits file to investigate, or its ``FileMetadata``
 
     omit_reference_pixels : bool
         If ``True``, return the amp boundary coordinates excluding
@@ -57,8 +166,13 @@ def amplifier_info(filename, omit_reference_pixels=True):
         ``np.mgrid[x_min: x_max: x_step, y_min: y_max: y_step]``
     """
 
+    if not isinstance(filename, FileMetadata):
+        with FileMetadata(filename) as metadata:
+            return amplifier_info(metadata, omit_reference_pixels=omit_reference_pixels)
+    metadata = filename
+
     # First get necessary metadata
-    header = fits.getheader(filename)
+    header = metadata.header
     instrument = header['INSTRUME'].lower()
     detector = header['DETECTOR']
     x_dim = header['SUBSIZE1']
@@ -120,14 +234,7 @@ def amplifier_info(filename, omit_reference_pixels=True):
 
         # If requested, ignore reference pixels by adjusting the indexes of
         # the amp boundaries.
-        with fits.open(filename) as hdu:
-            try:
-                data_quality = hdu['DQ'].data
-            except KeyError:
-                try:
-                    data_quality = hdu['PIXELDQ'].data
-                except KeyError:
-                    raise KeyError('DQ extension not found.')
+        data_quality = metadata.dq
 
         # Reference pixels should be flagged in the DQ array with the
         # REFERENCE_PIXEL flag. Find the science pixels by looping for
@@ -245,17 +352,20 @@ def get_obstime(filename):
 
     Parameters
     ----------
-    filename : str
-        Name of fits file
+    filename : str or FileMetadata
+        Name of fits file, or its ``FileMetadata``
 
     Returns
     -------
     obs_time : datetime.datetime
         Observation date and time
     """
-    with fits.open(filename) as h:
-        date = h[0].header['DATE-OBS']
-        time = h[0].header['TIME-OBS']
+    if isinstance(filename, FileMetadata):
+        header = filename.header
+    else:
+        header = fits.getheader(filename)
+    date = header['DATE-OBS']
+    time = header['TIME-OBS']
     year, month, day = [int(element) for element in date.split('-')]
     hour, minute, second = [float(element) for element in time.split(':')]
     return datetime.datetime(year, month, day, int(hour), int(minute), int(second))
@@ -20,10 +20,76 @@ import os
 
 
 from jwql.utils.constants import INSTRUMENT_MONITOR_DATABASE_TABLES
-from jwql.database.database_interface import Monitor
+from jwql.database.database_interface import Monitor, session
 from jwql.utils.logging_functions import configure_logging, get_log_status
 
 
+def filter_processed_files(filenames, table, column_name='uncal_filename', **filters):
+    """Separate a list of files into those that have not yet been
+    processed and those that already have an entry in the given
+    monitor database table. The table is queried only once for all
+    of the files.
+
+    Parameters
+    ----------
+    filenames : list
+        List of candidate filenames
+
+    table : sqlalchemy.ext.declarative.api.DeclarativeMeta
+        The monitor database table (e.g. ``NIRCamBiasStats``)
+
+    column_name : str
+        Name of the column in ``table`` containing the filenames
+
+    **filters : dict
+        Column values used to restrict the query (e.g.
+        ``aperture='NRCA1_FULL'``)
+
+    Returns
+    -------
+    new_files : list
+        Filenames from ``filenames`` that are not in the table
+
+    processed_files : list
+        Filenames from ``filenames`` that are already in the table
+    """
+
+    existing = get_processed_files(table, column_name=column_name, **filters)
+    new_files = [filename for filename in filenames if filename not in existing]
+    processed_files = [filename for filename in filenames if filename in existing]
+
+    return new_files, processed_files
+
+
+def get_processed_files(table, column_name='uncal_filename', **filters):
+    """Return the set of filenames that already have an entry in the
+    given monitor database table. Only the filename column is
+    retrieved, rather than full rows.
+
+    Parameters
+    ----------
+    table : sqlalchemy.ext.declarative.api.DeclarativeMeta
+        The monitor database table (e.g. ``NIRCamBiasStats``)
+
+    column_name : str
+        Name of the column in ``table`` containing the filenames
+
+    **filters : dict
+        Column values used to restrict the query (e.g.
+        ``aperture='NRCA1_FULL'``)
+
+    Returns
+    -------
+    processed_files : set
+        Filenames present in the table
+    """
+
+    query = session.query(getattr(table, column_name)).filter_by(**filters).distinct()
+    processed_files = set(row[0] for row in query)
+
+    return processed_files
+
+
 def initialize_instrument_monitor(module):
     """Configures a log file for the instrument monitor run and
     captures the start time of the monitor
@@ -0,0 +1,128 @@
+"""Functions for the compact storage of bad pixel masks.
+
+Bad pixel masks are stored as the run lengths of alternating ``False``
+and ``True`` pixels across the flattened mask, compressed with
+``zlib``. Since bad pixels are sparse, and often clustered into columns
+or blocks, this is far smaller than lists of the x and y coordinates of
+each bad pixel, and it can be decoded directly into a ``numpy`` mask.
+
+Use
+---
+
+    This module can be imported as such:
+    ::
+
+        from jwql.utils import pixel_masks
+        encoded = pixel_masks.encode_mask(mask)
+        mask = pixel_masks.decode_mask(encoded)
+"""
+
+import zlib
+
+import numpy as np
+
+# Bits used to flag each type of bad pixel in a bad pixel bitmask
+HOT_PIXEL = 1
+DEAD_PIXEL = 2
+NOISY_PIXEL = 4
+BADPIX_BITS = {'hot': HOT_PIXEL, 'dead': DEAD_PIXEL, 'noisy': NOISY_PIXEL}
+
+
+def coordinates_to_mask(coordinates, shape):
+    """Create a boolean mask from lists of pixel coordinates
+
+    Parameters
+    ----------
+    coordinates : tuple
+        Tuple of two lists, containing the row and column coordinates
+        of the pixels to flag (as returned by ``numpy.where``)
+
+    shape : tuple
+        ``(y, x)`` shape of the mask
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        2D boolean array. ``True`` for the pixels in ``coordinates``
+    """
+
+    mask = np.zeros(shape, dtype=bool)
+    mask[np.asarray(coordinates[0], dtype=int), np.asarray(coordinates[1], dtype=int)] = True
+
+    return mask
+
+
+def decode_mask(encoded):
+    """Decode a mask created by ``encode_mask``
+
+    Parameters
+    ----------
+    encoded : bytes
+        Encoded mask
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        2D boolean array
+    """
+
+    values = np.frombuffer(zlib.decompress(encoded), dtype='<u4')
+    shape = tuple(values[0: 2])
+    run_lengths = values[2:]
+
+    # Runs alternate between False and True, starting with False
+    run_values = np.arange(len(run_lengths)) % 2 == 1
+    mask = np.repeat(run_values, run_lengths)
+
+    return mask.reshape(shape)
+
+
+def encode_mask(mask):
+    """Encode a 2D boolean mask as the compressed run lengths of the
+    flattened mask
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        2D boolean array
+
+    Returns
+    -------
+    encoded : bytes
+        Encoded mask
+    """
+
+    mask = np.asarray(mask, dtype=bool)
+    flat_mask = mask.ravel()
+
+    # Indexes at which the mask changes value. Runs alternate between
+    # False and True, starting with a (possibly empty) False run.
+    changes = np.flatnonzero(flat_mask[1:] != flat_mask[:-1]) + 1
+    boundaries = np.concatenate([[0], changes, [flat_mask.size]])
+    run_lengths = np.diff(boundaries)
+    if flat_mask.size > 0 and flat_mask[0]:
+        run_lengths = np.concatenate([[0], run_lengths])
+
+    values = np.concatenate([mask.shape, run_lengths]).astype('<u4')
+
+    return zlib.compress(values.tobytes())
+
+
+def mask_to_coordinates(mask):
+    """Return the coordinates of the flagged pixels in a mask
+
+    Parameters
+    ----------
+    mask : numpy.ndarray
+        2D boolean array
+
+    Returns
+    -------
+    coordinates : tuple
+        Tuple of two lists, containing the row and column coordinates
+        of the pixels that are ``True`` in ``mask``
+    """
+
+    rows, columns = np.where(mask)
+
+    return (rows.tolist(), columns.tolist())
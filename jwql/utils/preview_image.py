@@ -12,7 +12,9 @@ The lower and upper limits to be displayed are defined as the
 ``clip_percent`` and ``(1. - clip_percent)`` percentile signals.
 ``matplotlib`` is then used to display a linear- or log-stretched
 version of the image, with accompanying colorbar. The image is then
-saved.
+saved. Thumbnails of log-scaled images, and optionally preview images,
+are instead rendered without axes by the ``image_rendering`` module,
+which avoids the cost of creating a ``matplotlib`` figure.
 
 Authors:
 --------
@@ -41,7 +43,7 @@ import socket
 from astropy.io import fits
 import numpy as np
 
-from jwql.utils import permissions
+from jwql.utils import image_rendering, permissions
 
 # Use the 'Agg' backend to avoid invoking $DISPLAY
 import matplotlib
@@ -70,6 +72,17 @@ class PreviewImage():
         The data used to generate the preview image.
     dq : obj
         The DQ data used to generate the preview image.
+    dtype : numpy.dtype
+        The datatype in which the data are read in and processed.
+        Default is ``numpy.float32``.
+    fast_preview : bool
+        If ``True``, preview images are rendered without axes,
+        colorbars, or titles by the ``image_rendering`` module rather
+        than by ``matplotlib``. Default is ``False``. Thumbnails of
+        log-scaled images are always rendered by the
+        ``image_rendering`` module, which reproduces the layout of the
+        ``matplotlib`` thumbnails. Those of linearly scaled images,
+        which are drawn with axes, are still made by ``matplotlib``.
     file : str
         The filename to generate the preview image from.
     output_format : str
@@ -77,6 +90,9 @@ class PreviewImage():
         ``jpg`` and ``thumb``
     preview_output_directory : str or None
         The output directory to which the preview image is saved.
+    saved_files : list
+        The full paths of the preview images and thumbnails that have
+        been saved.
     scaling : str
         The scaling used in the preview image.  Default is ``log``.
     thumbnail_output_directory : str or None
@@ -95,11 +111,13 @@ class PreviewImage():
         Create the ``matplotlib`` figure
     make_image(max_img_size)
         Main function
+    render_image(image, min_value, max_value, scale, fname, maxsize, thumbnail)
+        Render and save the image without ``matplotlib``
     save_image(fname, thumbnail)
         Save the figure
     """
 
-    def __init__(self, filename, extension):
+    def __init__(self, filename, extension, dtype=np.float32):
         """Initialize the class.
 
         Parameters
@@ -108,12 +126,17 @@ class PreviewImage():
             Name of fits file containing data
         extension : str
             Extension name to be read in
+        dtype : numpy.dtype
+            Datatype in which to read in the data
         """
         self.clip_percent = 0.01
         self.cmap = 'viridis'
+        self.dtype = dtype
+        self.fast_preview = False
         self.file = filename
         self.output_format = 'jpg'
         self.preview_output_directory = None
+        self.saved_files = []
         self.scaling = 'log'
         self.thumbnail_output_directory = None
 
@@ -171,7 +194,9 @@ class PreviewImage():
     def get_data(self, filename, ext):
         """
         Read in the data from the given file and extension.  Also find
-        how many rows/cols of reference pixels are present.
+        how many rows/cols of reference pixels are present. For 4D
+        data, only the first and last groups of each integration are
+        read from the file.
 
         Parameters
         ----------
@@ -183,7 +208,9 @@ class PreviewImage():
         Returns
         -------
         data : obj
-            Science data from file. A 2-, 3-, or 4D numpy ndarray
+            Science data from file, with datatype ``self.dtype``. A 2-,
+            3-, or 4D numpy ndarray. 4D data contain only the first and
+            last groups of each integration.
         dq : obj
             2D ``ndarray`` boolean map of reference pixels. Science
             pixels flagged as ``True`` and non-science pixels are
@@ -198,11 +225,18 @@ class PreviewImage():
                     except:
                         pass
                 if ext in extnames:
-                    dimensions = len(hdulist[ext].data.shape)
-                    if dimensions == 4:
-                        data = hdulist[ext].data[:, [0, -1], :, :].astype(np.float)
+                    shape = hdulist[ext].shape
+                    if len(shape) == 4:
+                        # Read only the first and last groups, rather
+                        # than the entire ramp
+                        nints, ngroups, yd, xd = shape
+                        section = hdulist[ext].section
+                        data = np.empty((nints, 2, yd, xd), dtype=self.dtype)
+                        for integration in range(nints):
+                            data[integration, 0, :, :] = section[integration, 0, :, :]
+                            data[integration, 1, :, :] = section[integration, ngroups - 1, :, :]
                     else:
-                        data = hdulist[ext].data.astype(np.float)
+                        data = hdulist[ext].data.astype(self.dtype)
                 else:
                     raise ValueError('WARNING: no {} extension in {}!'.format(ext, filename))
 
@@ -384,10 +418,14 @@ class PreviewImage():
             else:
                 outdir = self.preview_output_directory
             outfile = os.path.join(outdir, infile.split('.')[0] + suffix)
-            self.make_figure(frame, i, minval, maxval, self.scaling.lower(),
-                             maxsize=max_img_size, thumbnail=False)
-            self.save_image(outfile, thumbnail=False)
-            plt.close()
+            if self.fast_preview:
+                self.render_image(frame, minval, maxval, self.scaling.lower(), outfile,
+                                  maxsize=max_img_size, thumbnail=False)
+            else:
+                self.make_figure(frame, i, minval, maxval, self.scaling.lower(),
+                                 maxsize=max_img_size, thumbnail=False)
+                self.save_image(outfile, thumbnail=False)
+                plt.close()
 
             # Create thumbnail image matplotlib object
             if self.thumbnail_output_directory is None:
@@ -395,10 +433,74 @@ class PreviewImage():
             else:
                 outdir = self.thumbnail_output_directory
             outfile = os.path.join(outdir, infile.split('.')[0] + suffix)
-            self.make_figure(frame, i, minval, maxval, self.scaling.lower(),
-                             maxsize=max_img_size, thumbnail=True)
-            self.save_image(outfile, thumbnail=True)
-            plt.close()
+            if self.scaling.lower() == 'log':
+                self.render_image(frame, minval, maxval, self.scaling.lower(), outfile,
+                                  maxsize=max_img_size, thumbnail=True)
+            else:
+                self.make_figure(frame, i, minval, maxval, self.scaling.lower(),
+                                 maxsize=max_img_size, thumbnail=True)
+                self.save_image(outfile, thumbnail=True)
+                plt.close()
+
+    def render_image(self, image, min_value, max_value, scale, fname, maxsize=8, thumbnail=False):
+        """
+        Render the image without axes using the ``image_rendering``
+        module, save it in the requested output format, and set the
+        appropriate permissions. The orientation of the image matches
+        that of the figures created by ``make_figure``.
+
+        Parameters
+        ----------
+        image : obj
+            2D ``numpy`` ``ndarray`` of floats
+
+        min_value : float
+            Minimum value for display
+
+        max_value : float
+            Maximum value for display
+
+        scale : str
+            Image scaling (``log``, ``linear``)
+
+        fname : str
+            Output filename
+
+        maxsize : int
+            Size of the longest dimension of the output preview image
+            (inches, at 100 pixels per inch). Not used for thumbnails.
+
+        thumbnail : bool
+            True to create a thumbnail image, False to create the full
+            preview image
+        """
+
+        # Check the input scaling
+        if scale not in ['linear', 'log']:
+            raise ValueError('WARNING: scaling option {} not supported.'.format(scale))
+
+        if thumbnail:
+            size = image_rendering.thumbnail_size(image.shape)
+        else:
+            size = image_rendering.fit_size(image.shape, (maxsize * 100, maxsize * 100))
+
+        # Log-scaled images are displayed with the y axis inverted
+        if scale == 'log':
+            origin = 'lower'
+        else:
+            origin = 'upper'
+
+        rgb = image_rendering.render_image(image, min_value, max_value, scale=scale, cmap=self.cmap,
+                                           origin=origin, size=size)
+
+        # If the image is a thumbnail, use the '.thumb' extension
+        if thumbnail:
+            fname = fname.replace('.jpg', '.thumb')
+        image_format = {'jpg': 'jpeg'}.get(self.output_format, self.output_format)
+        image_rendering.save_image(rgb, fname, image_format=image_format)
+        permissions.set_permissions(fname)
+        self.saved_files.append(fname)
+        logging.info('Saved image to {}'.format(fname))
 
     def save_image(self, fname, thumbnail=False):
         """
@@ -425,6 +527,8 @@ class PreviewImage():
         if thumbnail:
             thumb_fname = fname.replace('.jpg', '.thumb')
             os.rename(fname, thumb_fname)
+            self.saved_files.append(thumb_fname)
             logging.info('Saved image to {}'.format(thumb_fname))
         else:
+            self.saved_files.append(fname)
             logging.info('Saved image to {}'.format(fname))
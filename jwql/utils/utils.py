@@ -29,12 +29,15 @@ References
     - JWST TR JWST-STScI-004800, SM-12
  """
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import getpass
 import json
+import logging
 import os
 import re
 import shutil
+import time
 
 import jsonschema
 
@@ -527,6 +530,120 @@ def initialize_instrument_monitor(module):
     return start_time, log_file
 
 
+def stage_files(files, out_dir, link=True, max_workers=4, chunk_size=16 * 1024 ** 2):
+    """Make the given files available in a working directory without
+    copying them where possible. Files on the same filesystem as
+    ``out_dir`` are hard-linked (or symbolically linked, if a hard
+    link cannot be made). Other files are copied in parallel, in
+    chunks of ``chunk_size`` bytes. Files already present in
+    ``out_dir`` are left as they are.
+
+    Since linked files share their data with the original files, they
+    must not be modified in place. Their permissions are also left
+    unchanged. Pipeline outputs written alongside them are new files.
+
+    Parameters
+    ----------
+    files : list
+        List of files to be staged
+
+    out_dir : str
+        Destination directory
+
+    link : bool
+        If ``False``, always copy the files
+
+    max_workers : int
+        Maximum number of files to copy at a time
+
+    chunk_size : int
+        Number of bytes to copy at a time
+
+    Returns
+    -------
+    success : list
+        Files successfully staged (or that already existed in out_dir),
+        in the same order as ``files``
+
+    failed : list
+        Files that were not staged, in the same order as ``files``
+    """
+
+    start_time = time.time()
+    out_device = os.stat(out_dir).st_dev
+
+    # Whether each file was staged, in the order of the input files
+    staged = [False] * len(files)
+    to_copy = []
+    linked = 0
+    for index, input_file in enumerate(files):
+        input_new_path = os.path.join(out_dir, os.path.basename(input_file))
+        if os.path.exists(input_new_path):
+            staged[index] = True
+            continue
+
+        try:
+            same_device = os.stat(input_file).st_dev == out_device
+        except OSError:
+            continue
+
+        # Remove any broken symbolic link left behind by a previous run
+        if os.path.lexists(input_new_path):
+            os.remove(input_new_path)
+
+        if link and same_device:
+            try:
+                try:
+                    os.link(input_file, input_new_path)
+                except OSError:
+                    os.symlink(os.path.abspath(input_file), input_new_path)
+                staged[index] = True
+                linked += 1
+                continue
+            except OSError:
+                pass
+
+        to_copy.append((index, input_file, input_new_path))
+
+    def copy_file(paths):
+        _, input_file, input_new_path = paths
+
+        # Copy to a temporary name first, so that an interrupted copy is
+        # not mistaken for a staged file
+        partial_path = '{}.part'.format(input_new_path)
+        try:
+            with open(input_file, 'rb') as source, open(partial_path, 'wb') as destination:
+                shutil.copyfileobj(source, destination, chunk_size)
+            shutil.copystat(input_file, partial_path)
+            os.replace(partial_path, input_new_path)
+            permissions.set_permissions(input_new_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+        return os.path.getsize(input_new_path)
+
+    copied = 0
+    copied_bytes = 0
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (index, _, _), size in zip(to_copy, executor.map(copy_file, to_copy)):
+                if size is not None:
+                    staged[index] = True
+                    copied += 1
+                    copied_bytes += size
+
+    success = [os.path.join(out_dir, os.path.basename(input_file))
+               for input_file, is_staged in zip(files, staged) if is_staged]
+    failed = [input_file for input_file, is_staged in zip(files, staged) if not is_staged]
+
+    logging.info('Staged {} files in {:.1f} seconds: {} linked, {} copied ({:.1f} MB), {} failed'
+                 .format(len(success), time.time() - start_time, linked, copied,
+                         copied_bytes / 1024. ** 2, len(failed)))
+
+    return success, failed
+
+
 def update_monitor_table(module, start_time, log_file):
     """Update the ``monitor`` database table with information about
     the instrument monitor run
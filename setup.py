@@ -28,6 +28,7 @@ REQUIRES = [
     'numpy',
     'numpydoc',
     'pandas',
+    'pillow',
     'psycopg2',
     'pysiaf',
     'pytest',